@@ -7,7 +7,7 @@ import pandas as pd
 from datetime import datetime
 from aiohttp import web
 from app import db, transcription, audio_processor, vad, speaker_id
-from app.core import config, audio_utils, ai_client
+from app.core import config, audio_utils, ai_client, audio_decoder, pipeline_scheduler, metrics, handshake_cache, stt_hedge, speech_trim, job_tracker, overlap_stitcher, local_stt, stt_providers, stt_stream, transcript_cache, llm_cache, entity_prefilter, cestas_fuzzy
 
 # --- Test Endpoints ---
 
@@ -74,32 +74,41 @@ async def api_test_transcrever(request):
         if 'audio' not in data:
             return web.json_response({"error": "Audio required"}, status=400)
             
-        provider = data.get('provider', 'elevenlabs')
-        audio_bytes = data['audio']
+        provider_name = data.get('provider', 'elevenlabs')
+        try:
+            provider = stt_providers.get(provider_name)
+        except KeyError:
+            return web.json_response({"error": f"Provider desconhecido: {provider_name}",
+                                      "providers": stt_providers.names()}, status=400)
         
-        text = ""
-        # Assuming transcription module handles provider logic
-        if provider == 'assemblyai':
-            text = transcription.transcrever_assemblyai(audio_bytes)
-        elif provider == 'deepgram':
-            text = transcription.transcrever_deepgram(audio_bytes)
-        elif provider == 'gladia':
-            text = transcription.transcrever_gladia(audio_bytes)
-        else:
-            text = transcription.transcrever_elevenlabs(audio_bytes)
-            
-        return web.json_response({"texto": text})
+        # Os provedores recebem PCM16 mono 16k; o upload pode ser WAV/WebM/etc.
+        pcm = await asyncio.to_thread(audio_utils.decode_webm_to_pcm16le, data['audio'])
+        if not pcm:
+            return web.json_response({"error": "Falha ao decodificar o áudio"}, status=400)
+        
+        # Passa pelo cache de transcrições: reprocessar os mesmos arquivos em testes/ não gasta cota
+        cache_hits = set()
+        text, words = await transcription.chamar_provedor(provider.name, pcm, cache_hits)
+        return web.json_response({"texto": text, "words": words, "provider": provider_name,
+                                  "cache": provider.name in cache_hits})
         
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
+async def api_test_providers(request):
+    """
+    Provedores de STT registrados e suas capacidades.
+    GET /api/test/providers
+    """
+    return web.json_response({"providers": stt_providers.snapshot()})
+
 async def api_test_analisar(request):
     try:
         data = await request.json()
         texto = data.get("texto")
         if not texto: return web.json_response({"error": "Texto empty"}, status=400)
         
-        res_json_str = ai_client.ai_client.analisar_texto(texto)
+        res_json_str = await ai_client.ai_client.analisar_texto(texto)
         
         if res_json_str:
             try:
@@ -351,6 +360,114 @@ async def api_interacoes_balcao_metricas(request):
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
+async def api_metrics_pcm_queues(request):
+    """
+    Telemetria da fila de PCM do decoder por balcão conectado (profundidade, descartes, bloqueios).
+    GET /api/metrics/pcm_queues
+    """
+    return web.json_response({"pcm_queues": audio_decoder.PCM_QUEUE_STATS})
+
+async def api_metrics_pipelines(request):
+    """
+    Telemetria do scheduler de pipelines por balcão (em andamento, fila, merges, descartes).
+    GET /api/metrics/pipelines
+    """
+    return web.json_response({"pipelines": pipeline_scheduler.PIPELINE_STATS})
+
+async def api_metrics_stt_hedge(request):
+    """
+    Telemetria do hedging de STT (taxa de hedge, vencedores, latência economizada, deadlines).
+    GET /api/metrics/stt_hedge
+    """
+    return web.json_response({"stt_hedge": stt_hedge.snapshot()})
+
+async def api_metrics_stt_router(request):
+    """
+    Estado do roteador de STT: saúde/breaker por provedor, gasto por balcão e últimas decisões.
+    GET /api/metrics/stt_router
+    """
+    return web.json_response({"stt_router": transcription.router.snapshot()})
+
+async def api_metrics_speech_trim(request):
+    """
+    Corte de silêncio antes do STT: chunks cortados/inteiros/silenciosos e segundos enviados.
+    GET /api/metrics/speech_trim
+    """
+    return web.json_response({"speech_trim": speech_trim.snapshot()})
+
+async def api_metrics_stt_jobs(request):
+    """
+    Polling dos jobs assíncronos de STT (AssemblyAI/Gladia): pendentes, polls, timeouts e tempo típico.
+    GET /api/metrics/stt_jobs
+    """
+    return web.json_response({"stt_jobs": job_tracker.job_tracker.snapshot()})
+
+async def api_metrics_overlap_stitch(request):
+    """
+    Costura do overlap entre chunks: chunks por método (timestamps/tokens) e palavras repetidas removidas.
+    GET /api/metrics/overlap_stitch
+    """
+    return web.json_response({"overlap_stitch": overlap_stitcher.snapshot()})
+
+async def api_metrics_local_stt(request):
+    """
+    STT local em CPU: chamadas, recusas por fila cheia, RTF médio e configuração do pool.
+    GET /api/metrics/local_stt
+    """
+    return web.json_response({"local_stt": local_stt.snapshot()})
+
+async def api_metrics_stt_stream(request):
+    """
+    STT em streaming: sessões ativas, reconexões, finais/parciais e áudio reenviado/descartado.
+    GET /api/metrics/stt_stream
+    """
+    return web.json_response({"stt_stream": stt_stream.snapshot()})
+
+async def api_metrics_transcript_cache(request):
+    """
+    Cache de transcrições: hit rate (memória/disco/compartilhado), entradas e uso do disco.
+    GET /api/metrics/transcript_cache
+    """
+    return web.json_response({"transcript_cache": transcript_cache.transcript_cache.snapshot()})
+
+async def api_metrics_llm_cache(request):
+    """
+    Cache de LLM (normalizar/classificar): hit rate por tipo, entradas e expirados.
+    GET /api/metrics/llm_cache
+    """
+    return web.json_response({"llm_cache": llm_cache.snapshot()})
+
+async def api_metrics_llm(request):
+    """
+    Chamadas de LLM: em andamento, na fila do limite por modelo, erros e timeouts.
+    GET /api/metrics/llm
+    """
+    return web.json_response({"llm": ai_client.ai_client.snapshot()})
+
+async def api_metrics_llm_prefilter(request):
+    """
+    Pré-filtro do LLM: taxa de buffers sem termo do dicionário (pulados / que seriam pulados)
+    e, no modo shadow, falsos negativos com exemplos recentes.
+    GET /api/metrics/llm_prefilter
+    """
+    return web.json_response({"llm_prefilter": entity_prefilter.snapshot()})
+
+
+async def api_metrics_cestas_lookup(request):
+    """
+    Lookup de cestas: taxas de acerto exato, acerto pelo nome aproximado do medicamento,
+    near miss e miss, com exemplos recentes de fuzzy/near miss.
+    GET /api/metrics/cestas_lookup
+    """
+    return web.json_response({"cestas_lookup": cestas_fuzzy.snapshot()})
+
+async def api_metrics_prometheus(request):
+    """
+    Métricas no formato texto do Prometheus (histogramas por estágio, gauges, filas).
+    GET /metrics
+    """
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
 async def api_admin_listar_balcoes(request):
     """
     GET /api/admin/client/{user_codigo}/balcoes
@@ -387,6 +504,8 @@ async def api_admin_update_balcao_vad(request):
             return web.json_response({"error": "Body JSON required"}, status=400)
             
         db.update_balcao_vad_config(balcao_id, data)
+        # Próximas conexões desse balcão já pegam o preset novo
+        handshake_cache.handshake_cache.invalidate_balcao(balcao_id)
         return web.json_response({"status": "updated", "balcao_id": balcao_id, "vad_config": data})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
\ No newline at end of file
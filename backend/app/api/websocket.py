@@ -1,14 +1,14 @@
 import asyncio
+import contextlib
 import json
 import re
 import unicodedata
-import imageio_ffmpeg
-import difflib
+import time
 
 from datetime import datetime
 from aiohttp import web, WSMsgType
 from app import db, vad, transcription, speaker_id, audio_processor
-from app.core import config, audio_utils, ai_client, buffer, audio_analysis, capacity_guard, audio_archiver
+from app.core import config, audio_utils, ai_client, buffer, audio_analysis, capacity_guard, audio_archiver, audio_decoder, pipeline_scheduler, pcm_window, metrics, handshake_cache, overlap_stitcher, stt_stream, entity_prefilter
 from app.core.cestas import resolve_basket_from_classification
 from app.core.cestas_produtos_sintomas_doencas import parse_prompt1, lookup_cesta
 
@@ -94,154 +94,20 @@ def build_recommendation_payload_from_lookup(items: list[dict], *, max_items: in
         return None
     return {"comando": "recomendar", "itens": out}
 
-def _tok(s: str) -> list[str]:
-    s = _norm_text(s)
-    # mantém só letras/números e espaço
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s.split() if s else []
-
-def dedupe_overlap_words(prev_text: str, cur_text: str,
-                        max_window: int = 18,
-                        min_overlap: int = 4,
-                        min_ratio: float = 0.82) -> str:
-    """
-    Remove do começo do cur_text um overlap que parece repetição do final do prev_text,
-    mesmo quando não é idêntico (ex.: token extra, pequenas variações).
-    """
-    if not prev_text or not cur_text:
-        return cur_text
-
-    prev_t = _tok(prev_text)
-    cur_t  = _tok(cur_text)
-    if not prev_t or not cur_t:
-        return cur_text
-
-    # só olha uma janela do final/início (pra não gastar muito e não apagar coisa demais)
-    prev_tail = prev_t[-max_window:]
-    cur_head  = cur_t[:max_window]
-
-    best_k = 0
-
-    # tenta do maior pro menor overlap
-    for k in range(min(len(prev_tail), len(cur_head)), min_overlap - 1, -1):
-        a = prev_tail[-k:]
-        b = cur_head[:k]
-
-        # comparação fuzzy: tokens -> string
-        ra = " ".join(a)
-        rb = " ".join(b)
-
-        ratio = difflib.SequenceMatcher(a=ra, b=rb).ratio()
-
-        # permite 1 token “extra” no começo do cur (“aqui”, “né”, etc.)
-        if ratio < min_ratio and k >= (min_overlap + 1):
-            b2 = cur_head[1:k+1]  # pula 1 token do começo
-            rb2 = " ".join(b2)
-            ratio2 = difflib.SequenceMatcher(a=ra, b=rb2).ratio()
-            if ratio2 >= min_ratio:
-                best_k = k  # mas vamos remover k+1 tokens do original (o extra + overlap)
-                remove_tokens = k + 1
-                break
-        else:
-            if ratio >= min_ratio:
-                best_k = k
-                remove_tokens = k
-                break
-
-    if best_k <= 0:
-        return cur_text
-
-    # Agora remove do cur_text ORIGINAL (não-normalizado) aproximadamente os primeiros N tokens
-    # Estratégia: tokeniza “cur_text” bruto por espaços e remove N palavras iniciais.
-    raw_tokens = cur_text.strip().split()
-    if len(raw_tokens) <= remove_tokens:
-        return ""  # virou só repetição
-    return " ".join(raw_tokens[remove_tokens:]).lstrip()
-
-
-class FFmpegWebMToPCMStream:
-    """
-    Mantém um ffmpeg vivo por conexão:
-      stdin  <- chunks webm/opus do websocket
-      stdout -> pcm16le 16k mono em stream
-    """
-    def __init__(self, sample_rate=16000):
-        self.sample_rate = sample_rate
-        self.proc = None
-        self._reader_task = None
-        self.pcm_queue: asyncio.Queue[bytes] = asyncio.Queue()
-        self._closed = False
-
-    async def start(self):
-        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
-        self.proc = await asyncio.create_subprocess_exec(
-            ffmpeg,
-            "-loglevel", "error",
-            "-i", "pipe:0",
-            "-f", "s16le",
-            "-ar", str(self.sample_rate),
-            "-ac", "1",
-            "pipe:1",
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        self._reader_task = asyncio.create_task(self._read_stdout())
-
-    async def _read_stdout(self):
-        try:
-            while not self._closed:
-                chunk = await self.proc.stdout.read(4096)
-                if not chunk:
-                    break
-                await self.pcm_queue.put(chunk)
-        except Exception:
-            pass
-
-    async def write_webm(self, data: bytes):
-        if self._closed or not self.proc or not self.proc.stdin:
-            return
-        self.proc.stdin.write(data)
-        await self.proc.stdin.drain()
-
-    async def read_pcm(self) -> bytes:
-        return await self.pcm_queue.get()
-
-    async def close(self):
-        self._closed = True
-
-        # destrava o consumer (sentinela)
-        try:
-            await self.pcm_queue.put(b"")
-        except:
-            pass
-
-        if self.proc and self.proc.stdin:
-            try:
-                self.proc.stdin.close()
-            except:
-                pass
-
-        if self._reader_task:
-            self._reader_task.cancel()
-
-        if self.proc:
-            try:
-                self.proc.kill()
-            except:
-                pass
-
 async def process_speech_pipeline(
     websocket,
-    speech_segment: bytes,
+    speech_segment: bytes | memoryview,
     balcao_id: str,
     transcript_buffer: buffer.TranscriptionBuffer,
     funcionario_id: int | None,
     nome_funcionario: str,
     speaker_data_list: list | None = None,
     vad_meta: dict | None = None,
-    config_snapshot: dict | None = None
+    config_snapshot: dict | None = None,
+    order_ticket: pipeline_scheduler.OrderTicket | None = None,
+    stitcher: overlap_stitcher.OverlapStitcher | None = None,
+    stream_offset_s: float | None = None,
+    transcricao_pronta: dict | None = None
 ):
 
     ts_audio_received = datetime.now()
@@ -436,9 +302,11 @@ async def process_speech_pipeline(
 
 
         ts_transcription_sent = datetime.now()
-        transcricao_resultado = await asyncio.to_thread(
-            transcription.transcrever_inteligente, speech_segment
-        )
+        if transcricao_pronta is not None:
+            # STT em streaming: o resultado final já chegou pela sessão do balcão
+            transcricao_resultado = transcricao_pronta
+        else:
+            transcricao_resultado = await transcription.transcrever_inteligente(speech_segment, balcao_id=balcao_id)
         ts_transcription_ready = datetime.now()
         
         texto = transcricao_resultado["texto"]
@@ -517,25 +385,32 @@ async def process_speech_pipeline(
         print(f"[{balcao_id}] Transcrição ({modelo_usado}): {texto}")
         
 
-        # --- DEDUPE por overlap (fuzzy) ---
-        prev_last = getattr(transcript_buffer, "_last_text", "")
-        texto = dedupe_overlap_words(prev_last, texto)
-        setattr(transcript_buffer, "_last_text", texto)
-        # ----------------------------------
+        # --- Seção ordenada: costura do overlap + buffer ---
+        # Com o PipelineScheduler, chunks que terminaram a transcrição fora de ordem esperam a vez aqui
+        async with (order_ticket or contextlib.nullcontext()):
+            if stitcher is not None:
+                texto, removidas = stitcher.stitch(
+                    texto, transcricao_resultado.get("words"),
+                    len(speech_segment) / 32000.0, stream_offset_s
+                )
+                if removidas:
+                    print(f"[{balcao_id}] Overlap: {removidas} palavra(s) repetida(s) removida(s)")
+
+            # Add to buffer
+            transcript_buffer.add_text(texto)
 
-        # Add to buffer
-        transcript_buffer.add_text(texto)
+            # Check if we should process via AI (pega o buffer consolidado UMA VEZ)
+            flush_buffer = transcript_buffer.should_process()
+            if flush_buffer:
+                buffer_content = transcript_buffer.get_context_and_clear()
 
-        # Check if we should process via AI
-        if transcript_buffer.should_process():
+        if flush_buffer:
 
             # Se estiver suprimindo recomendações (modo de teste), não chama LLM
             if config.MOCK_RECOMMENDATION:
                 print(f"[{balcao_id}] Normalização bloqueada (MOCK_RECOMMENDATION=True).")
                 recomendacao_log = "🚫 NORMALIZE: bloqueado (MOCK_RECOMMENDATION=True)"
                 
-                buffer_content = transcript_buffer.get_context_and_clear()
-                
                 normalizacao_out = None
                 classificacao_out = None
                 
@@ -543,9 +418,6 @@ async def process_speech_pipeline(
                 ts_ai_response = None
 
             else:
-                # 1) pega o buffer consolidado UMA VEZ
-                buffer_content = transcript_buffer.get_context_and_clear()
-
                 if not buffer_content or not buffer_content.strip():
                     recomendacao_log = "NORM: vazio"
                     normalizacao_out = "NADA_RELEVANTE | OUTRO"
@@ -554,16 +426,20 @@ async def process_speech_pipeline(
                     ts_ai_response = None
 
                 else:
-                    print(f"[{balcao_id}] Enviando para NORMALIZE: {buffer_content[-200:]}...")
+                    # Pré-filtro: sem nenhum termo do dicionário o LLM responderia NADA_RELEVANTE
+                    prefiltro = entity_prefilter.decide(buffer_content)
 
                     # -------------------------
                     # LLM #1: NORMALIZAR
                     # -------------------------
                     ts_ai_request = datetime.now()
-                    norm_out = await asyncio.to_thread(
-                        ai_client.ai_client.normalizar_texto,
-                        buffer_content
-                    )
+                    if prefiltro == "skip":
+                        print(f"[{balcao_id}] Pré-filtro: nenhum termo conhecido, NORMALIZE pulado: {buffer_content[-200:]}")
+                        norm_out = "NADA_RELEVANTE | OUTRO"
+                    else:
+                        print(f"[{balcao_id}] Enviando para NORMALIZE: {buffer_content[-200:]}...")
+                        with metrics.STAGE_SECONDS.labels("llm_normalize").time():
+                            norm_out = await ai_client.ai_client.normalizar_texto(buffer_content)
 
                     normalizacao_out = (norm_out or "").strip()
                     if not normalizacao_out:
@@ -574,6 +450,11 @@ async def process_speech_pipeline(
                     # =========================
                     med, sint, doenca = parse_prompt1(normalizacao_out)
 
+                    if prefiltro == "would_skip" and (med or sint or doenca):
+                        entity_prefilter.record_false_negative(
+                            buffer_content, normalizacao_out, bool(med) and lookup_cesta(med, sint, doenca, track=False) is not None
+                        )
+
                     if not med and not sint and not doenca:
                         print(f"[{balcao_id}] 🚫 Nenhuma entidade extraída (NADA_RELEVANTE). Abortando pipelines seguintes.")
                         used_lookup = True # Flag para pular Classificação e HINT mapping
@@ -604,7 +485,8 @@ async def process_speech_pipeline(
                             }
                         }
                     else:
-                        lookup_items = lookup_cesta(med, sint, doenca)
+                        with metrics.STAGE_SECONDS.labels("lookup").time():
+                            lookup_items = lookup_cesta(med, sint, doenca)
 
                         if lookup_items:
                             used_lookup = True
@@ -615,7 +497,8 @@ async def process_speech_pipeline(
                         if payload_out and (not websocket.closed):
                             try:
                                 ts_client_sent = datetime.now()
-                                await websocket.send_json(payload_out)
+                                with metrics.STAGE_SECONDS.labels("ws_send").time():
+                                    await websocket.send_json(payload_out)
                             except Exception as e:
                                 print(f"[{balcao_id}] ❌ Falha ao enviar recomendação (lookup): {e}")
                                 ts_client_sent = None
@@ -685,10 +568,8 @@ async def process_speech_pipeline(
                             # -------------------------
                             # LLM #2: CLASSIFICAR (FALLBACK FINAL se o HINT for algo muito estranho)
                             # -------------------------
-                            classif = await asyncio.to_thread(
-                                ai_client.ai_client.classificar_cesta,
-                                normalizacao_out
-                            )
+                            with metrics.STAGE_SECONDS.labels("llm_classify").time():
+                                classif = await ai_client.ai_client.classificar_cesta(normalizacao_out)
                             ts_ai_response = datetime.now()
 
                             if isinstance(classif, dict):
@@ -753,7 +634,8 @@ async def process_speech_pipeline(
             if payload_out and (not websocket.closed):
                 try:
                     ts_client_sent = datetime.now()
-                    await websocket.send_json(payload_out)
+                    with metrics.STAGE_SECONDS.labels("ws_send").time():
+                        await websocket.send_json(payload_out)
                 except Exception as e:
                     print(f"[{balcao_id}] ❌ Falha ao enviar recomendação: {e}")
                     ts_client_sent = None
@@ -762,6 +644,7 @@ async def process_speech_pipeline(
         if recomendacao_log is None:
             recomendacao_log = ""
 
+        db_t0 = time.perf_counter()
         interaction_id = await asyncio.to_thread(
             db.registrar_interacao,
             balcao_id=balcao_id,
@@ -795,6 +678,7 @@ async def process_speech_pipeline(
             audio_classification=audio_classification,
             speech_ranges=speech_ranges
         )
+        metrics.STAGE_SECONDS.labels("db_insert").observe(time.perf_counter() - db_t0)
         
         # Save Audio with ID
         if interaction_id:
@@ -824,7 +708,9 @@ async def websocket_handler(request):
         vad_threshold_mult = vad_settings.get("threshold_multiplier") # e.g 1.5
         vad_min_energy = vad_settings.get("min_energy_threshold") # e.g 50.0
 
-        balcao_id = db.validate_api_key(api_key)
+        # balcão + preset de VAD + funcionário fallback numa consulta só (cache com TTL)
+        handshake_ctx = await handshake_cache.handshake_cache.get(api_key)
+        balcao_id = handshake_ctx["balcao_id"] if handshake_ctx else None
         
         if not balcao_id:
             await ws.close(code=4001, message=b"API Key Invalida")
@@ -838,7 +724,8 @@ async def websocket_handler(request):
             return ws
 
         # 1. Load VAD Config from DB (Per-Counter Presets)
-        db_vad_cfg = db.get_balcao_vad_config(balcao_id)
+        db_vad_cfg = dict(handshake_ctx["vad_config"])
+        fallback_funcionario_id = handshake_ctx["fallback_funcionario_id"]
         
         # 2. Merge with Frontend (Frontend overrides DB? Or DB overrides Frontend? 
         # Requirement: "Preset aplicado automaticamente por balcão sem o frontend enviar nada"
@@ -899,15 +786,52 @@ async def websocket_handler(request):
         else:
             current_config_snapshot["CHUNK_DURATION_S"] = 5.0
             current_config_snapshot["CHUNK_OVERLAP_S"] = 0.8
+            current_config_snapshot["STT_STREAMING"] = config.STT_STREAMING_ENABLE
 
-        decoder = FFmpegWebMToPCMStream(sample_rate=16000)
+        decoder = audio_decoder.create_pcm_stream(sample_rate=16000, balcao_id=balcao_id)
         await decoder.start()
 
+        async def run_pipeline(segment, ticket, funcionario_id, nome_funcionario, speaker_data_list, vad_meta,
+                               stream_offset_s=None):
+            await process_speech_pipeline(
+                ws, segment, balcao_id, transcript_buffer,
+                funcionario_id, nome_funcionario, speaker_data_list,
+                vad_meta=vad_meta,
+                config_snapshot=current_config_snapshot,
+                order_ticket=ticket,
+                stitcher=stitcher,
+                stream_offset_s=stream_offset_s
+            )
+
+        # Overlap entre chunks consecutivos (merge de chunks atrasados e costura das transcrições)
+        if config.SIMPLE_CHUNK_MODE:
+            sched_overlap = int(0.8 * 32000)
+        else:
+            sched_overlap = vad_session.overlap_frames * vad_session.frame_bytes
+        stitcher = overlap_stitcher.OverlapStitcher(
+            sched_overlap / 32000.0, clean=transcription.limpar_texto_transcricao
+        )
+        scheduler = pipeline_scheduler.PipelineScheduler(
+            run_pipeline, balcao_id=balcao_id, overlap_bytes=sched_overlap
+        )
+
+        # STT em streaming: uma sessão por balcão no lugar dos chunks de 5s.
+        # Parciais vão para o TranscriptionBuffer; cada final segue o pipeline normal.
+        stream_session = None
+        stream_results = asyncio.Queue()
+        if config.STT_STREAMING_ENABLE and config.SIMPLE_CHUNK_MODE:
+            stream_session = stt_stream.StreamingSTTSession(
+                balcao_id, transcription.DEEPGRAM_API_KEY, stream_results.put_nowait
+            )
+            stream_session.start()
+            print(f"[{balcao_id}] STT em streaming: {config.STT_STREAM_URL}")
+
         pcm_acc = bytearray()
 
         voice_tracker = speaker_id.StreamVoiceIdentifier()
         funcionario_id_atual = None
         nome_funcionario_atual = "Desconhecido"
+        speaker_data_atual = None
         
     except Exception as e:
         print(f"Erro Auth WS: {e}")
@@ -915,7 +839,33 @@ async def websocket_handler(request):
         return ws
 
     async def pcm_consumer_loop():
-        nonlocal pcm_acc, funcionario_id_atual, nome_funcionario_atual
+        try:
+            await _pcm_consumer_loop()
+        finally:
+            # Fila estourou com PCM_QUEUE_OVERFLOW_POLICY=shed: derruba a conexão
+            if decoder.pcm_queue.shed and not ws.closed:
+                await ws.close(code=4003, message=b"PCM backlog")
+
+    async def stream_results_loop():
+        """Resultados do STT em streaming, na ordem (o buffer exige ordem)."""
+        while True:
+            res = await stream_results.get()
+            if res is None:
+                return
+            # Parciais só contam em /api/metrics/stt_stream; o buffer recebe apenas finais
+            if not res.is_final:
+                continue
+            segment = res.audio
+            resultado = await transcription.resultado_streaming(res.text, res.words, segment, balcao_id)
+            await process_speech_pipeline(
+                ws, segment, balcao_id, transcript_buffer,
+                funcionario_id_atual or fallback_funcionario_id, nome_funcionario_atual, speaker_data_atual,
+                config_snapshot=current_config_snapshot,
+                transcricao_pronta=resultado
+            )
+
+    async def _pcm_consumer_loop():
+        nonlocal pcm_acc, funcionario_id_atual, nome_funcionario_atual, speaker_data_atual
 
         # --- SIMPLE_CHUNK_MODE: Fixed-duration chunks with overlap ---
         if config.SIMPLE_CHUNK_MODE:
@@ -927,38 +877,53 @@ async def websocket_handler(request):
 
             print(f"[{balcao_id}] SIMPLE_CHUNK_MODE: chunk=5.0s ({chunk_bytes}B), overlap=0.8s ({overlap_bytes}B), stride={stride_bytes}B")
 
+            # Janelas saem como memoryviews read-only (sem cópia por chunk)
+            pcm_windows = pcm_window.PCMWindowBuffer(chunk_bytes, stride_bytes)
+            chunk_index = 0
+
             while True:
                 pcm_chunk = await decoder.read_pcm()
                 if pcm_chunk == b"":
                     break
-                pcm_acc.extend(pcm_chunk)
+                if stream_session is not None:
+                    stream_session.push(pcm_chunk)
+                pcm_windows.write(pcm_chunk)
 
-                while len(pcm_acc) >= chunk_bytes:
-                    fixed_chunk = bytes(pcm_acc[:chunk_bytes])
-                    # Advance by stride (not full chunk) to keep overlap for next chunk
-                    del pcm_acc[:stride_bytes]
+                # Advance by stride (not full chunk) to keep overlap for next chunk
+                for fixed_chunk in pcm_windows.windows():
+                    # Posição do chunk no stream (costura do overlap pelos word timestamps)
+                    stream_offset_s = chunk_index * stride_bytes / bytes_per_second
+                    chunk_index += 1
 
                     audio_archiver.archiver.archive_chunk(balcao_id, fixed_chunk, is_processed=False)
 
                     # Speaker ID passivo (background, non-blocking)
-                    pred_func_id, score, spk_data = await asyncio.to_thread(
-                        voice_tracker.add_segment, balcao_id, fixed_chunk
-                    )
+                    with metrics.STAGE_SECONDS.labels("speaker_id").time():
+                        pred_func_id, score, spk_data = await asyncio.to_thread(
+                            voice_tracker.add_segment, balcao_id, fixed_chunk
+                        )
                     
                     if pred_func_id is not None:
                         funcionario_id_chunk = pred_func_id
                         nome_funcionario_chunk = (spk_data[0].get("name") if spk_data else None) or "Desconhecido"
                     else:
-                        funcionario_id_chunk = await asyncio.to_thread(db.get_fallback_funcionario_id, balcao_id)
+                        funcionario_id_chunk = fallback_funcionario_id
                         nome_funcionario_chunk = "Cliente / Desconhecido"
 
-                    asyncio.create_task(
-                        process_speech_pipeline(
-                            ws, fixed_chunk, balcao_id, transcript_buffer,
-                            funcionario_id_chunk, nome_funcionario_chunk, spk_data,
-                            vad_meta=None,
-                            config_snapshot=current_config_snapshot
-                        )
+                    if stream_session is not None:
+                        # Streaming: a janela só serve para arquivo + speaker ID
+                        funcionario_id_atual = funcionario_id_chunk
+                        nome_funcionario_atual = nome_funcionario_chunk
+                        speaker_data_atual = spk_data
+                        continue
+
+                    scheduler.submit(
+                        fixed_chunk,
+                        funcionario_id=funcionario_id_chunk,
+                        nome_funcionario=nome_funcionario_chunk,
+                        speaker_data_list=spk_data,
+                        vad_meta=None,
+                        stream_offset_s=stream_offset_s
                     )
             return
 
@@ -988,29 +953,31 @@ async def websocket_handler(request):
                 if vad_meta is None:
                     vad_meta = {}
 
-                pred_func_id, score, speaker_data_list = await asyncio.to_thread(
-                    voice_tracker.add_segment, balcao_id, speech
-                )
+                with metrics.STAGE_SECONDS.labels("speaker_id").time():
+                    pred_func_id, score, speaker_data_list = await asyncio.to_thread(
+                        voice_tracker.add_segment, balcao_id, speech
+                    )
 
                 if pred_func_id is not None:
                     funcionario_id_chunk = pred_func_id
                     nome_funcionario_chunk = (speaker_data_list[0].get("name") if speaker_data_list else None) or "Desconhecido"
                     print(f"[{balcao_id}] Voice-ID identificado: id={funcionario_id_chunk} nome={nome_funcionario_chunk} (score={score:.3f})")
                 else:
-                    funcionario_id_chunk = await asyncio.to_thread(db.get_fallback_funcionario_id, balcao_id)
+                    funcionario_id_chunk = fallback_funcionario_id
                     nome_funcionario_chunk = "Cliente / Desconhecido"
 
-                asyncio.create_task(
-                    process_speech_pipeline(
-                        ws, speech, balcao_id, transcript_buffer,
-                        funcionario_id_chunk, nome_funcionario_chunk, speaker_data_list,
-                        vad_meta=vad_meta,
-                        config_snapshot=current_config_snapshot
-                    )
+                scheduler.submit(
+                    speech,
+                    funcionario_id=funcionario_id_chunk,
+                    nome_funcionario=nome_funcionario_chunk,
+                    speaker_data_list=speaker_data_list,
+                    vad_meta=vad_meta
                 )
 
 
+    metrics.ACTIVE_CONNECTIONS.inc()
     consumer_task = asyncio.create_task(pcm_consumer_loop())
+    stream_task = asyncio.create_task(stream_results_loop()) if stream_session is not None else None
 
     try:
         async for msg in ws:
@@ -1025,6 +992,7 @@ async def websocket_handler(request):
 
     finally:
         print(f"Desconectado: {balcao_id}")
+        metrics.ACTIVE_CONNECTIONS.dec()
 
         # fecha decoder (isso solta o consumer via sentinela)
         try:
@@ -1038,4 +1006,19 @@ async def websocket_handler(request):
         except:
             pass
 
+        # STT em streaming: pede os finais pendentes e processa o que já chegou
+        if stream_session is not None:
+            try:
+                await stream_session.close()
+                stream_results.put_nowait(None)
+                await asyncio.wait_for(stream_task, timeout=5.0)
+            except Exception:
+                stream_task.cancel()
+
+        # cancela pipelines pendentes/em andamento desta conexão
+        try:
+            await scheduler.close()
+        except:
+            pass
+
     return ws
\ No newline at end of file
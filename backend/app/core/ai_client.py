@@ -1,96 +1,222 @@
+import asyncio
 import json
-from openai import OpenAI
-from app.core import config, prompts
+import time
+from app.core import config, prompts, metrics, http_pool
+from app.core.llm_cache import normalize_cache, classify_cache
+
+# =========================
+# Cliente de LLM assíncrono (API de chat completions da OpenAI) no pool HTTP compartilhado
+# (app/core/http_pool, provedor "openai": keep-alive, limite de conexões, retries com orçamento).
+#
+# Limites: OPENAI_MAX_CONCURRENCY chamadas no total e OPENAI_MODEL_MAX_CONCURRENCY por modelo
+# (o gpt-4.1 lento não ocupa as vagas do gpt-4.1-mini). Cada chamada tem um deadline
+# (OPENAI_TIMEOUT_S, contando a espera por vaga); estourou, falha como qualquer erro.
+# Nenhuma thread fica presa esperando a rede.
+# =========================
+
+LLM_REQUESTS = metrics.counter(
+    "balto_llm_requests_total",
+    "Chamadas de LLM por modelo e resultado (ok, error, timeout)",
+    ("model", "result"),
+)
+
+LLM_SECONDS = metrics.histogram(
+    "balto_llm_request_seconds",
+    "Duração das chamadas de LLM por modelo (inclui espera por vaga)",
+    ("model",),
+    buckets=(0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0),
+)
+
+AI_STATS = {
+    "calls": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "queued": 0,   # esperando vaga no semáforo do modelo
+}
+
+http_pool.configure_provider("openai", max_conns=config.OPENAI_MAX_CONCURRENCY, timeout_s=config.OPENAI_TIMEOUT_S)
+
+
+def _classificacao_fallback() -> dict:
+    return {"macros_top2": ["OUTRO", "OUTRO"], "micro_categoria": None, "ancoras_para_excluir": []}
+
 
 class AIClient:
     def __init__(self):
-        self.client = None
-        if config.OPENAI_API_KEY:
-            self.client = OpenAI(
-                api_key=config.OPENAI_API_KEY,
-                base_url=config.OPENAI_BASE_URL
-            )
-        else:
+        self.enabled = bool(config.OPENAI_API_KEY)
+        self.base_url = (config.OPENAI_BASE_URL or "https://api.openai.com/v1").rstrip("/")
+        self._model_sems: dict[str, asyncio.Semaphore] = {}
+        self._sems_loop = None
+        if not self.enabled:
             print("[AI] OpenAI client not initialized (Missing API Key)")
 
-    def analisar_texto(self, texto: str) -> str | None:
-        if not self.client:
+    def _model_semaphore(self, model: str) -> asyncio.Semaphore:
+        # semáforos ficam presos ao loop (workers do --workers têm o seu)
+        loop = asyncio.get_running_loop()
+        if self._sems_loop is not loop:
+            self._model_sems = {}
+            self._sems_loop = loop
+        sem = self._model_sems.get(model)
+        if sem is None:
+            sem = self._model_sems[model] = asyncio.Semaphore(config.OPENAI_MODEL_MAX_CONCURRENCY)
+        return sem
+
+    async def chat(self, model: str, messages: list, deadline_s: float | None = None, **params) -> str | None:
+        """
+        POST /chat/completions. Retorna o content da primeira escolha.
+        Falhas (HTTP, rede, resposta inválida, deadline) levantam exceção.
+        """
+        t0 = time.perf_counter()
+        result = "error"
+        AI_STATS["calls"] += 1
+        try:
+            content = await asyncio.wait_for(self._post(model, messages, params),
+                                             timeout=deadline_s or config.OPENAI_TIMEOUT_S)
+            result = "ok"
+            return content
+        except asyncio.TimeoutError:
+            result = "timeout"
+            AI_STATS["timeouts"] += 1
+            raise
+        except Exception:
+            AI_STATS["errors"] += 1
+            raise
+        finally:
+            LLM_REQUESTS.labels(model, result).inc()
+            LLM_SECONDS.labels(model).observe(time.perf_counter() - t0)
+
+    async def _post(self, model: str, messages: list, params: dict) -> str | None:
+        sem = self._model_semaphore(model)
+        AI_STATS["queued"] += 1
+        try:
+            await sem.acquire()
+        finally:
+            AI_STATS["queued"] -= 1
+        AI_STATS["in_flight"] += 1
+        try:
+            status, body = await http_pool.request(
+                "openai", "POST", f"{self.base_url}/chat/completions",
+                json={"model": model, "messages": messages, **params},
+                headers={"Authorization": f"Bearer {config.OPENAI_API_KEY}"},
+            )
+        finally:
+            AI_STATS["in_flight"] -= 1
+            sem.release()
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        return json.loads(body)["choices"][0]["message"]["content"]
+
+    async def analisar_texto(self, texto: str) -> str | None:
+        if not self.enabled:
             return None
-            
+
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0.1,
-                max_tokens=180,
-                messages=[
+            return await self.chat(
+                "gpt-4o-mini",
+                [
                     {"role": "developer", "content": prompts.SYSTEM_PROMPT},
                     {"role": "user", "content": texto}
                 ],
+                temperature=0.1,
+                max_tokens=180,
                 response_format=prompts.RESPONSE_SCHEMA
             )
-            return response.choices[0].message.content
         except Exception as e:
-            print(f"[AI] Error: {e}")
+            print(f"[AI] Error: {e!r}")
             return None
 
 
-    def normalizar_texto(self, texto: str) -> str | None:
-        if not self.client:
+    async def normalizar_texto(self, texto: str) -> str | None:
+        if not self.enabled:
             return None
         if not texto or not texto.strip():
             return "NADA_RELEVANTE | OUTRO"
 
+        # Frases repetidas no balcão ("tem dipirona") não precisam de outra ida ao LLM
+        cache_key = normalize_cache.key("gpt-4.1", prompts.NORMALIZE_INSTRUCTIONS, texto)
+        cached = await normalize_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4.1",
-                temperature=0,
-                messages=[
+            out = await self.chat(
+                "gpt-4.1",
+                [
                     {"role": "system", "content": prompts.NORMALIZE_INSTRUCTIONS},
                     {"role": "user", "content": texto}
-                ]
+                ],
+                temperature=0
             )
-            out = response.choices[0].message.content
             if out:
-                return out.strip()
+                out = out.strip()
+                await normalize_cache.aput(cache_key, out)
+                return out
             return None
 
         except Exception as e:
-            print(f"[AI][normalize] Error: {e}")
+            print(f"[AI][normalize] Error: {e!r}")
             return None
 
-    def classificar_cesta(self, normalizado: str) -> dict:
+    async def classificar_cesta(self, normalizado: str) -> dict:
         """
         Entrada: string tipo "MED:imosec | GASTRO"
         Saída: dict com macros_top2, micro_categoria, ancoras_para_excluir
         """
-        if not self.client:
-            return {"macros_top2": ["OUTRO", "OUTRO"], "micro_categoria": None, "ancoras_para_excluir": []}
+        if not self.enabled:
+            return _classificacao_fallback()
 
         normalizado = (normalizado or "").strip()
         if not normalizado:
             normalizado = "NADA_RELEVANTE | OUTRO"
 
+        # Guarda o JSON cru: cada chamada recebe um dict novo (o pipeline altera o dict)
+        cache_key = classify_cache.key("gpt-4.1-mini", prompts.CLASSIFY_INSTRUCTIONS, normalizado)
+        cached = await classify_cache.aget(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4.1-mini",
-                temperature=0,
-                messages=[
+            out = await self.chat(
+                "gpt-4.1-mini",
+                [
                     {"role": "system", "content": prompts.CLASSIFY_INSTRUCTIONS},
                     {"role": "user", "content": normalizado}
                 ],
+                temperature=0,
                 response_format={"type": "json_object"}
             )
 
-            out = response.choices[0].message.content
             out = (out or "").strip()
             if not out:
                 raise ValueError("Empty classify output")
 
-            return json.loads(out)
+            result = json.loads(out)
+            await classify_cache.aput(cache_key, out)
+            return result
 
         except Exception as e:
-            print(f"[AI][classify] Error: {e}")
-            return {"macros_top2": ["OUTRO", "OUTRO"], "micro_categoria": None, "ancoras_para_excluir": []}
+            print(f"[AI][classify] Error: {e!r}")
+            return _classificacao_fallback()
+
+    def snapshot(self) -> dict:
+        return {
+            **AI_STATS,
+            "enabled": self.enabled,
+            "max_concurrency": config.OPENAI_MAX_CONCURRENCY,
+            "model_max_concurrency": config.OPENAI_MODEL_MAX_CONCURRENCY,
+            "timeout_s": config.OPENAI_TIMEOUT_S,
+        }
 
 # Singleton instance
 ai_client = AIClient()
+
+
+def _collect_ai_stats():
+    return [
+        ("balto_llm_in_flight", "gauge", "Chamadas de LLM em andamento", {}, AI_STATS["in_flight"]),
+        ("balto_llm_queued", "gauge", "Chamadas de LLM esperando vaga no limite por modelo", {}, AI_STATS["queued"]),
+    ]
+
+
+metrics.register_collector(_collect_ai_stats)
@@ -2,7 +2,7 @@
 import numpy as np
 import librosa
 
-def extract_features(pcm_data: bytes, sample_rate: int = 16000):
+def extract_features(pcm_data: bytes | memoryview, sample_rate: int = 16000):
     """
     Extracts audio features from PCM data:
     - Pitch (F0) Mean/Std
@@ -1,8 +1,10 @@
 import os
 import time
 import wave
+import queue
 import asyncio
 import logging
+import threading
 from datetime import datetime
 from collections import defaultdict
 from app.core import config
@@ -25,6 +27,8 @@ class AudioArchiver:
         self.running = True
         self._buffers = defaultdict(lambda: {"raw": bytearray(), "processed": bytearray(), "start_time": time.time()})
         self._worker_task = None
+        # Modo --workers: workers repassam os chunks para o processo de serviços
+        self._forward_queue = None
         
         # Garantir diretório base
         os.makedirs(self.base_path, exist_ok=True)
@@ -39,13 +43,39 @@ class AudioArchiver:
         if self._worker_task:
             await self._worker_task
 
-    def archive_chunk(self, balcao_id: str, pcm_chunk: bytes, is_processed: bool = False):
-        """Método síncrono para adicionar um chunk na fila de processamento."""
+    def attach_forwarder(self, forward_queue):
+        """Modo --workers: archive_chunk envia para o processo de serviços em vez da fila local."""
+        self._forward_queue = forward_queue
+
+    def start_forward_drain(self, forward_queue):
+        """Processo de serviços: thread que repassa os chunks vindos dos workers para a fila local."""
+        loop = asyncio.get_running_loop()
+
+        def drain():
+            while True:
+                item = forward_queue.get()
+                if item is None:
+                    break
+                loop.call_soon_threadsafe(self._enqueue, item)
+
+        threading.Thread(target=drain, name="archiver-forward-drain", daemon=True).start()
+
+    def _enqueue(self, item):
         try:
-            self.queue.put_nowait((balcao_id, pcm_chunk, is_processed, time.time()))
+            self.queue.put_nowait(item)
         except asyncio.QueueFull:
             logger.warning("Fila do AudioArchiver cheia! Descartando chunk.")
 
+    def archive_chunk(self, balcao_id: str, pcm_chunk: bytes | memoryview, is_processed: bool = False):
+        """Método síncrono para adicionar um chunk na fila de processamento."""
+        if self._forward_queue is not None:
+            try:
+                self._forward_queue.put_nowait((balcao_id, bytes(pcm_chunk), is_processed, time.time()))
+            except queue.Full:
+                logger.warning("Fila de repasse do AudioArchiver cheia! Descartando chunk.")
+            return
+        self._enqueue((balcao_id, pcm_chunk, is_processed, time.time()))
+
     async def _worker(self):
         while self.running or not self.queue.empty():
             item = await self.queue.get()
@@ -89,7 +119,7 @@ class AudioArchiver:
             filepath = os.path.join(dir_path, filename)
             await asyncio.to_thread(self._write_wav, filepath, buf["processed"])
 
-    def _write_wav(self, path: str, pcm_data: bytes, sample_rate: int = 16000):
+    def _write_wav(self, path: str, pcm_data: bytes | bytearray | memoryview, sample_rate: int = 16000):
         try:
             with wave.open(path, 'wb') as wf:
                 wf.setnchannels(1)
@@ -99,7 +129,7 @@ class AudioArchiver:
         except Exception as e:
             logger.error(f"Erro ao salvar WAV {path}: {e}")
 
-    def save_interaction_audio(self, balcao_id: str, pcm_data: bytes, interaction_id: int) -> str:
+    def save_interaction_audio(self, balcao_id: str, pcm_data: bytes | memoryview, interaction_id: int) -> str:
         """
         Salva um áudio de uma interação específica e retorna o caminho relativo.
         Usado para associar o áudio bruto à interação no banco, agora contendo o ID real.
@@ -0,0 +1,575 @@
+import asyncio
+import time
+import imageio_ffmpeg
+from collections import deque
+from app.core import config, metrics
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+# Telemetria por balcão (lida pelo endpoint /api/metrics/pcm_queues)
+# balcao_id -> {"depth_bytes", "max_depth_bytes", "dropped_bytes", ...}
+# Só conexões abertas: a entrada sai quando a PCMQueue da conexão é fechada.
+PCM_QUEUE_STATS: dict[str, dict] = {}
+
+
+def _new_queue_stats() -> dict:
+    return {
+        "policy": config.PCM_QUEUE_OVERFLOW_POLICY,
+        "depth_bytes": 0,
+        "depth_blocks": 0,
+        "max_depth_bytes": 0,
+        "dropped_bytes": 0,
+        "dropped_blocks": 0,
+        "blocked_puts": 0,
+        "blocked_seconds": 0.0,
+        "shed_count": 0,
+    }
+
+
+class PCMQueue:
+    """
+    Fila de PCM com orçamento em bytes (substitui o asyncio.Queue sem limite).
+    - Junta leituras pequenas em blocos alinhados a frame (block_bytes, múltiplo de 2 bytes).
+    - Quando a fila passa de max_bytes aplica a política:
+        "block"       -> put() espera o consumer (backpressure: ffmpeg stdin / websocket para de ler)
+        "drop_oldest" -> descarta os blocos mais antigos
+        "shed"        -> fecha a fila e marca `shed`; o handler derruba a conexão
+    - get() devolve b"" (sentinela) quando a fila foi fechada e esvaziou.
+    """
+    FRAME_BYTES = 2  # PCM16 mono
+
+    def __init__(self, max_bytes: int | None = None, block_bytes: int | None = None,
+                 policy: str | None = None, balcao_id: str | None = None):
+        self.max_bytes = max_bytes or config.PCM_QUEUE_MAX_BYTES
+        block = block_bytes or config.PCM_QUEUE_BLOCK_BYTES
+        self.block_bytes = max(self.FRAME_BYTES, block - block % self.FRAME_BYTES)
+        self.policy = policy or config.PCM_QUEUE_OVERFLOW_POLICY
+        self.balcao_id = balcao_id
+        self.shed = False
+
+        self._blocks: deque[bytearray] = deque()
+        self._pending = bytearray()  # sobra < FRAME_BYTES esperando completar o frame
+        self._bytes = 0
+        self._closed = False
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+        self.stats = _new_queue_stats()
+        self.stats["policy"] = self.policy
+        if balcao_id is not None:
+            PCM_QUEUE_STATS[balcao_id] = self.stats
+
+    def qsize_bytes(self) -> int:
+        return self._bytes
+
+    def _update_depth(self):
+        self.stats["depth_bytes"] = self._bytes
+        self.stats["depth_blocks"] = len(self._blocks)
+        if self._bytes > self.stats["max_depth_bytes"]:
+            self.stats["max_depth_bytes"] = self._bytes
+
+    def _append(self, data: bytes):
+        view = memoryview(data)
+        if self._blocks and len(self._blocks[-1]) < self.block_bytes:
+            tail = self._blocks[-1]
+            room = self.block_bytes - len(tail)
+            tail += view[:room]
+            view = view[room:]
+        while view:
+            self._blocks.append(bytearray(view[:self.block_bytes]))
+            view = view[self.block_bytes:]
+
+    async def put(self, data: bytes):
+        if self._closed or not data:
+            return
+
+        if self._pending:
+            data = bytes(self._pending) + data
+        n = len(data) - (len(data) % self.FRAME_BYTES)
+        self._pending = bytearray(data[n:])
+        if not n:
+            return
+        self._append(data[:n])
+
+        self._bytes += n
+        self._not_empty.set()
+        self._update_depth()
+
+        if self._bytes > self.max_bytes:
+            await self._overflow()
+
+    async def _overflow(self):
+        if self.policy == "drop_oldest":
+            while self._bytes > self.max_bytes and len(self._blocks) > 1:
+                old = self._blocks.popleft()
+                self._bytes -= len(old)
+                self.stats["dropped_bytes"] += len(old)
+                self.stats["dropped_blocks"] += 1
+            self._update_depth()
+
+        elif self.policy == "shed":
+            if not self.shed:
+                self.shed = True
+                self.stats["shed_count"] += 1
+                print(f"[{self.balcao_id}] PCMQueue estourou ({self._bytes}B > {self.max_bytes}B). Derrubando conexão.")
+            self.close()
+
+        else:  # block
+            self.stats["blocked_puts"] += 1
+            t0 = time.monotonic()
+            while self._bytes > self.max_bytes and not self._closed:
+                self._not_full.clear()
+                await self._not_full.wait()
+            self.stats["blocked_seconds"] += time.monotonic() - t0
+
+    async def get(self) -> bytes:
+        while not self._blocks:
+            if self._closed:
+                return b""
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        block = self._blocks.popleft()
+        self._bytes -= len(block)
+        if self._bytes <= self.max_bytes:
+            self._not_full.set()
+        self._update_depth()
+        return bytes(block)
+
+    def close(self):
+        self._closed = True
+        self._not_empty.set()
+        self._not_full.set()
+        # reconexão do mesmo balcão pode já ter registrado a fila nova: só remove a própria
+        if self.balcao_id is not None and PCM_QUEUE_STATS.get(self.balcao_id) is self.stats:
+            del PCM_QUEUE_STATS[self.balcao_id]
+
+
+class FFmpegWebMToPCMStream:
+    """
+    Mantém um ffmpeg vivo por conexão:
+      stdin  <- chunks webm/opus do websocket
+      stdout -> pcm16le 16k mono em stream
+    """
+    def __init__(self, sample_rate=16000, balcao_id: str | None = None):
+        self.sample_rate = sample_rate
+        self.proc = None
+        self._reader_task = None
+        self.pcm_queue = PCMQueue(balcao_id=balcao_id)
+        self._closed = False
+
+    async def start(self):
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        self.proc = await asyncio.create_subprocess_exec(
+            ffmpeg,
+            "-loglevel", "error",
+            "-i", "pipe:0",
+            "-f", "s16le",
+            "-ar", str(self.sample_rate),
+            "-ac", "1",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._reader_task = asyncio.create_task(self._read_stdout())
+
+    async def _read_stdout(self):
+        try:
+            while not self._closed:
+                chunk = await self.proc.stdout.read(4096)
+                if not chunk:
+                    break
+                await self.pcm_queue.put(chunk)
+        except Exception:
+            pass
+
+    async def write_webm(self, data: bytes):
+        if self._closed or not self.proc or not self.proc.stdin:
+            return
+        with metrics.DECODE_SECONDS.labels("ffmpeg").time():
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+
+    async def read_pcm(self) -> bytes:
+        return await self.pcm_queue.get()
+
+    async def close(self):
+        self._closed = True
+
+        # destrava o consumer (sentinela) e um eventual put() bloqueado
+        self.pcm_queue.close()
+
+        if self.proc and self.proc.stdin:
+            try:
+                self.proc.stdin.close()
+            except:
+                pass
+
+        if self._reader_task:
+            self._reader_task.cancel()
+
+        if self.proc:
+            try:
+                self.proc.kill()
+            except:
+                pass
+
+
+# ---------------------------------------------------------------------
+# Demux WebM (EBML) incremental — só o necessário para extrair Opus
+# ---------------------------------------------------------------------
+_ID_EBML = 0x1A45DFA3
+_ID_SEGMENT = 0x18538067
+_ID_CLUSTER = 0x1F43B675
+_ID_TRACKS = 0x1654AE6B
+_ID_TRACK_ENTRY = 0xAE
+_ID_TRACK_NUMBER = 0xD7
+_ID_CODEC_ID = 0x86
+_ID_CODEC_PRIVATE = 0x63A2
+_ID_BLOCK_GROUP = 0xA0
+_ID_BLOCK = 0xA1
+_ID_SIMPLE_BLOCK = 0xA3
+
+# Masters em que "entramos" (os filhos são lidos como irmãos, sem pilha)
+_MASTER_IDS = {_ID_SEGMENT, _ID_CLUSTER, _ID_TRACKS, _ID_TRACK_ENTRY, _ID_BLOCK_GROUP}
+# Elementos cujo conteúdo precisamos bufferizar; o resto é pulado sem copiar
+_DATA_IDS = {_ID_TRACK_NUMBER, _ID_CODEC_ID, _ID_CODEC_PRIVATE, _ID_BLOCK, _ID_SIMPLE_BLOCK}
+
+_MAX_ELEMENT_BYTES = 4 * 1024 * 1024
+_RESYNC_MARKERS = (b"\x1f\x43\xb6\x75", b"\x1a\x45\xdf\xa3")
+
+
+def _read_vint(buf, pos: int, keep_marker: bool) -> tuple[int | None, int]:
+    """
+    Lê um inteiro de tamanho variável EBML em buf[pos:].
+    Retorna (valor, n_bytes) ou (None, 0) se ainda faltam bytes.
+    """
+    if pos >= len(buf):
+        return None, 0
+    first = buf[pos]
+    if first == 0:
+        raise ValueError("vint EBML inválido")
+    length = 9 - first.bit_length()
+    if pos + length > len(buf):
+        return None, 0
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for i in range(1, length):
+        value = (value << 8) | buf[pos + i]
+    return value, length
+
+
+def _split_laced(frames_data: bytes, lacing: int) -> list[bytes] | None:
+    """
+    Separa os frames de um bloco com lacing (flags & 0x06): 0x02 Xiph, 0x04 fixo, 0x06 EBML.
+    frames_data começa no byte "número de frames - 1". None se o bloco estiver truncado.
+    """
+    if not frames_data:
+        return None
+    count = frames_data[0] + 1
+    pos = 1
+    sizes = []
+    if lacing == 0x02:
+        for _ in range(count - 1):
+            size = 0
+            while True:
+                if pos >= len(frames_data):
+                    return None
+                b = frames_data[pos]
+                pos += 1
+                size += b
+                if b != 255:
+                    break
+            sizes.append(size)
+    elif lacing == 0x06:
+        size, n = _read_vint(frames_data, pos, keep_marker=False)
+        if size is None:
+            return None
+        pos += n
+        sizes.append(size)
+        for _ in range(count - 2):
+            raw, n = _read_vint(frames_data, pos, keep_marker=False)
+            if raw is None:
+                return None
+            pos += n
+            size += raw - ((1 << (7 * n - 1)) - 1)   # diferença com sinal em relação ao anterior
+            sizes.append(size)
+    else:  # 0x04: todos do mesmo tamanho
+        total = len(frames_data) - pos
+        if total % count:
+            return None
+        sizes = [total // count] * (count - 1)
+
+    frames = []
+    for size in sizes:
+        if size < 0 or pos + size > len(frames_data):
+            return None
+        frames.append(frames_data[pos:pos + size])
+        pos += size
+    frames.append(frames_data[pos:])
+    return frames
+
+
+class WebMOpusDemuxer:
+    """
+    Parser EBML incremental para o WebM que o MediaRecorder manda em pedaços.
+    feed() devolve eventos na ordem do stream:
+      ("codec", codec_private)  -> trilha Opus (re)declarada (novo header EBML)
+      ("packet", opus_frame)    -> um pacote Opus da trilha de áudio
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self._skip = 0
+        self._tracks: list[dict] = []
+        self._audio_track: int | None = None
+        self.laced_blocks = 0
+        self.invalid_blocks = 0
+        self.unsupported_codec: str | None = None
+
+    def _select_track(self, events: list):
+        if not self._tracks:
+            return
+        tracks, self._tracks = self._tracks, []
+        for t in tracks:
+            if t.get("codec") == "A_OPUS" and "number" in t:
+                self._audio_track = t["number"]
+                self.unsupported_codec = None
+                events.append(("codec", t.get("private")))
+                return
+        self._audio_track = None
+        self.unsupported_codec = ",".join(str(t.get("codec")) for t in tracks)
+
+    def _handle_block(self, payload: bytes, events: list):
+        track, n = _read_vint(payload, 0, keep_marker=False)
+        if track is None or track != self._audio_track or len(payload) < n + 3:
+            return
+        flags = payload[n + 2]
+        lacing = flags & 0x06
+        if not lacing:
+            events.append(("packet", payload[n + 3:]))
+            return
+        # O MediaRecorder não usa lacing, mas outros muxers (ffmpeg, mkvmerge) podem usar
+        self.laced_blocks += 1
+        frames = _split_laced(payload[n + 3:], lacing)
+        if frames is None:
+            self.invalid_blocks += 1
+            print(f"[WebMDemux] Bloco com lacing inválido/truncado descartado ({len(payload)} bytes).")
+            return
+        events.extend(("packet", f) for f in frames)
+
+    def _handle(self, eid: int, payload: bytes, events: list):
+        if eid == _ID_SIMPLE_BLOCK or eid == _ID_BLOCK:
+            if self._tracks:
+                self._select_track(events)
+            self._handle_block(payload, events)
+        elif not self._tracks:
+            return
+        elif eid == _ID_TRACK_NUMBER:
+            self._tracks[-1]["number"] = int.from_bytes(payload, "big")
+        elif eid == _ID_CODEC_ID:
+            self._tracks[-1]["codec"] = payload.decode("ascii", "replace").rstrip("\x00")
+        elif eid == _ID_CODEC_PRIVATE:
+            self._tracks[-1]["private"] = payload
+
+    def _resync(self, pos: int) -> int:
+        found = [i for i in (self._buf.find(m, pos + 1) for m in _RESYNC_MARKERS) if i >= 0]
+        if found:
+            return min(found)
+        return max(pos, len(self._buf) - 3)
+
+    def feed(self, data: bytes) -> list[tuple[str, bytes | None]]:
+        self._buf += data
+        buf = self._buf
+        events = []
+        pos = 0
+
+        while True:
+            if self._skip:
+                n = min(self._skip, len(buf) - pos)
+                pos += n
+                self._skip -= n
+                if self._skip:
+                    break
+
+            try:
+                eid, id_len = _read_vint(buf, pos, keep_marker=True)
+                if eid is None:
+                    break
+                size, size_len = _read_vint(buf, pos + id_len, keep_marker=False)
+                if size is None:
+                    break
+                unknown_size = size == (1 << (7 * size_len)) - 1
+                if unknown_size and eid not in _MASTER_IDS:
+                    raise ValueError(f"elemento 0x{eid:X} com tamanho desconhecido")
+                if size > _MAX_ELEMENT_BYTES and eid in _DATA_IDS:
+                    raise ValueError(f"elemento 0x{eid:X} grande demais ({size} bytes)")
+            except ValueError as e:
+                print(f"[WebMDemux] {e}. Ressincronizando...")
+                pos = self._resync(pos)
+                continue
+
+            header_len = id_len + size_len
+
+            if eid in _MASTER_IDS:
+                pos += header_len
+                if eid == _ID_TRACK_ENTRY:
+                    self._tracks.append({})
+                elif eid == _ID_CLUSTER and self._tracks:
+                    self._select_track(events)
+                continue
+
+            if eid == _ID_EBML:
+                # Novo header no meio do stream (ex: cliente reiniciou o MediaRecorder)
+                self._tracks = []
+                self._audio_track = None
+
+            if eid in _DATA_IDS:
+                end = pos + header_len + size
+                if end > len(buf):
+                    break
+                payload = bytes(buf[pos + header_len:end])
+                pos = end
+                self._handle(eid, payload, events)
+            else:
+                pos += header_len
+                self._skip = size
+
+        del buf[:pos]
+        return events
+
+
+class PyAVWebMToPCMStream:
+    """
+    Decodifica WebM/Opus dentro do próprio processo (sem ffmpeg filho):
+      write_webm <- chunks webm/opus do websocket (demux EBML incremental + libopus)
+      pcm_queue  -> pcm16le 16k mono, mesma interface do FFmpegWebMToPCMStream
+
+    O decode roda numa thread (asyncio.to_thread; libopus/swresample soltam o GIL): ~2.5ms
+    de CPU por segundo de áudio que, com dezenas de conexões, travariam o event loop. Um
+    lock por stream mantém a ordem dos chunks. close() esvazia o decoder e o resampler
+    para não perder o final do áudio.
+    """
+    def __init__(self, sample_rate=16000, balcao_id: str | None = None):
+        self.sample_rate = sample_rate
+        self.pcm_queue = PCMQueue(balcao_id=balcao_id)
+        self._closed = False
+        self._demuxer = WebMOpusDemuxer()
+        self._codec = None
+        self._resampler = None
+        self._warned_codec = None
+        self._lock = asyncio.Lock()
+        self.decode_errors = 0
+
+    async def start(self):
+        if av is None:
+            raise RuntimeError("PyAV (av) não instalado")
+
+    def _resample(self, frame) -> bytes:
+        return b"".join(rf.to_ndarray().tobytes() for rf in self._resampler.resample(frame))
+
+    def flush(self) -> bytes:
+        """Esvazia o decoder e o resampler (fim do stream ou troca de codec). Síncrono."""
+        if self._codec is None:
+            return b""
+        out = bytearray()
+        try:
+            for frame in self._codec.decode(None):
+                out += self._resample(frame)
+        except Exception:
+            self.decode_errors += 1
+        out += self._resample(None)
+        return bytes(out)
+
+    def _open_codec(self, codec_private: bytes | None) -> bytes:
+        """Abre o decoder da trilha; devolve o final do decoder anterior (se havia)."""
+        tail = self.flush()
+        codec = av.CodecContext.create("opus", "r")
+        if codec_private:
+            codec.extradata = codec_private
+        self._codec = codec
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+        return tail
+
+    def decode(self, data: bytes) -> bytes:
+        """Demux + decode síncrono de um chunk webm. Retorna o PCM produzido (pode ser vazio)."""
+        out = bytearray()
+        for kind, payload in self._demuxer.feed(data):
+            if kind == "codec":
+                out += self._open_codec(payload)
+                continue
+            if self._codec is None:
+                continue
+            try:
+                frames = self._codec.decode(av.Packet(payload))
+            except Exception:
+                self.decode_errors += 1
+                continue
+            for frame in frames:
+                out += self._resample(frame)
+
+        unsupported = self._demuxer.unsupported_codec
+        if unsupported and unsupported != self._warned_codec:
+            print(f"[PyAVDecoder] Codec não suportado no WebM: {unsupported}")
+            self._warned_codec = unsupported
+        return bytes(out)
+
+    async def write_webm(self, data: bytes):
+        if self._closed:
+            return
+        async with self._lock:
+            if self._closed:
+                return
+            with metrics.DECODE_SECONDS.labels("pyav").time():
+                pcm = await asyncio.to_thread(self.decode, data)
+            if pcm:
+                await self.pcm_queue.put(pcm)
+
+    async def read_pcm(self) -> bytes:
+        return await self.pcm_queue.get()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        async with self._lock:
+            tail = await asyncio.to_thread(self.flush)
+            # sem esperar vaga: na desconexão o consumer pode já ter parado
+            if tail and self.pcm_queue.qsize_bytes() + len(tail) <= self.pcm_queue.max_bytes:
+                await self.pcm_queue.put(tail)
+            self._codec = None
+            self._resampler = None
+
+        # destrava o consumer (sentinela) e um eventual put() bloqueado
+        self.pcm_queue.close()
+
+
+def _collect_queue_stats():
+    samples = []
+    for balcao_id, st in list(PCM_QUEUE_STATS.items()):
+        labels = {"balcao_id": balcao_id}
+        samples.append(("balto_pcm_queue_depth_bytes", "gauge", "Bytes de PCM na fila do decoder", labels, st["depth_bytes"]))
+        samples.append(("balto_pcm_queue_dropped_bytes_total", "counter", "Bytes descartados (drop_oldest)", labels, st["dropped_bytes"]))
+        samples.append(("balto_pcm_queue_blocked_seconds_total", "counter", "Tempo em backpressure (block)", labels, st["blocked_seconds"]))
+        samples.append(("balto_pcm_queue_shed_total", "counter", "Conexões derrubadas (shed)", labels, st["shed_count"]))
+    return samples
+
+
+metrics.register_collector(_collect_queue_stats)
+
+
+def create_pcm_stream(sample_rate=16000, balcao_id: str | None = None):
+    """
+    Escolhe o decoder WebM -> PCM conforme config.DECODER_BACKEND.
+    "pyav" decodifica no próprio processo; "ffmpeg" (padrão) abre um subprocesso por conexão.
+    Se o PyAV não estiver instalado, cai para o ffmpeg.
+    """
+    if config.DECODER_BACKEND == "pyav":
+        if av is not None:
+            return PyAVWebMToPCMStream(sample_rate=sample_rate, balcao_id=balcao_id)
+        print("[Decoder] DECODER_BACKEND=pyav mas PyAV não está instalado. Usando ffmpeg.")
+    return FFmpegWebMToPCMStream(sample_rate=sample_rate, balcao_id=balcao_id)
@@ -29,7 +29,7 @@ def decode_webm_to_pcm16le(webm_bytes: bytes, sample_rate: int = 16000) -> bytes
         print(f"[FFMPEG] Exception: {e}")
         return b""
 
-def dump_audio_to_disk(audio_bytes: bytes, balcao_id: str):
+def dump_audio_to_disk(audio_bytes: bytes | memoryview, balcao_id: str):
     """Salva o áudio bruto para análise (Fase 1.2)."""
     if not os.path.exists(config.AUDIO_DUMP_DIR):
         os.makedirs(config.AUDIO_DUMP_DIR)
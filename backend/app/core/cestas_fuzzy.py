@@ -0,0 +1,170 @@
+import re
+import unicodedata
+from collections import defaultdict, deque
+from app.core import config, metrics
+
+# =========================
+# Índice aproximado dos nomes de medicamento das chaves do lookup de cestas.
+#
+# O lookup_cesta só acha chave exata; erro de STT/grafia ("dor flex", "losartan",
+# "neusaldina") caía no HINT/LLM de classificação. Aqui o medicamento sem chave é
+# comparado com os ~300 nomes conhecidos por trigramas de caracteres (Dice), sobre o
+# nome sem acento e sem espaços/pontuação ("dor flex" == "dorflex").
+#
+#   score >= CESTAS_FUZZY_THRESHOLD e folga de _MARGIN para o 2º colocado -> usa o nome
+#   CESTAS_FUZZY_NEAR <= score < limiar (ou empate)                       -> near miss (só conta)
+#
+# Trigramas também aproximam remédios DIFERENTES quando um nome contém o outro
+# ("citalopram" x "escitalopram", 0.75). Por isso o candidato ainda precisa parecer erro
+# de grafia: contido no outro só com 1 letra de diferença ("losartan" -> losartana) e
+# distância de edição <= _MAX_EDIT_RATIO do nome. Reprovado aí vira near miss.
+#
+# Modos (CESTAS_FUZZY_MODE), como o pré-filtro do LLM:
+#   off      só chave exata
+#   shadow   calcula e conta (would_fuzzy), mas não troca o medicamento
+#   enforce  usa a cesta do nome aproximado
+#
+# Índice invertido trigrama -> nomes: a consulta só pontua os nomes que dividem algum
+# trigrama (~50-150 µs). Acompanhe /api/metrics/cestas_lookup e os exemplos recentes
+# de near miss antes de mexer no limiar.
+# =========================
+
+_MARGIN = 0.1      # o melhor precisa ganhar do 2º por pelo menos isso (ex.: "vitamina" x c/d3/k2)
+_MIN_LEN = 4       # nomes curtos ("dor", "eno") não têm trigramas suficientes
+_MAX_EDIT_RATIO = 0.25
+
+LOOKUP_STATS = {
+    "lookups": 0,
+    "exact_hits": 0,
+    "fuzzy_hits": 0,        # enforce: cesta servida pelo nome aproximado
+    "would_fuzzy": 0,       # shadow: o enforce teria servido
+    "near_misses": 0,       # candidato abaixo do limiar, empatado ou reprovado na grafia: não usado
+    "misses": 0,
+    "fuzzy_checks": 0,
+    "fuzzy_us_total": 0.0,
+    "fuzzy_us_max": 0.0,
+}
+
+CESTAS_LOOKUPS = metrics.counter(
+    "balto_cestas_lookup_total",
+    "Lookups de cesta por resultado (exact, fuzzy, would_fuzzy, near_miss, miss)",
+    ("result",),
+)
+
+_recent = deque(maxlen=20)
+_RE_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def compact(name: str) -> str:
+    """Minúsculo, sem acento, sem espaços/pontuação (algumas chaves do JSON vêm com acento)."""
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", name.lower()) if not unicodedata.combining(ch))
+    return _RE_NON_ALNUM.sub("", s)
+
+
+def _trigrams(s: str) -> set:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _edit_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def looks_like_typo(query: str, name: str) -> bool:
+    """Nomes compactados. False quando são provavelmente remédios distintos."""
+    if query == name:
+        return True
+    if (query in name or name in query) and abs(len(query) - len(name)) > 1:
+        return False
+    return _edit_distance(query, name) <= max(1, int(_MAX_EDIT_RATIO * max(len(query), len(name))))
+
+
+class FuzzyIndex:
+    """best(nome) -> (nome_conhecido | None, score, "match" | "near_miss" | "miss")."""
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self._known = set(self.names)
+        self._grams = [_trigrams(compact(n)) for n in self.names]
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for i, grams in enumerate(self._grams):
+            for g in grams:
+                self._postings[g].append(i)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._known
+
+    def best(self, name: str, threshold: float | None = None, near: float | None = None):
+        threshold = config.CESTAS_FUZZY_THRESHOLD if threshold is None else threshold
+        near = config.CESTAS_FUZZY_NEAR if near is None else near
+
+        query = compact(name)
+        if len(query) < _MIN_LEN:
+            return None, 0.0, "miss"
+
+        grams = _trigrams(query)
+        shared: dict[int, int] = defaultdict(int)
+        for g in grams:
+            for i in self._postings.get(g, ()):
+                shared[i] += 1
+        if not shared:
+            return None, 0.0, "miss"
+
+        scored = sorted(((2 * n / (len(grams) + len(self._grams[i])), i) for i, n in shared.items()),
+                        reverse=True)[:2]
+        score, i = scored[0]
+        second = scored[1][0] if len(scored) > 1 else 0.0
+        score = round(score, 3)
+
+        if score >= threshold and score - second >= _MARGIN and looks_like_typo(query, compact(self.names[i])):
+            return self.names[i], score, "match"
+        if score >= near:
+            return self.names[i], score, "near_miss"
+        return None, score, "miss"
+
+
+def record(result: str, us: float | None = None, med: str = "", candidate: str | None = None,
+           score: float = 0.0):
+    """result: exact | fuzzy | would_fuzzy | near_miss | miss. us = tempo do best() (quando rodou)."""
+    LOOKUP_STATS["lookups"] += 1
+    LOOKUP_STATS["exact_hits" if result == "exact" else
+                 "fuzzy_hits" if result == "fuzzy" else
+                 "would_fuzzy" if result == "would_fuzzy" else
+                 "near_misses" if result == "near_miss" else "misses"] += 1
+    if us is not None:
+        LOOKUP_STATS["fuzzy_checks"] += 1
+        LOOKUP_STATS["fuzzy_us_total"] += us
+        LOOKUP_STATS["fuzzy_us_max"] = max(LOOKUP_STATS["fuzzy_us_max"], us)
+    CESTAS_LOOKUPS.labels(result).inc()
+
+    if result in ("fuzzy", "would_fuzzy", "near_miss"):
+        _recent.append({"result": result, "med": med, "candidato": candidate, "score": score})
+        print(f"[CestasFuzzy] {result}: '{med}' -> '{candidate}' ({score:.2f})")
+
+
+def snapshot() -> dict:
+    n = LOOKUP_STATS["lookups"]
+    checks = LOOKUP_STATS["fuzzy_checks"]
+
+    def rate(k):
+        return round(LOOKUP_STATS[k] / n, 4) if n else None
+
+    return {
+        **{k: v for k, v in LOOKUP_STATS.items() if k not in ("fuzzy_us_total", "fuzzy_us_max")},
+        "mode": config.CESTAS_FUZZY_MODE,
+        "threshold": config.CESTAS_FUZZY_THRESHOLD,
+        "near": config.CESTAS_FUZZY_NEAR,
+        "exact_hit_rate": rate("exact_hits"),
+        "fuzzy_hit_rate": rate("fuzzy_hits"),
+        "would_fuzzy_rate": rate("would_fuzzy"),
+        "near_miss_rate": rate("near_misses"),
+        "miss_rate": rate("misses"),
+        "avg_fuzzy_us": round(LOOKUP_STATS["fuzzy_us_total"] / checks, 1) if checks else None,
+        "max_fuzzy_us": round(LOOKUP_STATS["fuzzy_us_max"], 1),
+        "recent": list(_recent),
+    }
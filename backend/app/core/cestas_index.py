@@ -0,0 +1,139 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+
+# =========================
+# Índice binário do cestas_produtos_sintomas_doencas.json (somente leitura, via mmap).
+#
+# O JSON (3.3 MB, ~7k chaves) vira um dict Python de dezenas de MB por worker. O índice
+# guarda as chaves ordenadas e os itens já limpos num arquivo só; o lookup faz busca
+# binária direto no mmap, e os workers dividem a mesma cópia no page cache.
+#
+# Layout (little-endian):
+#   header   MAGIC(4) VERSION(u32) COUNT(u32) SHA1 do JSON de origem(20)
+#   key_off  (COUNT+1) x u32   início de cada chave em KEYS (+ fim)
+#   val_off  (COUNT+1) x u32   início de cada valor em VALUES (+ fim)
+#   KEYS     chaves UTF-8 concatenadas, ordenadas por bytes
+#   VALUES   por chave: JSON compacto [[produto, explicacao], ...]
+#
+# Build: python -m app.tools.build_cestas_index (ou automático no primeiro uso, se o
+# índice não existir ou o SHA1 do JSON mudou).
+# =========================
+
+MAGIC = b"BCIX"
+VERSION = 1
+_HEADER = struct.Struct("<4sII20s")
+_U32 = struct.Struct("<I")
+
+
+def source_sha1(path: str | Path) -> bytes:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+def clean_items(items) -> list[tuple[str, str]]:
+    """Mesma limpeza do lookup_cesta: só itens com produto, textos sem espaços nas pontas."""
+    out = []
+    for it in items if isinstance(items, list) else []:
+        produto = (it.get("produto") or "").strip()
+        explic = (it.get("explicacao") or "").strip()
+        if produto:
+            out.append((produto, explic))
+    return out
+
+
+def build(source: str | Path, dest: str | Path) -> int:
+    """Compila o JSON no índice (escrita atômica). Retorna o número de chaves."""
+    with open(source, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    entries = []
+    for key, items in data.items():
+        cleaned = clean_items(items)
+        if cleaned:
+            entries.append((key.encode("utf-8"),
+                            json.dumps(cleaned, ensure_ascii=False, separators=(",", ":")).encode("utf-8")))
+    entries.sort(key=lambda e: e[0])
+
+    key_off, val_off = [0], [0]
+    for k, v in entries:
+        key_off.append(key_off[-1] + len(k))
+        val_off.append(val_off[-1] + len(v))
+
+    parts = [_HEADER.pack(MAGIC, VERSION, len(entries), source_sha1(source)),
+             struct.pack(f"<{len(key_off)}I", *key_off),
+             struct.pack(f"<{len(val_off)}I", *val_off)]
+    parts.extend(k for k, _ in entries)
+    parts.extend(v for _, v in entries)
+
+    dest = str(dest)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp, dest)
+    return len(entries)
+
+
+class CestasIndex:
+    def __init__(self, path: str | Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, sha1 = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: formato de índice desconhecido")
+        self.count = count
+        self.source_sha1 = sha1
+        self._key_off = _HEADER.size
+        self._val_off = self._key_off + 4 * (count + 1)
+        self._keys_start = self._val_off + 4 * (count + 1)
+        self._vals_start = self._keys_start + _U32.unpack_from(self._mm, self._key_off + 4 * count)[0]
+
+    def _key_at(self, i: int) -> bytes:
+        a, b = struct.unpack_from("<II", self._mm, self._key_off + 4 * i)
+        return self._mm[self._keys_start + a:self._keys_start + b]
+
+    def get(self, key: str) -> list[dict] | None:
+        target = key.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self.count or self._key_at(lo) != target:
+            return None
+        a, b = struct.unpack_from("<II", self._mm, self._val_off + 4 * lo)
+        raw = self._mm[self._vals_start + a:self._vals_start + b]
+        return [{"produto": p, "explicacao": e} for p, e in json.loads(raw)]
+
+    def keys(self):
+        for i in range(self.count):
+            yield self._key_at(i).decode("utf-8")
+
+    def close(self):
+        self._mm.close()
+
+
+def open_or_build(source: str | Path, dest: str | Path) -> CestasIndex:
+    """Abre o índice; se não existir ou estiver desatualizado em relação ao JSON, recompila."""
+    sha1 = source_sha1(source)
+    if os.path.exists(dest):
+        try:
+            index = CestasIndex(dest)
+            if index.source_sha1 == sha1:
+                return index
+            index.close()
+            print(f"[CestasIndex] {dest} desatualizado; recompilando.")
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[CestasIndex] {dest} inválido ({e}); recompilando.")
+    count = build(source, dest)
+    print(f"[CestasIndex] {count} chaves compiladas em {dest}")
+    return CestasIndex(dest)
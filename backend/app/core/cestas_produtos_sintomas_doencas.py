@@ -3,12 +3,19 @@ from __future__ import annotations
 
 import json
 import re
+import time
 import unicodedata
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core import config, cestas_index, cestas_fuzzy
 
 LOOKUP_PATH = Path(__file__).resolve().parent / "cestas_produtos_sintomas_doencas.json"
+INDEX_PATH = Path(config.CESTAS_INDEX_PATH) if config.CESTAS_INDEX_PATH else LOOKUP_PATH.with_suffix(".idx")
 _CACHE: Optional[Dict[str, Any]] = None
+_INDEX: Optional[cestas_index.CestasIndex] = None
+_INDEX_FAILED = False
+_FUZZY: Optional[cestas_fuzzy.FuzzyIndex] = None
 
 def _norm_text(s: str) -> str:
     s = (s or "").strip().lower()
@@ -26,6 +33,46 @@ def _load_lookup() -> Dict[str, Any]:
         _CACHE = json.load(f)
     return _CACHE
 
+def _get_index() -> Optional[cestas_index.CestasIndex]:
+    """Índice mmap (app/core/cestas_index.py); None = usar o dict do JSON."""
+    global _INDEX, _INDEX_FAILED
+    if _INDEX is not None or _INDEX_FAILED or not config.CESTAS_INDEX_ENABLE:
+        return _INDEX
+    try:
+        _INDEX = cestas_index.open_or_build(LOOKUP_PATH, INDEX_PATH)
+    except Exception as e:
+        # ex.: diretório somente leitura sem índice compilado
+        print(f"[CestasIndex] Índice indisponível ({e}); usando o JSON em memória.")
+        _INDEX_FAILED = True
+    return _INDEX
+
+def preload() -> None:
+    """Abre o índice (ou carrega o JSON) antes do primeiro lookup; chamado no startup."""
+    if _get_index() is None:
+        _load_lookup()
+    if config.CESTAS_FUZZY_MODE in ("shadow", "enforce"):
+        _get_fuzzy()
+
+def iter_keys() -> Iterator[str]:
+    index = _get_index()
+    return index.keys() if index is not None else iter(_load_lookup())
+
+def _get_items(key: str) -> Optional[List[Dict[str, str]]]:
+    index = _get_index()
+    if index is not None:
+        return index.get(key)
+    out = [{"produto": p, "explicacao": e} for p, e in cestas_index.clean_items(_load_lookup().get(key))]
+    return out or None
+
+def _get_fuzzy() -> cestas_fuzzy.FuzzyIndex:
+    """Nomes de medicamento (1ª parte das chaves) para o match aproximado."""
+    global _FUZZY
+    if _FUZZY is None:
+        t0 = time.perf_counter()
+        _FUZZY = cestas_fuzzy.FuzzyIndex(k.split("_", 1)[0] for k in iter_keys())
+        print(f"[CestasFuzzy] {len(_FUZZY.names)} medicamentos indexados em {(time.perf_counter() - t0) * 1000:.0f}ms")
+    return _FUZZY
+
 _RE_MED  = re.compile(r"(?:^|;)\s*MED\s*:\s*([^;|]+)", re.IGNORECASE)
 _RE_SINT = re.compile(r"(?:^|;)\s*SINT\s*:\s*([^;|]+)", re.IGNORECASE)
 _RE_DOEN = re.compile(r"(?:^|;)\s*DOENCA\s*:\s*([^;|]+)", re.IGNORECASE)
@@ -50,16 +97,31 @@ def parse_prompt1(normalizado_out: str) -> Tuple[str, str, str]:
 def _key(*parts: str) -> str:
     return "_".join([p for p in parts if p])
 
-def lookup_cesta(med: str, sint: str, doenca: str) -> Optional[List[Dict[str, str]]]:
+def _lookup_exact(med: str, sint: str, doenca: str) -> Optional[List[Dict[str, str]]]:
+    candidates = []
+    if sint and doenca:
+        candidates.append(_key(med, sint, doenca))
+    if sint:
+        candidates.append(_key(med, sint, "default"))
+    candidates.append(_key(med, "default"))
+
+    for k in candidates:
+        out = _get_items(k)
+        if out:
+            return out
+    return None
+
+def lookup_cesta(med: str, sint: str, doenca: str, track: bool = True) -> Optional[List[Dict[str, str]]]:
     """
     Ordem:
       1) med_sint_doenca
       2) med_sint_default
       3) med_default
+    Sem chave para o medicamento, tenta o nome conhecido mais parecido (cestas_fuzzy)
+    e repete a ordem acima com ele (só em CESTAS_FUZZY_MODE=enforce; shadow só conta).
     Retorna lista (4 itens no JSON) ou None
+    track=False: não conta nas estatísticas (consultas de diagnóstico)
     """
-    data = _load_lookup()
-
     med = _norm_text(med)
     sint = _norm_text(sint)
     doenca = _norm_text(doenca)
@@ -67,22 +129,31 @@ def lookup_cesta(med: str, sint: str, doenca: str) -> Optional[List[Dict[str, st
     if not med:
         return None
 
-    candidates = []
-    if sint and doenca:
-        candidates.append(_key(med, sint, doenca))
-    if sint:
-        candidates.append(_key(med, sint, "default"))
-    candidates.append(_key(med, "default"))
+    out = _lookup_exact(med, sint, doenca)
+    mode = config.CESTAS_FUZZY_MODE
+    if out or mode not in ("shadow", "enforce"):
+        if track:
+            cestas_fuzzy.record("exact" if out else "miss")
+        return out
+
+    fuzzy = _get_fuzzy()
+    if med in fuzzy:
+        # medicamento conhecido, só não há cesta para esta combinação
+        if track:
+            cestas_fuzzy.record("miss")
+        return None
 
-    for k in candidates:
-        items = data.get(k)
-        if isinstance(items, list) and items:
-            out = []
-            for it in items:
-                produto = (it.get("produto") or "").strip()
-                explic = (it.get("explicacao") or "").strip()
-                if produto:
-                    out.append({"produto": produto, "explicacao": explic})
-            if out:
-                return out
-    return None
\ No newline at end of file
+    t0 = time.perf_counter()
+    name, score, status = fuzzy.best(med)
+    us = (time.perf_counter() - t0) * 1e6
+
+    if status == "match":
+        fuzzy_out = _lookup_exact(name, sint, doenca)
+        if fuzzy_out:
+            if mode == "enforce":
+                out, status = fuzzy_out, "fuzzy"
+            else:
+                status = "would_fuzzy"
+    if track:
+        cestas_fuzzy.record(status if status != "match" else "miss", us, med, name, score)
+    return out
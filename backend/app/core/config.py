@@ -7,6 +7,8 @@ load_dotenv()
 # Server Settings
 # Server Settings
 PORT = int(os.environ.get("PORT", 8765))
+# Processos servindo a porta (SO_REUSEPORT). 1 = single-process (padrão). CLI: --workers N
+WORKERS = int(os.environ.get("WORKERS", 1))
 
 def parse_bool(value: str | None) -> bool:
     if not value:
@@ -44,6 +46,10 @@ STRESS_REPORT_EMAIL = os.environ.get("STRESS_REPORT_EMAIL")
 
 # API Base URLs
 OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", None) # Default to official if None
+# Chamadas de LLM (pool HTTP compartilhado): limite total, limite por modelo e deadline por chamada
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 32))
+OPENAI_MODEL_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MODEL_MAX_CONCURRENCY", 16))
+OPENAI_TIMEOUT_S = float(os.environ.get("OPENAI_TIMEOUT_S", 20.0))
 ASSEMBLYAI_BASE_URL = "https://api.assemblyai.com"
 
 # Capacity Guard Defaults
@@ -51,6 +57,157 @@ CAPACITY_MAX_CPU_PERCENT = float(os.environ.get("CAPACITY_MAX_CPU_PERCENT", 90.0
 CAPACITY_MAX_RAM_PERCENT = float(os.environ.get("CAPACITY_MAX_RAM_PERCENT", 90.0))
 CAPACITY_MAX_LATENCY_RATIO = float(os.environ.get("CAPACITY_MAX_LATENCY_RATIO", 3.0))
 
+# WebM -> PCM Decoder
+# "ffmpeg" = um subprocesso ffmpeg por conexão (padrão/fallback)
+# "pyav"   = demux + decode Opus dentro do próprio processo (requer PyAV)
+DECODER_BACKEND = os.environ.get("DECODER_BACKEND", "ffmpeg").strip().lower()
+
+# Fila de PCM do decoder (por conexão), com orçamento em bytes
+# Padrão: 30s de áudio (16kHz * 2 bytes), blocos de 100ms
+PCM_QUEUE_MAX_BYTES = int(os.environ.get("PCM_QUEUE_MAX_BYTES", 30 * 32000))
+PCM_QUEUE_BLOCK_BYTES = int(os.environ.get("PCM_QUEUE_BLOCK_BYTES", 3200))
+# "block" (backpressure), "drop_oldest" ou "shed" (derruba a conexão)
+PCM_QUEUE_OVERFLOW_POLICY = os.environ.get("PCM_QUEUE_OVERFLOW_POLICY", "block").strip().lower()
+
+# Pool HTTP compartilhado dos provedores externos (STT)
+HTTP_POOL_MAX_CONNS = int(os.environ.get("HTTP_POOL_MAX_CONNS", 100))
+# Padrões por provedor (cada cliente pode sobrescrever no configure_provider)
+HTTP_PROVIDER_MAX_CONNS = int(os.environ.get("HTTP_PROVIDER_MAX_CONNS", 16))
+HTTP_PROVIDER_RETRIES = int(os.environ.get("HTTP_PROVIDER_RETRIES", 2))
+# Retries permitidos por requisição (0.1 = no máximo ~10% de tráfego extra com o provedor instável)
+HTTP_RETRY_BUDGET_RATIO = float(os.environ.get("HTTP_RETRY_BUDGET_RATIO", 0.1))
+
+# Chaves ElevenLabs: cota mensal por chave e arquivo com o uso acumulado (sobrevive a restarts)
+ELEVENLABS_KEY_LIMIT_MIN = float(os.environ.get("ELEVENLABS_KEY_LIMIT_MIN", 120))
+ELEVENLABS_USAGE_FILE = os.environ.get("ELEVENLABS_USAGE_FILE", "./elevenlabs_usage.json")
+# Intervalo mínimo entre gravações do arquivo de uso
+ELEVENLABS_USAGE_FLUSH_S = float(os.environ.get("ELEVENLABS_USAGE_FLUSH_S", 30.0))
+
+# Roteador de STT: provedores elegíveis (se configurados), em ordem de preferência no empate
+STT_ROUTER_PROVIDERS = [p.strip().lower() for p in os.environ.get("STT_ROUTER_PROVIDERS", "elevenlabs,assemblyai,deepgram").split(",") if p.strip()]
+# Tentativas por chunk (1 = sem failover)
+STT_ROUTER_MAX_ATTEMPTS = int(os.environ.get("STT_ROUTER_MAX_ATTEMPTS", 2))
+# Janela de chamadas por provedor para latência/taxa de erro
+STT_ROUTER_WINDOW = int(os.environ.get("STT_ROUTER_WINDOW", 50))
+# Acima disso o provedor é considerado doente (sai da preferência)
+STT_ROUTER_MAX_ERROR_RATE = float(os.environ.get("STT_ROUTER_MAX_ERROR_RATE", 0.3))
+# Latência assumida para provedor ainda sem amostras
+STT_ROUTER_DEFAULT_LATENCY_S = float(os.environ.get("STT_ROUTER_DEFAULT_LATENCY_S", 2.0))
+# Circuit breaker: falhas seguidas para abrir e tempo aberto antes da chamada de teste
+STT_BREAKER_FAILURES = int(os.environ.get("STT_BREAKER_FAILURES", 5))
+STT_BREAKER_COOLDOWN_S = float(os.environ.get("STT_BREAKER_COOLDOWN_S", 30.0))
+# Orçamento de custo estimado por balcão por hora (0 = sem limite). Estourado: só o provedor mais barato
+STT_COST_BUDGET_PER_HOUR = float(os.environ.get("STT_COST_BUDGET_PER_HOUR", 0.0))
+
+# Codificação do upload para STT por provedor: pcm | wav | flac | opus (flac/opus requerem PyAV)
+STT_UPLOAD_ENCODINGS = dict(
+    item.split("=", 1) for item in
+    os.environ.get("STT_UPLOAD_ENCODINGS", "elevenlabs=pcm,deepgram=wav,assemblyai=wav,gladia=wav").replace(" ", "").lower().split(",")
+    if "=" in item
+)
+STT_UPLOAD_OPUS_BITRATE = int(os.environ.get("STT_UPLOAD_OPUS_BITRATE", 24000))
+STT_UPLOAD_ENCODER_THREADS = int(os.environ.get("STT_UPLOAD_ENCODER_THREADS", 2))
+
+# Corte de silêncio antes do STT (WebRTC VAD + gate de energia por frame de 30ms)
+STT_TRIM_ENABLE = parse_bool(os.environ.get("STT_TRIM_ENABLE"))
+STT_TRIM_VAD_AGGRESSIVENESS = int(os.environ.get("STT_TRIM_VAD_AGGRESSIVENESS", 2))
+# Limiar = max(piso de ruído do chunk * multiplicador, energia mínima)
+STT_TRIM_THRESHOLD_MULTIPLIER = float(os.environ.get("STT_TRIM_THRESHOLD_MULTIPLIER", 1.8))
+STT_TRIM_MIN_ENERGY = float(os.environ.get("STT_TRIM_MIN_ENERGY", 120.0))
+# Margem mantida antes/depois de cada região de fala
+STT_TRIM_PAD_MS = int(os.environ.get("STT_TRIM_PAD_MS", 240))
+# Só silêncios maiores que isso (já com padding) são cortados
+STT_TRIM_MIN_SILENCE_MS = int(os.environ.get("STT_TRIM_MIN_SILENCE_MS", 600))
+# Abaixo dessa economia (fração do chunk) envia o chunk inteiro
+STT_TRIM_MIN_SAVING = float(os.environ.get("STT_TRIM_MIN_SAVING", 0.15))
+
+# Hedging de STT: se o provedor escolhido não responder até o percentil P da própria latência
+# recente, dispara STT_HEDGE_PROVIDER e usa a primeira transcrição válida
+STT_HEDGE_ENABLE = parse_bool(os.environ.get("STT_HEDGE_ENABLE"))
+STT_HEDGE_PROVIDER = os.environ.get("STT_HEDGE_PROVIDER", "deepgram").strip().lower()
+STT_HEDGE_PERCENTILE = float(os.environ.get("STT_HEDGE_PERCENTILE", 0.9))
+STT_HEDGE_MIN_DEADLINE_S = float(os.environ.get("STT_HEDGE_MIN_DEADLINE_S", 1.0))
+# Deadline fixo enquanto o provedor tem menos de STT_HEDGE_MIN_SAMPLES latências medidas
+STT_HEDGE_DEFAULT_DEADLINE_S = float(os.environ.get("STT_HEDGE_DEFAULT_DEADLINE_S", 3.0))
+STT_HEDGE_MIN_SAMPLES = int(os.environ.get("STT_HEDGE_MIN_SAMPLES", 20))
+# Polling dos jobs assíncronos (AssemblyAI, Gladia): intervalo começa em MIN (ou ~70% do
+# tempo típico do provedor) e cresce por BACKOFF até MAX; deadline = HTTP_TIMEOUT do provedor
+JOB_POLL_MIN_INTERVAL_S = float(os.environ.get("JOB_POLL_MIN_INTERVAL_S", 0.3))
+JOB_POLL_MAX_INTERVAL_S = float(os.environ.get("JOB_POLL_MAX_INTERVAL_S", 3.0))
+JOB_POLL_BACKOFF = float(os.environ.get("JOB_POLL_BACKOFF", 1.5))
+# STT local em CPU (provedor "local", faster-whisper int8 num pool de processos)
+LOCAL_STT_MODEL = os.environ.get("LOCAL_STT_MODEL", "small")
+LOCAL_STT_COMPUTE_TYPE = os.environ.get("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_WORKERS = int(os.environ.get("LOCAL_STT_WORKERS", 1))
+# Threads de inferência por worker (cores usados = WORKERS * THREADS)
+LOCAL_STT_THREADS = int(os.environ.get("LOCAL_STT_THREADS", 2))
+LOCAL_STT_LANGUAGE = os.environ.get("LOCAL_STT_LANGUAGE", "pt")
+LOCAL_STT_BEAM_SIZE = int(os.environ.get("LOCAL_STT_BEAM_SIZE", 1))
+LOCAL_STT_TIMEOUT_S = float(os.environ.get("LOCAL_STT_TIMEOUT_S", 15.0))
+# Chunks esperando por worker antes de recusar (o roteador vai para o próximo provedor)
+LOCAL_STT_MAX_QUEUE_PER_WORKER = int(os.environ.get("LOCAL_STT_MAX_QUEUE_PER_WORKER", 2))
+# Usa o STT local quando todos os provedores de nuvem falharem
+STT_LOCAL_FALLBACK = parse_bool(os.environ.get("STT_LOCAL_FALLBACK"))
+# STT em streaming (SIMPLE_CHUNK_MODE): uma sessão websocket por balcão no lugar dos chunks
+# de 5s. Protocolo do Deepgram live; STT_STREAM_URL pode apontar para o stand-in local
+# (python -m app.tools.stt_stream_standin)
+STT_STREAMING_ENABLE = parse_bool(os.environ.get("STT_STREAMING_ENABLE"))
+STT_STREAM_URL = os.environ.get("STT_STREAM_URL", "wss://api.deepgram.com/v1/listen")
+STT_STREAM_MODEL = os.environ.get("STT_STREAM_MODEL", "nova-2")
+STT_STREAM_LANGUAGE = os.environ.get("STT_STREAM_LANGUAGE", "pt")
+# Silêncio que fecha um trecho final no provedor
+STT_STREAM_ENDPOINTING_MS = int(os.environ.get("STT_STREAM_ENDPOINTING_MS", 300))
+STT_STREAM_RECONNECT_MIN_S = float(os.environ.get("STT_STREAM_RECONNECT_MIN_S", 0.5))
+STT_STREAM_RECONNECT_MAX_S = float(os.environ.get("STT_STREAM_RECONNECT_MAX_S", 10.0))
+# Áudio guardado enquanto o provedor está fora (reenviado ao reconectar)
+STT_STREAM_MAX_BUFFER_S = float(os.environ.get("STT_STREAM_MAX_BUFFER_S", 60.0))
+# Áudio já finalizado mantido para recortar o trecho de cada resultado (arquivo/telemetria)
+STT_STREAM_HISTORY_S = float(os.environ.get("STT_STREAM_HISTORY_S", 20.0))
+# Cache de transcrições por hash do áudio (replays/estresse/testes sem gastar cota).
+# Memória (LRU) + disco (limite de tamanho); "stub" fora por padrão (simula latência)
+TRANSCRIPT_CACHE_ENABLE = parse_bool(os.environ.get("TRANSCRIPT_CACHE_ENABLE"))
+TRANSCRIPT_CACHE_DIR = os.environ.get("TRANSCRIPT_CACHE_DIR", "./transcript_cache")
+TRANSCRIPT_CACHE_MEM_ENTRIES = int(os.environ.get("TRANSCRIPT_CACHE_MEM_ENTRIES", 2048))
+TRANSCRIPT_CACHE_DISK_MAX_MB = float(os.environ.get("TRANSCRIPT_CACHE_DISK_MAX_MB", 256))
+TRANSCRIPT_CACHE_SKIP = set(
+    p for p in os.environ.get("TRANSCRIPT_CACHE_SKIP", "stub").replace(" ", "").lower().split(",") if p
+)
+# Cache das chamadas de LLM (normalizar/classificar) por texto normalizado (sem acento/espaços)
+LLM_CACHE_ENABLE = parse_bool(os.environ.get("LLM_CACHE_ENABLE", "true"))
+LLM_CACHE_TTL_S = float(os.environ.get("LLM_CACHE_TTL_S", 6 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 4096))
+# Camada persistente (sqlite, compartilhada entre workers); vazio = só memória
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+# Lookup de cestas via índice binário mmap (compartilhado entre workers) no lugar do JSON em memória.
+# Compilado no primeiro uso se faltar/estiver velho; vazio = ao lado do JSON (.idx)
+CESTAS_INDEX_ENABLE = parse_bool(os.environ.get("CESTAS_INDEX_ENABLE", "true"))
+CESTAS_INDEX_PATH = os.environ.get("CESTAS_INDEX_PATH", "")
+# Match aproximado do medicamento (trigramas) quando não há chave exata no lookup de cestas:
+# "off", "shadow" (só conta o que teria servido) ou "enforce" (serve a cesta do nome aproximado)
+CESTAS_FUZZY_MODE = os.environ.get("CESTAS_FUZZY_MODE", "shadow").strip().lower()
+CESTAS_FUZZY_THRESHOLD = float(os.environ.get("CESTAS_FUZZY_THRESHOLD", 0.7))
+CESTAS_FUZZY_NEAR = float(os.environ.get("CESTAS_FUZZY_NEAR", 0.5))
+# Pré-filtro do LLM de normalização (dicionário de medicamentos/sintomas/doenças):
+# "off", "shadow" (mede falsos negativos, sempre chama o LLM) ou "enforce" (pula o LLM sem termo)
+LLM_PREFILTER_MODE = os.environ.get("LLM_PREFILTER_MODE", "shadow").strip().lower()
+# Provedor falso "stub" (testes locais): "fixed:S", "uniform:A,B" ou "lognormal:MEDIANA,SIGMA"
+STT_STUB_LATENCY = os.environ.get("STT_STUB_LATENCY", "lognormal:0.8,0.6")
+STT_STUB_FAIL_RATE = float(os.environ.get("STT_STUB_FAIL_RATE", 0.0))
+
+# Cache do handshake do websocket (api_key -> balcão, user, preset VAD, funcionário fallback)
+HANDSHAKE_CACHE_TTL_S = float(os.environ.get("HANDSHAKE_CACHE_TTL_S", 60.0))
+# Keys inválidas também ficam em cache (evita martelar o banco com key errada)
+HANDSHAKE_CACHE_NEGATIVE_TTL_S = float(os.environ.get("HANDSHAKE_CACHE_NEGATIVE_TTL_S", 10.0))
+
+# Scheduler de pipelines por conexão (STT + LLM + DB)
+PIPELINE_MAX_IN_FLIGHT = int(os.environ.get("PIPELINE_MAX_IN_FLIGHT", 2))
+PIPELINE_MAX_QUEUED = int(os.environ.get("PIPELINE_MAX_QUEUED", 4))
+# "merge" (junta chunks atrasados numa chamada só) ou "drop" (descarta após o deadline)
+PIPELINE_STALE_POLICY = os.environ.get("PIPELINE_STALE_POLICY", "merge").strip().lower()
+PIPELINE_STALE_DEADLINE_S = float(os.environ.get("PIPELINE_STALE_DEADLINE_S", 15.0))
+# Tamanho máximo de um chunk após merge (padrão: 20s de áudio)
+PIPELINE_MAX_MERGE_BYTES = int(os.environ.get("PIPELINE_MAX_MERGE_BYTES", 20 * 32000))
+
 # Drive Sync Settings
 DRIVE_SYNC_ENABLED = parse_bool(os.environ.get("DRIVE_SYNC_ENABLED", "True"))
 DRIVE_SYNC_INTERVAL_MINUTES = int(os.environ.get("DRIVE_SYNC_INTERVAL_MINUTES", 30))
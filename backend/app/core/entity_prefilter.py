@@ -0,0 +1,180 @@
+import re
+import time
+from collections import deque
+from app.core import config, metrics
+from app.core.cestas_produtos_sintomas_doencas import iter_keys, _norm_text
+
+# =========================
+# Pré-filtro do LLM de normalização: decide, sem rede, se o buffer PODE ter alguma entidade
+# (MED/SINT/DOENCA) que o pipeline usa. Sem nenhuma, o resultado do LLM seria
+# "NADA_RELEVANTE | OUTRO" e a chamada pode ser pulada.
+#
+# Dicionário: medicamentos, sintomas e doenças das chaves do cestas_produtos_sintomas_doencas.json
+# (med_sint_doenca / med_sint_default / med_default) + os sintomas óbvios do prompt de
+# normalização e algumas formas verbais. Trie de tokens sem acento (frases de várias
+# palavras, ex.: "dor de cabeca"); plural simples é dobrado ("aftas" -> "afta").
+#
+# Modos (LLM_PREFILTER_MODE):
+#   off      não consulta
+#   shadow   consulta e chama o LLM sempre; se o filtro diria "pular" e o LLM achou entidade,
+#            conta falso negativo (e guarda o exemplo para ajustar o dicionário)
+#   enforce  pula o LLM quando não há nenhum termo
+#
+# O LLM corrige grafia/fonética ("luzartana" -> losartana); o filtro só vê o que está escrito.
+# Rode em shadow e confira o false_negative_rate antes de ligar o enforce.
+# =========================
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_END = "$"
+
+# Sintomas do prompt de normalização e formas faladas que o LLM transforma em SINT
+_EXTRA_TERMS = (
+    "dor", "febre", "tosse", "coriza", "coceira", "azia", "nausea", "vomito", "diarreia",
+    "congestao", "ardor", "garganta", "doendo", "doi", "dores", "tossindo", "vomitando",
+    "cocando", "ardendo", "enjoo", "enjoada", "enjoado", "gripe", "gripado", "gripada",
+    "resfriado", "resfriada", "febril", "espirrando", "inflamado", "inflamada", "inchado", "inchada",
+)
+
+# Chaves do dicionário que são palavras comuns na conversa ("eu tinha", "coma alguma coisa"):
+# como termo isolado não dizem nada e só derrubariam o skip rate
+_AMBIGUOUS = {"tinha", "coma", "versa", "has", "cana"}
+
+PREFILTER_STATS = {
+    "checked": 0,
+    "matched": 0,
+    "skipped": 0,             # enforce: LLM não chamado
+    "would_skip": 0,          # shadow: o enforce teria pulado
+    "false_negatives": 0,     # shadow: pularia, mas o LLM achou entidade
+    "false_negatives_lookup": 0,   # ...e essa entidade daria uma cesta no lookup
+    "match_us_total": 0.0,
+}
+
+PREFILTER_CHECKS = metrics.counter(
+    "balto_llm_prefilter_total",
+    "Buffers avaliados pelo pré-filtro do LLM por decisão (match, skip, would_skip)",
+    ("result",),
+)
+
+PREFILTER_FALSE_NEGATIVES = metrics.counter(
+    "balto_llm_prefilter_false_negatives_total",
+    "Shadow: buffers que o pré-filtro pularia mas o LLM extraiu entidade",
+)
+
+
+def _fold(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def tokenize(texto: str) -> list[str]:
+    return [_fold(t) for t in _TOKEN_RE.findall(_norm_text(texto))]
+
+
+class EntityPrefilter:
+    """Trie de frases (sequências de tokens). find() devolve as frases encontradas no texto."""
+    def __init__(self, phrases):
+        self._root: dict = {}
+        self.size = 0
+        for phrase in phrases:
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            node = self._root
+            for tok in tokens:
+                node = node.setdefault(tok, {})
+            if _END not in node:
+                node[_END] = " ".join(tokens)
+                self.size += 1
+
+    @classmethod
+    def from_lookup(cls) -> "EntityPrefilter":
+        phrases = set(_EXTRA_TERMS)
+        for key in iter_keys():
+            for part in key.split("_"):
+                if part and part != "default" and part not in _AMBIGUOUS:
+                    phrases.add(part)
+        return cls(phrases)
+
+    def find(self, texto: str, first_only: bool = False) -> list[str]:
+        tokens = tokenize(texto)
+        found = []
+        for i in range(len(tokens)):
+            node = self._root
+            for tok in tokens[i:]:
+                node = node.get(tok)
+                if node is None:
+                    break
+                if _END in node:
+                    found.append(node[_END])
+                    if first_only:
+                        return found
+        return found
+
+    def might_match(self, texto: str) -> bool:
+        return bool(self.find(texto, first_only=True))
+
+
+_prefilter: EntityPrefilter | None = None
+_recent_false_negatives: deque = deque(maxlen=20)
+
+
+def get() -> EntityPrefilter:
+    """Monta o trie na primeira chamada (~7k chaves; o main pré-carrega no startup)."""
+    global _prefilter
+    if _prefilter is None:
+        t0 = time.perf_counter()
+        _prefilter = EntityPrefilter.from_lookup()
+        print(f"[Prefilter] {_prefilter.size} termos carregados em {(time.perf_counter() - t0) * 1000:.0f}ms "
+              f"(modo {config.LLM_PREFILTER_MODE})")
+    return _prefilter
+
+
+def decide(texto: str) -> str:
+    """
+    "off" | "match" | "skip" (enforce: não chamar o LLM) | "would_skip" (shadow: chamar e
+    depois passar o resultado para record_shadow). Registra a decisão nas métricas.
+    """
+    mode = config.LLM_PREFILTER_MODE
+    if mode not in ("shadow", "enforce"):
+        return "off"
+
+    t0 = time.perf_counter()
+    matched = get().might_match(texto)
+    PREFILTER_STATS["match_us_total"] += (time.perf_counter() - t0) * 1e6
+    PREFILTER_STATS["checked"] += 1
+
+    if matched:
+        decision = "match"
+        PREFILTER_STATS["matched"] += 1
+    elif mode == "enforce":
+        decision = "skip"
+        PREFILTER_STATS["skipped"] += 1
+    else:
+        decision = "would_skip"
+        PREFILTER_STATS["would_skip"] += 1
+    PREFILTER_CHECKS.labels(decision).inc()
+    return decision
+
+
+def record_false_negative(texto: str, normalizado: str, has_lookup: bool):
+    """Shadow: o filtro teria pulado este buffer, mas o LLM extraiu entidade."""
+    PREFILTER_STATS["false_negatives"] += 1
+    if has_lookup:
+        PREFILTER_STATS["false_negatives_lookup"] += 1
+    PREFILTER_FALSE_NEGATIVES.inc()
+    _recent_false_negatives.append({"texto": texto[-300:], "normalizado": normalizado, "lookup": has_lookup})
+    print(f"[Prefilter] Falso negativo (shadow): '{texto[-120:]}' -> {normalizado}")
+
+
+def snapshot() -> dict:
+    checked = PREFILTER_STATS["checked"]
+    no_match = PREFILTER_STATS["skipped"] + PREFILTER_STATS["would_skip"]
+    return {
+        **{k: v for k, v in PREFILTER_STATS.items() if k != "match_us_total"},
+        "mode": config.LLM_PREFILTER_MODE,
+        "terms": _prefilter.size if _prefilter is not None else None,
+        "skip_rate": round(no_match / checked, 4) if checked else None,
+        "false_negative_rate": (round(PREFILTER_STATS["false_negatives"] / PREFILTER_STATS["would_skip"], 4)
+                                if PREFILTER_STATS["would_skip"] else None),
+        "avg_match_us": round(PREFILTER_STATS["match_us_total"] / checked, 1) if checked else None,
+        "recent_false_negatives": list(_recent_false_negatives),
+    }
@@ -0,0 +1,111 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Anotações entre parênteses (ex.: "(risos)", "(música)" do ElevenLabs): sempre removidas
+PARENS_PATTERN = r'\(.*?\)'
+
+# Flags globais no início do padrão, ex.: "(?i)hum+" -> "(?i:hum+)" para poder combinar
+_GLOBAL_FLAGS = re.compile(r'^\(\?([imsx]+)\)')
+# Backreference numerada muda de sentido dentro da alternação (os grupos são renumerados)
+_BACKREF = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def _scoped(pattern: str) -> str:
+    m = _GLOBAL_FLAGS.match(pattern)
+    if m:
+        return f"(?{m.group(1)}:{pattern[m.end():]})"
+    return f"(?:{pattern})"
+
+
+class ExclusionFilter:
+    """
+    Limpeza das transcrições com a blacklist de dados/exclusions.json:
+      {"regex_patterns": [...], "exact_match_exclusions": [...]}
+
+    Os padrões são compilados numa regex só (alternação) e as exclusões exatas viram um
+    set, uma vez por versão do arquivo. O arquivo só é relido quando o mtime muda
+    (checado no máximo a cada `check_interval_s`).
+
+    Diferença para o re.sub em sequência de antes: a alternação remove tudo numa passada,
+    então um padrão não casa com texto que só se formou depois de outro ser removido.
+    Se a combinação não compilar (ex.: backreferences), aplica os padrões em sequência.
+    """
+    def __init__(self, path: str, check_interval_s: float = 1.0):
+        self.path = path
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self._compile([], [])
+
+    def _compile(self, patterns: list, exact: list):
+        compiled = [re.compile(PARENS_PATTERN)]
+        for pattern in patterns:
+            if pattern == PARENS_PATTERN:
+                continue
+            try:
+                compiled.append(re.compile(pattern))
+            except re.error as e:
+                print(f"Erro no padrão regex {pattern}: {e}")
+
+        try:
+            if any(_BACKREF.search(p.pattern) for p in compiled):
+                raise re.error("backreference")
+            combined = re.compile("|".join(_scoped(p.pattern) for p in compiled))
+            self._subs = [combined.sub]
+        except re.error:
+            self._subs = [p.sub for p in compiled]
+        self._exact = frozenset(exact)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval_s
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+
+            data = {}
+            if mtime is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    # Mantém a versão anterior; tenta de novo no próximo mtime
+                    print(f"Erro ao carregar exclusões: {e}")
+                    self._mtime = mtime
+                    return
+            self._compile(data.get("regex_patterns", []), data.get("exact_match_exclusions", []))
+            self._mtime = mtime
+            self.reloads += 1
+
+    def _clean(self, texto: str, subs, exact) -> str:
+        if not texto:
+            return ""
+        for sub in subs:
+            texto = sub('', texto)
+        # Normalizar espaços
+        texto = " ".join(texto.split())
+        # Se sobrar apenas um termo da blacklist, limpamos tudo
+        return "" if texto in exact else texto
+
+    def clean(self, texto: str) -> str:
+        self._maybe_reload()
+        return self._clean(texto, self._subs, self._exact)
+
+    def clean_many(self, textos) -> list[str]:
+        """Limpa um lote (ferramentas de reprocessamento): uma checagem de reload para o lote todo."""
+        self._maybe_reload()
+        subs, exact, clean = self._subs, self._exact, self._clean
+        return [clean(t, subs, exact) for t in textos]
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from app import db
+from app.core import config, metrics
+
+HANDSHAKE_LOOKUPS = metrics.counter(
+    "balto_handshake_cache_total",
+    "Lookups do cache de handshake (hit, miss, negative_hit, stale, error)",
+    ("result",),
+)
+
+
+class HandshakeCache:
+    """
+    Cache do contexto de handshake do websocket, por api_key:
+      {"balcao_id", "user_id", "vad_config", "fallback_funcionario_id"}
+
+    - TTL (config.HANDSHAKE_CACHE_TTL_S) e cache negativo para keys inválidas
+      (config.HANDSHAKE_CACHE_NEGATIVE_TTL_S)
+    - single-flight: N handshakes simultâneos da mesma key fazem UMA consulta
+      (reconexão em massa depois de uma queda de rede)
+    - se o banco falhar e houver entrada vencida, usa a vencida
+    - invalidate_balcao() é chamado quando o admin altera o preset de VAD.
+      No modo --workers cada processo tem o seu cache; os outros expiram pelo TTL.
+
+    O dict retornado é compartilhado entre conexões: não alterar.
+    """
+    def __init__(self, ttl_s: float | None = None, negative_ttl_s: float | None = None):
+        self.ttl_s = config.HANDSHAKE_CACHE_TTL_S if ttl_s is None else ttl_s
+        self.negative_ttl_s = config.HANDSHAKE_CACHE_NEGATIVE_TTL_S if negative_ttl_s is None else negative_ttl_s
+        self._entries: dict[str, tuple[float, dict | None]] = {}   # api_key -> (expira_em, ctx)
+        self._inflight: dict[str, asyncio.Task] = {}
+        # muda a cada invalidação: consulta que começou antes não grava resultado velho
+        self._generation = 0
+
+    async def get(self, api_key: str | None) -> dict | None:
+        if not api_key:
+            return None
+
+        now = time.monotonic()
+        entry = self._entries.get(api_key)
+        if entry and entry[0] > now:
+            HANDSHAKE_LOOKUPS.labels("hit" if entry[1] is not None else "negative_hit").inc()
+            return entry[1]
+
+        task = self._inflight.get(api_key)
+        if task is None:
+            # task própria: um handshake cancelado não cancela a consulta dos outros
+            task = asyncio.ensure_future(self._load(api_key, entry))
+            self._inflight[api_key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(api_key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, api_key: str, stale_entry) -> dict | None:
+        generation = self._generation
+        try:
+            ctx = await asyncio.to_thread(db.get_handshake_context, api_key)
+        except Exception as e:
+            if stale_entry and stale_entry[1] is not None:
+                print(f"[HandshakeCache] Erro no banco ({e}); usando contexto vencido de {stale_entry[1]['balcao_id']}")
+                HANDSHAKE_LOOKUPS.labels("stale").inc()
+                return stale_entry[1]
+            print(f"[HandshakeCache] Erro ao validar API Key: {e}")
+            HANDSHAKE_LOOKUPS.labels("error").inc()
+            return None
+
+        HANDSHAKE_LOOKUPS.labels("miss").inc()
+        ttl = self.ttl_s if ctx is not None else self.negative_ttl_s
+        if ttl > 0 and generation == self._generation:
+            self._entries[api_key] = (time.monotonic() + ttl, ctx)
+        return ctx
+
+    def invalidate(self, api_key: str):
+        self._generation += 1
+        self._entries.pop(api_key, None)
+
+    def invalidate_balcao(self, balcao_id: str):
+        self._generation += 1
+        for key, (_, ctx) in list(self._entries.items()):
+            if ctx is not None and ctx["balcao_id"] == balcao_id:
+                del self._entries[key]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+
+# Instância Global
+handshake_cache = HandshakeCache()
@@ -0,0 +1,175 @@
+import asyncio
+import random
+import time
+import aiohttp
+from app.core import config, metrics
+
+# =========================
+# Sessão HTTP compartilhada (keep-alive) para os provedores externos.
+# Uma aiohttp.ClientSession por processo/loop; cada provedor tem seu limite de
+# conexões simultâneas, timeout e orçamento de retries.
+# =========================
+
+HTTP_REQUESTS = metrics.counter(
+    "balto_http_requests_total",
+    "Requisições HTTP a provedores externos por resultado (ok, http_error, retry, exception, budget_exhausted)",
+    ("provider", "result"),
+)
+
+# Status que valem retry em qualquer método: o provedor recusou sem processar
+# (timeout lendo o pedido, rate limit, indisponibilidade momentânea)
+RETRY_STATUSES = {408, 429, 503}
+# 500/502/504 e queda de conexão no meio da requisição: o provedor pode ter processado
+# (e cobrado). Só repete quando a requisição é idempotente (GET do polling ou idempotent=True)
+IDEMPOTENT_RETRY_STATUSES = RETRY_STATUSES | {500, 502, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Falhas antes de o pedido sair (conexão recusada, DNS, timeout de conexão): sempre repetíveis
+NOT_SENT_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+class RetryBudget:
+    """
+    Retries limitados a uma fração das requisições (evita tempestade de retries
+    quando o provedor cai): cada requisição deposita `ratio` tokens, cada retry gasta 1.
+    `min_per_s` garante alguns retries mesmo com pouco tráfego.
+    """
+    def __init__(self, ratio: float, min_per_s: float = 1.0, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last) * self.min_per_s)
+        self._last = now
+
+    def deposit(self):
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class ProviderLimits:
+    def __init__(self, name: str, max_conns: int, timeout_s: float, retries: int, budget_ratio: float):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(max_conns)
+        self.max_conns = max_conns
+        self.timeout = aiohttp.ClientTimeout(total=timeout_s, connect=min(10.0, timeout_s))
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.budget = RetryBudget(budget_ratio)
+
+
+_providers: dict[str, ProviderLimits] = {}
+_session: aiohttp.ClientSession | None = None
+_session_loop = None
+
+
+def configure_provider(name: str, max_conns: int | None = None, timeout_s: float = 30.0,
+                       retries: int | None = None, budget_ratio: float | None = None):
+    """Registra (ou reconfigura) os limites de um provedor. Chamado no import dos clientes."""
+    _providers[name] = ProviderLimits(
+        name,
+        max_conns=max_conns or config.HTTP_PROVIDER_MAX_CONNS,
+        timeout_s=timeout_s,
+        retries=config.HTTP_PROVIDER_RETRIES if retries is None else retries,
+        budget_ratio=config.HTTP_RETRY_BUDGET_RATIO if budget_ratio is None else budget_ratio,
+    )
+
+
+def _limits(name: str) -> ProviderLimits:
+    limits = _providers.get(name)
+    if limits is None:
+        configure_provider(name)
+        limits = _providers[name]
+    return limits
+
+
+def timeout_for(name: str) -> float:
+    """Timeout total do provedor (usado também como teto de polling)."""
+    return _limits(name).timeout_s
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Sessão do loop atual (criada sob demanda; workers do --workers criam a sua após o fork)."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_MAX_CONNS,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+        # semáforos ficam presos ao loop em que foram usados
+        for limits in _providers.values():
+            limits.semaphore = asyncio.Semaphore(limits.max_conns)
+    return _session
+
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def request(provider: str, method: str, url: str, *, data_factory=None,
+                  timeout_s: float | None = None, idempotent: bool | None = None,
+                  **kwargs) -> tuple[int, bytes]:
+    """
+    Faz a requisição com o limite/timeout/retries do provedor. Retorna (status, corpo).
+    data_factory: callable que devolve o corpo a cada tentativa (aiohttp.FormData não
+    pode ser reenviado). Exceções de rede sobem depois de esgotar os retries.
+    idempotent: None = pelo método. POST não idempotente só repete em RETRY_STATUSES
+    ou quando a falha foi antes de o pedido sair (NOT_SENT_ERRORS).
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    retry_statuses = IDEMPOTENT_RETRY_STATUSES if idempotent else RETRY_STATUSES
+    limits = _limits(provider)
+    timeout = aiohttp.ClientTimeout(total=timeout_s) if timeout_s else limits.timeout
+    limits.budget.deposit()
+    session = get_session()
+
+    attempt = 0
+    while True:
+        if data_factory is not None:
+            kwargs["data"] = data_factory()
+        try:
+            async with limits.semaphore:
+                async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+                    body = await resp.read()
+                    status = resp.status
+            if status not in retry_statuses:
+                HTTP_REQUESTS.labels(provider, "ok" if status < 400 else "http_error").inc()
+                return status, body
+            error = None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not idempotent and not isinstance(e, NOT_SENT_ERRORS):
+                HTTP_REQUESTS.labels(provider, "exception").inc()
+                raise
+            status, body, error = None, b"", e
+
+        if attempt >= limits.retries or not limits.budget.try_withdraw():
+            if attempt < limits.retries:
+                HTTP_REQUESTS.labels(provider, "budget_exhausted").inc()
+            if error is not None:
+                HTTP_REQUESTS.labels(provider, "exception").inc()
+                raise error
+            HTTP_REQUESTS.labels(provider, "http_error").inc()
+            return status, body
+
+        attempt += 1
+        HTTP_REQUESTS.labels(provider, "retry").inc()
+        # backoff exponencial com jitter
+        await asyncio.sleep(min(2.0, 0.2 * (2 ** (attempt - 1))) * (0.5 + random.random()))
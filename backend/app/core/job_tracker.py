@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import time
+from app.core import config, metrics, http_pool
+from app.core.stt_router import STTProviderError
+
+# =========================
+# Polling dos jobs assíncronos dos provedores (AssemblyAI, Gladia) numa única coroutine
+# de fundo por processo, em vez de um loop de polling por chunk.
+#
+# - heap ordenado pelo próximo poll; os polls vencidos saem juntos (limitados pelo
+#   semáforo do provedor no http_pool)
+# - backoff adaptativo: o 1º poll é agendado para ~70% do tempo típico de conclusão do
+#   provedor (média móvel); depois o intervalo cresce até JOB_POLL_MAX_INTERVAL_S
+# - deadline rígido por job (STTProviderError ao estourar)
+# - quem espera recebe o resultado por future; se o pipeline for cancelado (websocket
+#   caiu), o future é cancelado e o job sai do heap no próximo giro
+# - polls em andamento ficam em _polls (referência forte; stop() cancela)
+# =========================
+
+JOB_STATS = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "timed_out": 0,
+    "cancelled": 0,
+    "polls": 0,
+}
+
+JOB_POLLS = metrics.counter(
+    "balto_stt_job_polls_total",
+    "Polls de jobs assíncronos de STT por provedor e resultado (pending, done, error)",
+    ("provider", "result"),
+)
+JOB_SECONDS = metrics.histogram(
+    "balto_stt_job_seconds",
+    "Tempo do envio do job até o resultado (por provedor)",
+    ("provider",),
+)
+
+
+_DEADLINE_GRACE_S = 1.0
+
+
+class _Job:
+    __slots__ = ("provider", "url", "headers", "parse", "future", "created_at",
+                 "deadline", "interval", "polls")
+
+    def __init__(self, provider, url, headers, parse, future, deadline_s, first_delay):
+        now = time.monotonic()
+        self.provider = provider
+        self.url = url
+        self.headers = headers
+        self.parse = parse
+        self.future = future
+        self.created_at = now
+        self.deadline = now + deadline_s
+        self.interval = first_delay
+        self.polls = 0
+
+
+class JobTracker:
+    def __init__(self):
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._loop = None
+        self._polls: set[asyncio.Task] = set()
+        # tempo típico até o job ficar pronto, por provedor (média móvel)
+        self._typical: dict[str, float] = {}
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._heap.clear()
+            self._polls.clear()
+            self._wake = asyncio.Event()
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    def _first_delay(self, provider: str) -> float:
+        typical = self._typical.get(provider)
+        if typical is None:
+            return config.JOB_POLL_MIN_INTERVAL_S
+        return max(config.JOB_POLL_MIN_INTERVAL_S, 0.7 * typical)
+
+    async def track(self, provider: str, url: str, headers: dict, parse, deadline_s: float | None = None):
+        """
+        Acompanha um job até concluir. parse(status, body) -> (pronto, valor); levanta
+        STTProviderError se o provedor reportar erro. Retorna o valor.
+        """
+        self._ensure_running()
+        future = self._loop.create_future()
+        job_deadline_s = deadline_s or http_pool.timeout_for(provider)
+        job = _Job(provider, url, headers, parse, future, job_deadline_s, self._first_delay(provider))
+        JOB_STATS["submitted"] += 1
+        self._push(job, time.monotonic() + job.interval)
+        # o _run falha o job no deadline; o wait_for é só a garantia caso o _run morra
+        try:
+            return await asyncio.wait_for(future, timeout=job_deadline_s + _DEADLINE_GRACE_S)
+        except asyncio.TimeoutError:
+            JOB_STATS["timed_out"] += 1
+            raise STTProviderError(provider, "timeout no polling (tracker parado)") from None
+
+    def _push(self, job: _Job, when: float):
+        heapq.heappush(self._heap, (when, next(self._seq), job))
+        self._wake.set()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            when = self._heap[0][0]
+            delay = when - time.monotonic()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                if job.future.done():
+                    JOB_STATS["cancelled"] += 1
+                    continue
+                if now >= job.deadline:
+                    self._fail(job, "timed_out", STTProviderError(job.provider, "timeout no polling"))
+                    continue
+                task = self._loop.create_task(self._poll(job))
+                self._polls.add(task)
+                task.add_done_callback(self._polls.discard)
+
+    async def _poll(self, job: _Job):
+        job.polls += 1
+        JOB_STATS["polls"] += 1
+        try:
+            status, body = await http_pool.request(job.provider, "GET", job.url, headers=job.headers)
+            ready, value = job.parse(status, body)
+        except asyncio.CancelledError:
+            # stop(): quem espera não fica pendurado
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except STTProviderError as e:
+            JOB_POLLS.labels(job.provider, "error").inc()
+            self._fail(job, "failed", e)
+            return
+        except Exception as e:
+            JOB_POLLS.labels(job.provider, "error").inc()
+            self._fail(job, "failed", STTProviderError(job.provider, f"exceção no polling: {e}"))
+            return
+
+        if job.future.done():
+            JOB_STATS["cancelled"] += 1
+            return
+        if ready:
+            JOB_POLLS.labels(job.provider, "done").inc()
+            elapsed = time.monotonic() - job.created_at
+            prev = self._typical.get(job.provider)
+            self._typical[job.provider] = elapsed if prev is None else 0.8 * prev + 0.2 * elapsed
+            JOB_SECONDS.labels(job.provider).observe(elapsed)
+            JOB_STATS["completed"] += 1
+            job.future.set_result(value)
+            return
+
+        JOB_POLLS.labels(job.provider, "pending").inc()
+        job.interval = min(config.JOB_POLL_MAX_INTERVAL_S,
+                           max(config.JOB_POLL_MIN_INTERVAL_S, job.interval * config.JOB_POLL_BACKOFF))
+        self._push(job, min(time.monotonic() + job.interval, job.deadline))
+
+    def _fail(self, job: _Job, stat: str, error: Exception):
+        if job.future.done():
+            JOB_STATS["cancelled"] += 1
+            return
+        JOB_STATS[stat] += 1
+        job.future.set_exception(error)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        polls = list(self._polls)
+        for task in polls:
+            task.cancel()
+        if polls:
+            await asyncio.gather(*polls, return_exceptions=True)
+        self._polls.clear()
+        for _, _, job in self._heap:
+            if not job.future.done():
+                job.future.cancel()
+        self._heap.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            **JOB_STATS,
+            "pending": self.pending(),
+            "typical_seconds": {p: round(v, 3) for p, v in self._typical.items()},
+        }
+
+
+# Instância Global
+job_tracker = JobTracker()
+
+
+def _collect_job_stats():
+    return [("balto_stt_jobs_pending", "gauge", "Jobs de STT aguardando polling", {}, job_tracker.pending())]
+
+
+metrics.register_collector(_collect_job_stats)
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.core import config, metrics
+from app.core.cestas_produtos_sintomas_doencas import _norm_text
+
+# =========================
+# Cache das chamadas de LLM do pipeline (normalizar / classificar).
+#
+# Chave semântica: modelo + hash do prompt + texto normalizado (_norm_text: minúsculo,
+# sem acento, espaços colapsados). "Tem Dipirona?" e "tem  dipirona?" caem na mesma
+# entrada; mudar o prompt ou o modelo invalida tudo.
+#
+#   - memória: LRU com LLM_CACHE_MAX_ENTRIES entradas por tipo, TTL LLM_CACHE_TTL_S
+#   - disco (opcional, LLM_CACHE_PATH): sqlite compartilhado entre os workers, mesmo TTL
+#
+# Guarda só respostas válidas (string). No event loop use aget/aput (o sqlite vai para uma thread).
+# =========================
+
+LLM_CACHE_LOOKUPS = metrics.counter(
+    "balto_llm_cache_total",
+    "Lookups do cache de LLM por tipo (memory, disk, miss)",
+    ("kind", "result"),
+)
+
+_db_conn: sqlite3.Connection | None = None
+_db_lock = threading.Lock()
+_db_puts = 0
+
+
+def _db() -> sqlite3.Connection | None:
+    global _db_conn
+    if not config.LLM_CACHE_PATH:
+        return None
+    if _db_conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(config.LLM_CACHE_PATH)), exist_ok=True)
+        conn = sqlite3.connect(config.LLM_CACHE_PATH, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        conn.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+        conn.commit()
+        _db_conn = conn
+    return _db_conn
+
+
+class LLMCache:
+    """
+    Uso:
+        key = normalize_cache.key("gpt-4.1", prompts.NORMALIZE_INSTRUCTIONS, texto)
+        out = await normalize_cache.aget(key)
+        if out is None:
+            out = ...chamada...
+            await normalize_cache.aput(key, out)
+    """
+    def __init__(self, kind: str, max_entries: int | None = None, ttl_s: float | None = None):
+        self.kind = kind
+        self.max_entries = config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_s = config.LLM_CACHE_TTL_S if ttl_s is None else ttl_s
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()   # key -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0, "disk_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return config.LLM_CACHE_ENABLE and self.ttl_s > 0
+
+    @staticmethod
+    def key(model: str, prompt: str, texto: str) -> str:
+        prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        return hashlib.sha1(f"{model}|{prompt_hash}|{_norm_text(texto)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._count("memory")
+                    return entry[1]
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            with self._lock:
+                self._mem_put(key, value[1], value[0])
+            self._count("disk")
+            return value[1]
+
+        self._count("miss")
+        return None
+
+    def put(self, key: str, value: str):
+        if not self.enabled or value is None:
+            return
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._mem_put(key, value, expires)
+            self.stats["stores"] += 1
+        self._disk_put(key, value, expires)
+
+    async def aget(self, key: str) -> str | None:
+        if not config.LLM_CACHE_PATH:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: str):
+        if not config.LLM_CACHE_PATH:
+            self.put(key, value)
+            return
+        await asyncio.to_thread(self.put, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _mem_put(self, key: str, value: str, expires: float):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float):
+        try:
+            with _db_lock:
+                conn = _db()
+                if conn is None:
+                    return None
+                row = conn.execute(
+                    "SELECT expires, value FROM llm_cache WHERE kind = ? AND key = ? AND expires > ?",
+                    (self.kind, key, now),
+                ).fetchone()
+            return row
+        except sqlite3.Error as e:
+            self.stats["disk_errors"] += 1
+            print(f"[LLMCache] Erro lendo {config.LLM_CACHE_PATH}: {e}")
+            return None
+
+    def _disk_put(self, key: str, value: str, expires: float):
+        global _db_puts
+        try:
+            with _db_lock:
+                conn = _db()
+                if conn is None:
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (kind, key, value, expires) VALUES (?, ?, ?, ?)",
+                    (self.kind, key, value, expires),
+                )
+                _db_puts += 1
+                if _db_puts % 256 == 0:
+                    conn.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+                conn.commit()
+        except sqlite3.Error as e:
+            self.stats["disk_errors"] += 1
+            print(f"[LLMCache] Erro gravando {config.LLM_CACHE_PATH}: {e}")
+
+    def _count(self, result: str):
+        self.stats["misses" if result == "miss" else f"{result}_hits"] += 1
+        LLM_CACHE_LOOKUPS.labels(self.kind, result).inc()
+
+    def snapshot(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / total, 4) if total else None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+        }
+
+
+# Instâncias Globais (uma por chamada de LLM do pipeline)
+normalize_cache = LLMCache("normalize")
+classify_cache = LLMCache("classify")
+
+
+def snapshot() -> dict:
+    return {
+        "enabled": config.LLM_CACHE_ENABLE,
+        "persistent": bool(config.LLM_CACHE_PATH),
+        "normalize": normalize_cache.snapshot(),
+        "classify": classify_cache.snapshot(),
+    }
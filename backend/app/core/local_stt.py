@@ -0,0 +1,211 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from app.core import config, metrics
+from app.core.stt_router import STTProviderError
+
+try:
+    import faster_whisper
+except ImportError:
+    faster_whisper = None
+
+# =========================
+# STT local em CPU (provedor "local"): Whisper via faster-whisper (CTranslate2, int8).
+#
+# Roda num ProcessPoolExecutor próprio (LOCAL_STT_WORKERS processos, cada um com o modelo
+# carregado uma vez e LOCAL_STT_THREADS threads de inferência), fora do event loop e do
+# GIL do servidor. Devolve (texto, words) no mesmo formato do ElevenLabs (type "word",
+# start/end em segundos), então speech_ranges e a costura do overlap funcionam igual.
+#
+# Requer `pip install faster-whisper` (o modelo é baixado na primeira carga).
+# =========================
+
+SAMPLE_RATE = 16000
+
+LOCAL_STATS = {
+    "calls": 0,
+    "errors": 0,
+    "rejected": 0,        # fila cheia: falha rápido para o roteador tentar outro
+    "audio_seconds": 0.0,
+    "cpu_seconds": 0.0,   # tempo de inferência somado nos workers
+}
+
+LOCAL_RTF = metrics.histogram(
+    "balto_local_stt_rtf",
+    "Real-time factor do STT local por chunk (inferência / duração do áudio)",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0),
+)
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+
+# Estado do processo worker
+_model = None
+
+
+def available() -> bool:
+    return faster_whisper is not None
+
+
+def _init_worker(model_name: str, compute_type: str, threads: int):
+    global _model
+    _model = faster_whisper.WhisperModel(model_name, device="cpu", compute_type=compute_type,
+                                         cpu_threads=threads, num_workers=1)
+
+
+def _transcribe_in_worker(pcm: bytes, language: str, beam_size: int) -> tuple[str, list, float]:
+    """Roda no worker. Retorna (texto, words, segundos de inferência)."""
+    t0 = time.perf_counter()
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    segments, _ = _model.transcribe(
+        audio, language=language, beam_size=beam_size, word_timestamps=True,
+        vad_filter=False, condition_on_previous_text=False,
+    )
+    parts, words = [], []
+    for seg in segments:
+        parts.append(seg.text)
+        for w in seg.words or []:
+            words.append({"text": w.word, "start": round(w.start, 3), "end": round(w.end, 3), "type": "word"})
+    return "".join(parts).strip(), words, time.perf_counter() - t0
+
+
+def _warm_in_worker() -> bool:
+    return _model is not None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: o servidor já tem threads (encoder, to_thread); fork com o CTranslate2 não é seguro
+        _executor = ProcessPoolExecutor(
+            max_workers=config.LOCAL_STT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config.LOCAL_STT_MODEL, config.LOCAL_STT_COMPUTE_TYPE, config.LOCAL_STT_THREADS),
+        )
+    return _executor
+
+
+async def warmup():
+    """Sobe os workers e carrega o modelo (evita a carga no primeiro chunk)."""
+    if not available():
+        print("[LocalSTT] faster-whisper não instalado; provedor 'local' indisponível.")
+        return
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    executor = _get_executor()
+    await asyncio.gather(*[loop.run_in_executor(executor, _warm_in_worker)
+                           for _ in range(config.LOCAL_STT_WORKERS)])
+    print(f"[LocalSTT] {config.LOCAL_STT_WORKERS} worker(s) com '{config.LOCAL_STT_MODEL}' "
+          f"({config.LOCAL_STT_COMPUTE_TYPE}) prontos em {time.perf_counter() - t0:.1f}s")
+
+
+def _release():
+    global _pending
+    _pending -= 1
+
+
+def _release_threadsafe(loop):
+    # callback do future do executor: roda na thread de gerenciamento do pool
+    try:
+        loop.call_soon_threadsafe(_release)
+    except RuntimeError:
+        pass   # loop já fechado (shutdown)
+
+
+async def transcribe(audio_bytes: bytes | memoryview) -> tuple[str, list]:
+    """Transcreve um chunk PCM16 mono 16k. Falhas levantam STTProviderError("local", ...)."""
+    global _executor, _pending
+    if not available():
+        raise STTProviderError("local", "faster-whisper não instalado")
+    # Mais chunks esperando do que os workers dão conta: melhor o roteador ir para outro provedor
+    if _pending >= config.LOCAL_STT_WORKERS * config.LOCAL_STT_MAX_QUEUE_PER_WORKER:
+        LOCAL_STATS["rejected"] += 1
+        raise STTProviderError("local", "fila cheia")
+
+    loop = asyncio.get_running_loop()
+    duration = len(audio_bytes) / (SAMPLE_RATE * 2)
+    LOCAL_STATS["calls"] += 1
+    try:
+        cf = _get_executor().submit(_transcribe_in_worker, bytes(audio_bytes),
+                                    config.LOCAL_STT_LANGUAGE, config.LOCAL_STT_BEAM_SIZE)
+    except BrokenProcessPool as e:
+        LOCAL_STATS["errors"] += 1
+        _executor = None
+        raise STTProviderError("local", "worker encerrado") from e
+    # Só libera a vaga quando o worker termina: no timeout o chunk continua ocupando o processo
+    _pending += 1
+    cf.add_done_callback(lambda _: _release_threadsafe(loop))
+    try:
+        texto, words, cpu_s = await asyncio.wait_for(asyncio.wrap_future(cf), timeout=config.LOCAL_STT_TIMEOUT_S)
+    except asyncio.TimeoutError as e:
+        LOCAL_STATS["errors"] += 1
+        raise STTProviderError("local", "timeout") from e
+    except BrokenProcessPool as e:
+        # Worker morreu (OOM, etc.): recria o pool na próxima chamada
+        LOCAL_STATS["errors"] += 1
+        _executor = None
+        raise STTProviderError("local", "worker encerrado") from e
+    except Exception as e:
+        LOCAL_STATS["errors"] += 1
+        raise STTProviderError("local", f"exceção: {e}") from e
+
+    LOCAL_STATS["audio_seconds"] += duration
+    LOCAL_STATS["cpu_seconds"] += cpu_s
+    if duration > 0:
+        LOCAL_RTF.observe(cpu_s / duration)
+    return texto, words
+
+
+async def transcribe_batch(chunks: list) -> list:
+    """
+    Lote offline: todos os chunks vão direto para o pool (sem o limite de fila do tempo real).
+    Retorna [(texto, words) | STTProviderError, ...] na ordem dos chunks.
+    """
+    if not available():
+        return [STTProviderError("local", "faster-whisper não instalado") for _ in chunks]
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    futures = [
+        loop.run_in_executor(executor, _transcribe_in_worker, bytes(c),
+                             config.LOCAL_STT_LANGUAGE, config.LOCAL_STT_BEAM_SIZE)
+        for c in chunks
+    ]
+    out = []
+    for chunk, result in zip(chunks, await asyncio.gather(*futures, return_exceptions=True)):
+        LOCAL_STATS["calls"] += 1
+        if isinstance(result, Exception):
+            LOCAL_STATS["errors"] += 1
+            out.append(STTProviderError("local", f"exceção: {result}"))
+            continue
+        texto, words, cpu_s = result
+        duration = len(chunk) / (SAMPLE_RATE * 2)
+        LOCAL_STATS["audio_seconds"] += duration
+        LOCAL_STATS["cpu_seconds"] += cpu_s
+        if duration > 0:
+            LOCAL_RTF.observe(cpu_s / duration)
+        out.append((texto, words))
+    return out
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def snapshot() -> dict:
+    audio = LOCAL_STATS["audio_seconds"]
+    return {
+        **LOCAL_STATS,
+        "available": available(),
+        "model": config.LOCAL_STT_MODEL,
+        "workers": config.LOCAL_STT_WORKERS,
+        "threads_per_worker": config.LOCAL_STT_THREADS,
+        "pending": _pending,
+        "rtf": round(LOCAL_STATS["cpu_seconds"] / audio, 3) if audio else None,
+    }
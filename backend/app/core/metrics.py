@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# =========================
+# Registro de métricas em processo (formato texto do Prometheus em GET /metrics)
+#
+# Hot path: cada thread incrementa o PRÓPRIO array de contadores (threading.local),
+# então observe()/inc() não pegam lock. O lock só aparece quando uma thread nova
+# registra seu shard e na coleta (scrape), que soma os shards.
+# =========================
+
+_REGISTRY: dict[str, "_Family"] = {}
+_COLLECTORS: list = []
+
+# Modo --workers: cada worker grava um snapshot em _mp_dir e o /metrics de qualquer worker junta todos
+_worker_id: int | None = None
+_mp_dir: str | None = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Shards:
+    """Um array de valores por thread. Só a thread dona escreve no seu array."""
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._all: list[list] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> list:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0] * self._size
+            with self._lock:
+                self._all.append(values)
+            self._local.values = values
+            return values
+
+    def total(self) -> list:
+        with self._lock:
+            shards = list(self._all)
+        out = [0] * self._size
+        for values in shards:
+            for i, v in enumerate(values):
+                out[i] += v
+        return out
+
+
+class _Timer:
+    __slots__ = ("_child", "_t0")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._t0)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1):
+        self._shards.get()[0] += amount
+
+    def values(self) -> list:
+        return self._shards.total()
+
+
+class _GaugeChild:
+    """Gauge por inc/dec (somado entre threads) ou por função lida no scrape."""
+    def __init__(self):
+        self._shards = _Shards(1)
+        self._fn = None
+
+    def inc(self, amount: float = 1):
+        self._shards.get()[0] += amount
+
+    def dec(self, amount: float = 1):
+        self._shards.get()[0] -= amount
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def values(self) -> list:
+        if self._fn is not None:
+            try:
+                return [float(self._fn())]
+            except Exception:
+                return [0.0]
+        return self._shards.total()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple):
+        self._bounds = buckets
+        # [contagem por bucket..., +Inf, soma]
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value: float):
+        values = self._shards.get()
+        values[bisect_left(self._bounds, value)] += 1
+        values[-1] += value
+
+    def time(self) -> _Timer:
+        """`with HIST.labels(...).time():` observa a duração do bloco."""
+        return _Timer(self)
+
+    def values(self) -> list:
+        return self._shards.total()
+
+
+class _Family:
+    def __init__(self, kind: str, name: str, doc: str, labelnames: tuple, buckets: tuple | None = None):
+        self.kind = kind
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        if self.kind == "counter":
+            return _CounterChild()
+        if self.kind == "gauge":
+            return _GaugeChild()
+        return _HistogramChild(self.buckets)
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    # Atalhos para famílias sem labels
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def set_function(self, fn):
+        self.labels().set_function(fn)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            children = list(self._children.items())
+        return {"|".join(k): c.values() for k, c in children}
+
+
+def _register(kind, name, doc, labelnames, buckets=None) -> _Family:
+    fam = _REGISTRY.get(name)
+    if fam is None:
+        fam = _Family(kind, name, doc, labelnames, buckets)
+        _REGISTRY[name] = fam
+    return fam
+
+
+def counter(name: str, doc: str, labelnames: tuple = ()) -> _Family:
+    return _register("counter", name, doc, labelnames)
+
+
+def gauge(name: str, doc: str, labelnames: tuple = ()) -> _Family:
+    return _register("gauge", name, doc, labelnames)
+
+
+def histogram(name: str, doc: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> _Family:
+    return _register("histogram", name, doc, labelnames, tuple(buckets))
+
+
+def register_collector(fn):
+    """
+    fn() -> lista de (nome, tipo, doc, {labels}, valor), lida só no scrape.
+    Para estatísticas que já vivem em dicts (ex.: PCM_QUEUE_STATS).
+    """
+    _COLLECTORS.append(fn)
+
+
+# =========================
+# Métricas do pipeline
+# =========================
+STAGE_SECONDS = histogram(
+    "balto_stage_seconds",
+    "Duração por estágio do pipeline (speaker_id, llm_normalize, llm_classify, lookup, db_insert, ws_send)",
+    ("stage",),
+)
+STT_SECONDS = histogram(
+    "balto_stt_seconds",
+    "Duração da chamada de STT por provedor",
+    ("provider",),
+)
+DECODE_SECONDS = histogram(
+    "balto_decode_seconds",
+    "Decode WebM -> PCM por write (pyav: demux+decode; ffmpeg: escrita no stdin com backpressure)",
+    ("backend",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+ACTIVE_CONNECTIONS = gauge("balto_ws_connections", "Conexões WebSocket ativas")
+PIPELINES_IN_FLIGHT = gauge("balto_pipelines_in_flight", "Pipelines (STT+LLM+DB) em andamento")
+PIPELINES_QUEUED = gauge("balto_pipelines_queued", "Chunks esperando no PipelineScheduler")
+EXECUTOR_QUEUE_DEPTH = gauge("balto_executor_queue_depth", "Itens na fila do executor padrão (asyncio.to_thread)")
+
+
+def watch_default_executor(loop):
+    """Gauge da fila do executor padrão do loop (lido no scrape)."""
+    def depth():
+        ex = getattr(loop, "_default_executor", None)
+        q = getattr(ex, "_work_queue", None)
+        return q.qsize() if q is not None else 0
+
+    EXECUTOR_QUEUE_DEPTH.set_function(depth)
+
+
+# =========================
+# Modo multi-processo
+# =========================
+def enable_multiprocess(directory: str, worker_id: int):
+    global _mp_dir, _worker_id
+    _mp_dir = directory
+    _worker_id = worker_id
+
+
+def _collect() -> dict:
+    """Roda os coletores: {nome: [tipo, doc, [[labels, valor], ...]]}."""
+    grouped: dict[str, list] = {}
+    for fn in _COLLECTORS:
+        try:
+            samples = fn()
+        except Exception as e:
+            print(f"[METRICS] Erro no coletor: {e}")
+            continue
+        for name, kind, doc, labels, value in samples:
+            grouped.setdefault(name, [kind, doc, []])[2].append([dict(labels), value])
+    return grouped
+
+
+def _snapshot() -> dict:
+    snap = {name: fam.snapshot() for name, fam in _REGISTRY.items()}
+    snap["_collectors"] = _collect()
+    return snap
+
+
+def write_snapshot():
+    if _mp_dir is None:
+        return
+    path = os.path.join(_mp_dir, f"worker-{_worker_id}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp, path)
+
+
+async def snapshot_loop(interval: float = 5.0):
+    """Workers (--workers): publica o snapshot local para os outros workers montarem o /metrics."""
+    while True:
+        try:
+            await asyncio.to_thread(write_snapshot)
+        except Exception as e:
+            print(f"[METRICS] Erro ao gravar snapshot: {e}")
+        await asyncio.sleep(interval)
+
+
+def _other_snapshots() -> dict[str, dict]:
+    out = {}
+    if _mp_dir is None:
+        return out
+    for fname in os.listdir(_mp_dir):
+        if not fname.startswith("worker-") or not fname.endswith(".json"):
+            continue
+        wid = fname[len("worker-"):-len(".json")]
+        if wid == str(_worker_id):
+            continue
+        try:
+            with open(os.path.join(_mp_dir, fname)) as f:
+                out[wid] = json.load(f)
+        except Exception:
+            continue
+    return out
+
+
+# =========================
+# Render (formato texto)
+# =========================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra: dict | None = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs += list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _render_family(fam: _Family, snapshots: dict[str | None, dict], lines: list):
+    lines.append(f"# HELP {fam.name} {fam.doc}")
+    lines.append(f"# TYPE {fam.name} {fam.kind}")
+    for wid, snap in snapshots.items():
+        extra = {"worker": wid} if wid is not None else None
+        for key, values in snap.get(fam.name, {}).items():
+            label_values = key.split("|") if fam.labelnames else []
+            if fam.kind != "histogram":
+                lines.append(f"{fam.name}{_fmt_labels(fam.labelnames, label_values, extra)} {values[0]}")
+                continue
+            cumulative = 0
+            for bound, count in zip(fam.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = dict(extra or {})
+                le["le"] = bound
+                lines.append(f"{fam.name}_bucket{_fmt_labels(fam.labelnames, label_values, le)} {cumulative}")
+            lines.append(f"{fam.name}_sum{_fmt_labels(fam.labelnames, label_values, extra)} {values[-1]}")
+            lines.append(f"{fam.name}_count{_fmt_labels(fam.labelnames, label_values, extra)} {cumulative}")
+
+
+def render() -> str:
+    local_id = str(_worker_id) if _worker_id is not None else None
+    snapshots: dict[str | None, dict] = {local_id: _snapshot()}
+    snapshots.update(_other_snapshots())
+
+    lines: list[str] = []
+    for fam in _REGISTRY.values():
+        _render_family(fam, snapshots, lines)
+
+    # Coletores: agrupa por nome entre todos os workers (exigência do formato)
+    grouped: dict[str, tuple] = {}
+    for wid, snap in snapshots.items():
+        for name, (kind, doc, samples) in snap.get("_collectors", {}).items():
+            out = grouped.setdefault(name, (kind, doc, []))[2]
+            for labels, value in samples:
+                if wid is not None:
+                    labels = {**labels, "worker": wid}
+                out.append(f"{name}{_fmt_labels(labels.keys(), labels.values())} {value}")
+
+    for name, (kind, doc, sample_lines) in grouped.items():
+        lines.append(f"# HELP {name} {doc}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(sample_lines)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+import re
+import unicodedata
+from app.core import metrics
+
+# =========================
+# Costura do overlap entre chunks consecutivos de uma conexão.
+#
+# Os chunks se sobrepõem (0.8s no SIMPLE_CHUNK_MODE, overlap_frames no modo VAD), então
+# o começo da transcrição de um chunk repete o fim da anterior.
+#
+# - Com word timestamps (ElevenLabs): cada chunk é posicionado no stream; palavras que
+#   começam antes do fim da última palavra do chunk anterior (limitado ao fim do chunk
+#   anterior) são duplicatas e saem. Se há buraco entre os chunks (chunk descartado pelo
+#   scheduler, chunk sem fala), não há overlap e nada é removido.
+# - Sem timestamps (outros provedores): maior sufixo de tokens do chunk anterior que é
+#   prefixo do atual, via função de prefixo (KMP), O(n). Só casamento exato de tokens.
+# =========================
+
+# Telemetria (lida pelo endpoint /api/metrics/overlap_stitch)
+STITCH_STATS = {
+    "chunks": 0,
+    "by_timestamps": 0,
+    "by_tokens": 0,
+    "no_overlap": 0,      # chunk anterior não é adjacente (buraco no stream)
+    "chunks_trimmed": 0,  # chunks com pelo menos uma palavra removida
+    "words_removed": 0,
+}
+
+WORDS_REMOVED = metrics.counter(
+    "balto_overlap_words_removed_total",
+    "Palavras repetidas removidas no overlap entre chunks, por método",
+    ("method",),
+)
+
+_WORD_TYPES = ("word", "SpeechToTextWordResponseModelType.WORD")
+_NON_WORD = re.compile(r"[^a-z0-9\s]")
+# Tolerância de timestamp (o STT desloca o início das palavras em algumas dezenas de ms)
+_EPS_S = 0.05
+
+
+def _tok(s: str) -> list[str]:
+    s = unicodedata.normalize("NFKD", (s or "").lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", s).split()
+
+
+def _is_word(w: dict) -> bool:
+    return w.get("type") in _WORD_TYPES
+
+
+def _prefix_function(p: list) -> list[int]:
+    pi = [0] * len(p)
+    k = 0
+    for i in range(1, len(p)):
+        while k and p[i] != p[k]:
+            k = pi[k - 1]
+        if p[i] == p[k]:
+            k += 1
+        pi[i] = k
+    return pi
+
+
+def suffix_prefix_overlap(prev: list, cur: list) -> int:
+    """Tamanho do maior sufixo de `prev` que é prefixo de `cur` (KMP, O(len(prev) + len(cur)))."""
+    if not prev or not cur:
+        return 0
+    pi = _prefix_function(cur)
+    k = 0
+    for tok in prev:
+        while k and (k == len(cur) or tok != cur[k]):
+            k = pi[k - 1]
+        if tok == cur[k]:
+            k += 1
+    return k
+
+
+class OverlapStitcher:
+    """
+    Estado de costura de UMA conexão. Chamado na seção ordenada do pipeline
+    (os chunks chegam aqui na ordem do stream).
+
+    default_overlap_s: overlap assumido quando o chunk não informa a posição no stream
+    (modo VAD: o overlap_buffer é sempre prefixado ao segmento).
+    clean: limpeza aplicada ao texto remontado a partir das palavras mantidas.
+    """
+    def __init__(self, default_overlap_s: float, clean=None, max_window: int = 12, min_overlap: int = 2):
+        self.default_overlap_s = default_overlap_s
+        self.clean = clean or (lambda t: t)
+        self.max_window = max_window
+        self.min_overlap = min_overlap
+
+        self._prev_end = None        # fim do chunk anterior no stream (s)
+        self._prev_last_word = None  # fim da última palavra do chunk anterior no stream (s)
+        self._prev_tokens: list[str] = []
+
+        self.chunks = 0
+        self.words_removed = 0
+
+    def stitch(self, texto: str, words: list | None, duration_s: float,
+               stream_offset_s: float | None = None) -> tuple[str, int]:
+        """Retorna (texto sem o overlap repetido, palavras removidas)."""
+        self.chunks += 1
+        STITCH_STATS["chunks"] += 1
+
+        if stream_offset_s is None:
+            start = (self._prev_end - self.default_overlap_s) if self._prev_end is not None else 0.0
+        else:
+            start = stream_offset_s
+
+        overlap_s = (self._prev_end - start) if self._prev_end is not None else 0.0
+        removed = 0
+        if overlap_s <= 0:
+            if self._prev_end is not None:
+                STITCH_STATS["no_overlap"] += 1
+        elif words and any(_is_word(w) for w in words):
+            texto, removed = self._by_timestamps(texto, words, start)
+            STITCH_STATS["by_timestamps"] += 1
+            method = "timestamps"
+        else:
+            texto, removed = self._by_tokens(texto)
+            STITCH_STATS["by_tokens"] += 1
+            method = "tokens"
+
+        if removed:
+            self.words_removed += removed
+            STITCH_STATS["words_removed"] += removed
+            STITCH_STATS["chunks_trimmed"] += 1
+            WORDS_REMOVED.labels(method).inc(removed)
+
+        # Estado para o próximo chunk
+        self._prev_end = start + duration_s
+        word_ends = [w["end"] for w in (words or []) if _is_word(w) and w.get("end") is not None]
+        self._prev_last_word = start + max(word_ends) if word_ends else None
+        self._prev_tokens = _tok(texto)[-self.max_window:]
+        return texto, removed
+
+    def _by_timestamps(self, texto: str, words: list, start: float) -> tuple[str, int]:
+        # Até onde o chunk anterior já transcreveu (sem passar do fim dele)
+        cutoff = self._prev_end
+        if self._prev_last_word is not None:
+            cutoff = min(cutoff, self._prev_last_word)
+        cutoff -= start + _EPS_S
+
+        first_kept = None
+        removed = 0
+        for i, w in enumerate(words):
+            if not _is_word(w):
+                continue
+            if w.get("start", 0.0) < cutoff:
+                removed += 1
+            else:
+                first_kept = i
+                break
+
+        if not removed:
+            return texto, 0
+        if first_kept is None:
+            return "", removed
+        # Remonta a partir das palavras mantidas (inclui espaçamentos e eventos seguintes)
+        return self.clean("".join(w.get("text") or "" for w in words[first_kept:]).strip()), removed
+
+    def _by_tokens(self, texto: str) -> tuple[str, int]:
+        cur = _tok(texto)[:self.max_window]
+        k = suffix_prefix_overlap(self._prev_tokens, cur)
+        remove = k
+        if k < self.min_overlap:
+            # Permite 1 token "extra" no começo do chunk atual ("aqui", "né", ...)
+            k = suffix_prefix_overlap(self._prev_tokens, cur[1:])
+            remove = k + 1
+        if k < self.min_overlap:
+            return texto, 0
+
+        # Remove do texto original (não normalizado) os primeiros N tokens
+        raw_tokens = texto.strip().split()
+        if len(raw_tokens) <= remove:
+            return "", len(raw_tokens)
+        return " ".join(raw_tokens[remove:]), remove
+
+
+def snapshot() -> dict:
+    return dict(STITCH_STATS)
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class PCMWindowBuffer:
+    """
+    Fatiador de janelas fixas com overlap (SIMPLE_CHUNK_MODE) sem cópias por janela.
+
+    O PCM entra num bloco pré-alocado e cada janela sai como memoryview somente-leitura
+    apontando para esse bloco. Quando o bloco enche, a escrita passa para outro bloco e
+    só a cauda ainda não consumida (< 1 janela) é copiada. Um bloco só é reaproveitado quando
+    nenhuma view dele está viva, então pipelines em andamento nunca veem o áudio mudar
+    (um anel com wraparound sobrescreveria áudio que o STT ainda está lendo).
+
+    Uso:
+        win = PCMWindowBuffer(window_bytes=160000, stride_bytes=134400)
+        win.write(pcm)
+        for view in win.windows():
+            ...
+    """
+    def __init__(self, window_bytes: int, stride_bytes: int, capacity_bytes: int | None = None):
+        if stride_bytes <= 0 or stride_bytes > window_bytes:
+            raise ValueError("stride_bytes deve estar em (0, window_bytes]")
+        self.window_bytes = window_bytes
+        self.stride_bytes = stride_bytes
+        # Padrão: ~6 janelas por bloco (~30s de áudio com janelas de 5s)
+        self.capacity_bytes = max(capacity_bytes or 6 * window_bytes, 2 * window_bytes)
+
+        self._buf = bytearray(self.capacity_bytes)
+        self._spare: bytearray | None = None   # bloco anterior, reaproveitado se estiver livre
+        self._start = 0   # início da próxima janela
+        self._end = 0     # fim dos dados escritos
+
+        # Telemetria (bench / debug)
+        self.allocations = 1
+        self.recycled = 0
+        self.bytes_copied = 0     # cópias além da escrita inicial (rollover)
+        self.windows_out = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @staticmethod
+    def _in_use(buf: bytearray) -> bool:
+        # bytearray com memoryview viva não pode mudar de tamanho (BufferError)
+        try:
+            buf.append(0)
+        except BufferError:
+            return True
+        buf.pop()
+        return False
+
+    def _rollover(self, incoming: int):
+        pending = self._end - self._start
+        cap = self.capacity_bytes
+        while pending + incoming > cap:
+            cap *= 2
+
+        spare = self._spare
+        if spare is not None and len(spare) >= cap and not self._in_use(spare):
+            new_buf = spare
+            self.recycled += 1
+        else:
+            new_buf = bytearray(cap)
+            self.allocations += 1
+        new_buf[:pending] = memoryview(self._buf)[self._start:self._end]
+        self._spare = self._buf
+        self._buf = new_buf
+        self._start = 0
+        self._end = pending
+        self.bytes_copied += pending
+
+    def write(self, data) -> None:
+        """Anexa PCM (qualquer objeto com buffer protocol)."""
+        n = len(data)
+        if not n:
+            return
+        if self._end + n > len(self._buf):
+            self._rollover(n)
+        self._buf[self._end:self._end + n] = data
+        self._end += n
+
+    def windows(self, as_numpy: bool = False):
+        """
+        Gera as janelas completas disponíveis, avançando `stride_bytes` a cada uma.
+        as_numpy=True devolve np.ndarray int16 (view, sem cópia) em vez de memoryview.
+        """
+        while self._end - self._start >= self.window_bytes:
+            view = memoryview(self._buf)[self._start:self._start + self.window_bytes].toreadonly()
+            self._start += self.stride_bytes
+            self.windows_out += 1
+            yield np.frombuffer(view, dtype=np.int16) if as_numpy else view
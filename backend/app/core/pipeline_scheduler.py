@@ -0,0 +1,244 @@
+import asyncio
+import time
+from collections import deque
+from app.core import config, metrics
+
+# Telemetria por balcão (lida pelo endpoint /api/metrics/pipelines)
+# balcao_id -> {"in_flight", "queued", "submitted", "completed", "dropped", "merged", "cancelled"}
+# Só conexões abertas: cada scheduler tem o seu dict e remove a entrada no close().
+PIPELINE_STATS: dict[str, dict] = {}
+
+
+def _new_stats() -> dict:
+    return {
+        "in_flight": 0,
+        "queued": 0,
+        "submitted": 0,
+        "completed": 0,
+        "failed": 0,
+        "dropped": 0,
+        "merged": 0,
+        "cancelled": 0,
+    }
+
+
+class _Job:
+    __slots__ = ("audio", "meta", "created_at", "chunks")
+
+    def __init__(self, audio: bytes | memoryview, meta: dict):
+        self.audio = audio
+        self.meta = meta
+        self.created_at = time.monotonic()
+        self.chunks = 1
+
+
+class OrderTicket:
+    """
+    Vez de um job na seção ordenada do pipeline (dedupe + TranscriptionBuffer).
+    Uso: `async with ticket:` — espera os jobs anteriores da mesma conexão.
+    Liberar é idempotente; o scheduler sempre libera ao fim do job.
+    """
+    def __init__(self, scheduler: "PipelineScheduler", seq: int):
+        self._scheduler = scheduler
+        self.seq = seq
+        self._released = False
+
+    async def __aenter__(self):
+        await self._scheduler._wait_turn(self.seq)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._finish_turn(self.seq)
+
+
+class PipelineScheduler:
+    """
+    Agenda os process_speech_pipeline de UMA conexão:
+    - no máximo `max_in_flight` pipelines rodando ao mesmo tempo
+    - fila de até `max_queued` chunks esperando
+    - conclusão ordenada: cada job recebe um OrderTicket e a parte que mexe no
+      TranscriptionBuffer roda na ordem de chegada dos chunks
+    - chunks atrasados (stale_policy):
+        "merge" -> chunks adjacentes na fila viram um só (remove o overlap repetido)
+        "drop"  -> chunks que esperaram mais que `deadline_s` são descartados
+    - close() cancela tudo (desconexão)
+
+    runner: async fn(audio, ticket, **meta)
+    """
+    def __init__(self, runner, balcao_id: str | None = None, overlap_bytes: int = 0,
+                 max_in_flight: int | None = None, max_queued: int | None = None,
+                 stale_policy: str | None = None, deadline_s: float | None = None,
+                 max_merge_bytes: int | None = None):
+        self._runner = runner
+        self.balcao_id = balcao_id
+        self.overlap_bytes = overlap_bytes
+        self.max_in_flight = max(1, max_in_flight or config.PIPELINE_MAX_IN_FLIGHT)
+        self.max_queued = max(1, max_queued or config.PIPELINE_MAX_QUEUED)
+        self.stale_policy = stale_policy or config.PIPELINE_STALE_POLICY
+        self.deadline_s = config.PIPELINE_STALE_DEADLINE_S if deadline_s is None else deadline_s
+        self.max_merge_bytes = max_merge_bytes or config.PIPELINE_MAX_MERGE_BYTES
+
+        self._queue: deque[_Job] = deque()
+        self._tasks: set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._queued_reported = 0   # último valor somado no gauge global de fila
+        self._closed = False
+
+        # Ordenação
+        self._next_seq = 0        # próximo seq a ser despachado
+        self._turn_seq = 0        # seq que pode entrar na seção ordenada
+        self._released: set[int] = set()
+        self._waiters: dict[int, asyncio.Future] = {}
+
+        self.stats = _new_stats()
+        if balcao_id is not None:
+            PIPELINE_STATS[balcao_id] = self.stats
+
+    # ------------------------------------------------------------------
+    # Ordenação
+    # ------------------------------------------------------------------
+    async def _wait_turn(self, seq: int):
+        if seq <= self._turn_seq:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[seq] = fut
+        try:
+            await fut
+        finally:
+            self._waiters.pop(seq, None)
+
+    def _finish_turn(self, seq: int):
+        self._released.add(seq)
+        while self._turn_seq in self._released:
+            self._released.discard(self._turn_seq)
+            self._turn_seq += 1
+        fut = self._waiters.get(self._turn_seq)
+        if fut and not fut.done():
+            fut.set_result(None)
+
+    # ------------------------------------------------------------------
+    # Fila
+    # ------------------------------------------------------------------
+    def _merge(self, a: _Job, b: _Job) -> bool:
+        """Anexa b em a (b é o chunk seguinte). Retorna False se passaria do limite."""
+        tail = b.audio[self.overlap_bytes:] if len(b.audio) > self.overlap_bytes else b""
+        if len(a.audio) + len(tail) > self.max_merge_bytes:
+            return False
+        a.audio = bytes(a.audio) + tail
+        a.chunks += b.chunks
+        self.stats["merged"] += 1
+        return True
+
+    def _drop_oldest(self):
+        self._queue.popleft()
+        self.stats["dropped"] += 1
+
+    def _update_depth(self):
+        queued = len(self._queue)
+        self.stats["queued"] = queued
+        self.stats["in_flight"] = self._in_flight
+        if queued != self._queued_reported:
+            metrics.PIPELINES_QUEUED.inc(queued - self._queued_reported)
+            self._queued_reported = queued
+
+    def submit(self, audio: bytes | memoryview, **meta):
+        if self._closed:
+            return
+        self.stats["submitted"] += 1
+        job = _Job(audio, meta)
+
+        if len(self._queue) >= self.max_queued:
+            if not (self.stale_policy == "merge" and self._merge(self._queue[-1], job)):
+                self._drop_oldest()
+                self._queue.append(job)
+        else:
+            self._queue.append(job)
+
+        self._dispatch()
+
+    def _next_job(self) -> _Job | None:
+        now = time.monotonic()
+        while self._queue:
+            job = self._queue.popleft()
+            stale = self.deadline_s > 0 and (now - job.created_at) > self.deadline_s
+            if not stale:
+                return job
+            if self.stale_policy == "drop":
+                self.stats["dropped"] += 1
+                continue
+            # merge: junta com os próximos atrasados para recuperar o atraso numa chamada só
+            while self._queue and self._merge(job, self._queue[0]):
+                self._queue.popleft()
+            return job
+        return None
+
+    def _dispatch(self):
+        while not self._closed and self._in_flight < self.max_in_flight:
+            job = self._next_job()
+            if job is None:
+                break
+            seq = self._next_seq
+            self._next_seq += 1
+            self._in_flight += 1
+            metrics.PIPELINES_IN_FLIGHT.inc()
+            task = asyncio.create_task(self._run(job, seq))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._update_depth()
+
+    async def _run(self, job: _Job, seq: int):
+        ticket = OrderTicket(self, seq)
+        try:
+            await self._runner(job.audio, ticket, **job.meta)
+            self.stats["completed"] += 1
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"[{self.balcao_id}] Erro no job do pipeline: {e}")
+        finally:
+            ticket.release()
+            self._in_flight -= 1
+            metrics.PIPELINES_IN_FLIGHT.dec()
+            self._dispatch()
+
+    async def close(self):
+        """Cancela jobs na fila e em andamento (chamado na desconexão)."""
+        self._closed = True
+        self.stats["cancelled"] += len(self._queue)
+        self._queue.clear()
+
+        tasks = list(self._tasks)
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for fut in self._waiters.values():
+            if not fut.done():
+                fut.cancel()
+        self._in_flight = 0
+        self._update_depth()
+
+        # reconexão do mesmo balcão pode já ter registrado o scheduler novo: só remove o próprio
+        if self.balcao_id is not None and PIPELINE_STATS.get(self.balcao_id) is self.stats:
+            del PIPELINE_STATS[self.balcao_id]
+
+
+def _collect_pipeline_stats():
+    samples = []
+    for balcao_id, st in list(PIPELINE_STATS.items()):
+        labels = {"balcao_id": balcao_id}
+        for key in ("submitted", "completed", "failed", "dropped", "merged", "cancelled"):
+            samples.append((f"balto_pipeline_jobs_{key}_total", "counter",
+                            f"Jobs do PipelineScheduler: {key}", labels, st[key]))
+    return samples
+
+
+metrics.register_collector(_collect_pipeline_stats)
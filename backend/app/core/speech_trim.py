@@ -0,0 +1,181 @@
+import audioop
+import webrtcvad
+from app.core import config, metrics
+
+# =========================
+# Corte de silêncio antes do upload para o STT.
+#
+# Cada frame de 30ms passa por um gate de energia (RMS relativo ao piso de ruído do
+# próprio chunk) e pelo WebRTC VAD, o mesmo par usado em app/vad.py. As regiões de fala
+# ganham padding, silêncios curtos entre elas são mantidos e só os longos são cortados.
+# O áudio enviado é a concatenação das regiões; TrimResult.to_original() devolve os
+# timestamps do STT para a linha do tempo do chunk original.
+# =========================
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+BYTES_PER_SEC = SAMPLE_RATE * 2
+
+# Telemetria (lida pelo endpoint /api/metrics/speech_trim)
+TRIM_STATS = {
+    "chunks": 0,
+    "trimmed": 0,          # chunks enviados cortados
+    "kept_whole": 0,       # pouco silêncio: enviado inteiro
+    "skipped_silent": 0,   # nenhuma fala: STT não chamado
+    "seconds_in": 0.0,
+    "seconds_out": 0.0,
+}
+
+TRIM_SECONDS = metrics.counter(
+    "balto_speech_trim_seconds_total",
+    "Segundos de áudio antes (in) e depois (out) do corte de silêncio",
+    ("stage",),
+)
+
+_vad = None
+
+
+def _get_vad() -> webrtcvad.Vad:
+    global _vad
+    if _vad is None:
+        _vad = webrtcvad.Vad(config.STT_TRIM_VAD_AGGRESSIVENESS)
+    return _vad
+
+
+class TrimResult:
+    """
+    audio: PCM a enviar (o original, sem cópia, se não houve corte)
+    segments: [(início_no_original_s, início_no_cortado_s, duração_s), ...]
+    """
+    __slots__ = ("audio", "segments", "original_seconds")
+
+    def __init__(self, audio, segments: list[tuple[float, float, float]], original_seconds: float):
+        self.audio = audio
+        self.segments = segments
+        self.original_seconds = original_seconds
+
+    @property
+    def seconds(self) -> float:
+        return len(self.audio) / BYTES_PER_SEC
+
+    @property
+    def is_silent(self) -> bool:
+        return not self.segments
+
+    def to_original(self, t: float) -> float:
+        """Tempo no áudio enviado -> tempo no chunk original."""
+        for orig_start, trim_start, length in self.segments:
+            if t <= trim_start + length:
+                return orig_start + max(0.0, t - trim_start)
+        if self.segments:
+            orig_start, trim_start, length = self.segments[-1]
+            return orig_start + (t - trim_start)
+        return t
+
+    def map_words(self, words_data: list) -> list:
+        """Reescreve start/end dos word timestamps para a linha do tempo original."""
+        for w in words_data:
+            if w.get("start") is not None:
+                w["start"] = round(self.to_original(w["start"]), 3)
+            if w.get("end") is not None:
+                w["end"] = round(self.to_original(w["end"]), 3)
+        return words_data
+
+
+def _speech_frames(pcm) -> list[bool]:
+    n = len(pcm) // FRAME_BYTES
+    view = memoryview(pcm)
+    frames = [view[i * FRAME_BYTES:(i + 1) * FRAME_BYTES] for i in range(n)]
+    energies = [audioop.rms(f, 2) for f in frames]
+    if not energies:
+        return []
+
+    # Piso de ruído do chunk: percentil 20 das energias
+    noise = sorted(energies)[len(energies) // 5]
+    threshold = max(noise * config.STT_TRIM_THRESHOLD_MULTIPLIER, config.STT_TRIM_MIN_ENERGY)
+
+    vad = _get_vad()
+    out = []
+    for frame, energy in zip(frames, energies):
+        if energy <= threshold:
+            out.append(False)
+            continue
+        # Energia muito alta conta como fala mesmo se o WebRTC estiver na dúvida (como em app/vad.py)
+        out.append(energy > threshold * 1.5 or vad.is_speech(bytes(frame), SAMPLE_RATE))
+    return out
+
+
+def _regions(flags: list[bool]) -> list[list[int]]:
+    """Frames de fala -> regiões [início, fim) com padding, fundindo gaps curtos."""
+    pad = config.STT_TRIM_PAD_MS // FRAME_MS
+    min_gap = config.STT_TRIM_MIN_SILENCE_MS // FRAME_MS
+    n = len(flags)
+
+    regions: list[list[int]] = []
+    i = 0
+    while i < n:
+        if not flags[i]:
+            i += 1
+            continue
+        j = i
+        while j < n and flags[j]:
+            j += 1
+        start, end = max(0, i - pad), min(n, j + pad)
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+        i = j
+    return regions
+
+
+def trim(pcm) -> TrimResult:
+    """Corta os silêncios longos de um chunk PCM16 mono 16k."""
+    original_seconds = len(pcm) / BYTES_PER_SEC
+    TRIM_STATS["chunks"] += 1
+    TRIM_STATS["seconds_in"] += original_seconds
+    TRIM_SECONDS.labels("in").inc(original_seconds)
+
+    regions = _regions(_speech_frames(pcm))
+    if not regions:
+        TRIM_STATS["skipped_silent"] += 1
+        return TrimResult(b"", [], original_seconds)
+
+    n_frames = len(pcm) // FRAME_BYTES
+    kept = sum(end - start for start, end in regions)
+    # Economia pequena não compensa mexer na linha do tempo
+    if kept >= n_frames * (1.0 - config.STT_TRIM_MIN_SAVING):
+        TRIM_STATS["kept_whole"] += 1
+        TRIM_STATS["seconds_out"] += original_seconds
+        TRIM_SECONDS.labels("out").inc(original_seconds)
+        return TrimResult(pcm, [(0.0, 0.0, original_seconds)], original_seconds)
+
+    # Última região vai até o fim do PCM (bytes que não fecham um frame)
+    if regions[-1][1] == n_frames:
+        end_bytes = len(pcm)
+    else:
+        end_bytes = regions[-1][1] * FRAME_BYTES
+
+    view = memoryview(pcm)
+    out = bytearray()
+    segments = []
+    for idx, (start, end) in enumerate(regions):
+        b0 = start * FRAME_BYTES
+        b1 = end_bytes if idx == len(regions) - 1 else end * FRAME_BYTES
+        segments.append((b0 / BYTES_PER_SEC, len(out) / BYTES_PER_SEC, (b1 - b0) / BYTES_PER_SEC))
+        out += view[b0:b1]
+
+    result = TrimResult(bytes(out), segments, original_seconds)
+    TRIM_STATS["trimmed"] += 1
+    TRIM_STATS["seconds_out"] += result.seconds
+    TRIM_SECONDS.labels("out").inc(result.seconds)
+    return result
+
+
+def snapshot() -> dict:
+    seconds_in = TRIM_STATS["seconds_in"]
+    return {
+        **TRIM_STATS,
+        "saved_pct": round(100.0 * (1 - TRIM_STATS["seconds_out"] / seconds_in), 1) if seconds_in else 0.0,
+    }
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import deque
+from app.core import config, metrics
+
+# =========================
+# Hedging de STT: se o provedor primário não respondeu até o deadline (percentil da
+# latência recente dele), dispara um segundo provedor; a primeira transcrição
+# utilizável vence e a outra requisição é cancelada.
+# =========================
+
+# Telemetria (lida pelo endpoint /api/metrics/stt_hedge)
+HEDGE_STATS = {
+    "requests": 0,        # chamadas com hedging ligado
+    "hedged": 0,          # segundo provedor disparado (deadline estourado ou primário falhou)
+    "primary_won": 0,
+    "hedge_won": 0,
+    "both_failed": 0,
+    "saved_seconds": 0.0, # estimativa de latência economizada quando o hedge venceu
+}
+
+HEDGE_RESULTS = metrics.counter(
+    "balto_stt_hedge_total",
+    "Chamadas de STT com hedging por resultado (primary_fast, primary_won, hedge_won, both_failed)",
+    ("primary", "hedge", "result"),
+)
+HEDGE_SAVED_SECONDS = metrics.histogram(
+    "balto_stt_hedge_saved_seconds",
+    "Latência economizada (estimada) quando o provedor de hedge venceu",
+)
+
+
+class LatencyTracker:
+    """Janela das últimas latências de um provedor (para o deadline por percentil)."""
+    def __init__(self, size: int = 200):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def expected_beyond(self, elapsed: float) -> float | None:
+        """Latência média esperada dado que já passou de `elapsed` (None se nunca visto)."""
+        tail = [s for s in self.samples if s > elapsed]
+        return sum(tail) / len(tail) if tail else None
+
+
+_trackers: dict[str, LatencyTracker] = {}
+
+
+def tracker(provider: str) -> LatencyTracker:
+    t = _trackers.get(provider)
+    if t is None:
+        t = _trackers[provider] = LatencyTracker()
+    return t
+
+
+def deadline_for(provider: str) -> float:
+    """Percentil configurado da latência do provedor; padrão fixo até juntar amostras."""
+    t = tracker(provider)
+    if len(t.samples) < config.STT_HEDGE_MIN_SAMPLES:
+        return config.STT_HEDGE_DEFAULT_DEADLINE_S
+    return max(config.STT_HEDGE_MIN_DEADLINE_S, t.percentile(config.STT_HEDGE_PERCENTILE))
+
+
+async def _timed(provider: str, coro):
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        # cancelada também conta (limite inferior): sem isso o percentil só veria os rápidos
+        tracker(provider).record(time.perf_counter() - t0)
+
+
+async def run_hedged(primary: str, primary_call, hedge: str, hedge_call, is_usable) -> tuple[list[str], str, object]:
+    """
+    primary_call / hedge_call: funções sem argumento que devolvem a coroutine do provedor.
+    is_usable(resultado) -> bool.
+    Retorna (provedores disparados, vencedor, resultado). Se nenhum servir, devolve o do primário.
+    """
+    HEDGE_STATS["requests"] += 1
+    t0 = time.perf_counter()
+    primary_task = asyncio.ensure_future(_timed(primary, primary_call()))
+    hedge_task = None
+    fired = [primary]
+
+    try:
+        # 1. Só o primário até o deadline
+        done, _ = await asyncio.wait({primary_task}, timeout=deadline_for(primary))
+        if done and _usable(primary_task, is_usable):
+            HEDGE_STATS["primary_won"] += 1
+            HEDGE_RESULTS.labels(primary, hedge, "primary_fast").inc()
+            return fired, primary, primary_task.result()
+
+        # 2. Deadline estourado (ou primário falhou): dispara o hedge
+        HEDGE_STATS["hedged"] += 1
+        fired.append(hedge)
+        hedge_started = time.perf_counter() - t0
+        hedge_task = asyncio.ensure_future(_timed(hedge, hedge_call()))
+        pending = {hedge_task} if done else {primary_task, hedge_task}
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in (primary_task, hedge_task):
+                if task not in done or not _usable(task, is_usable):
+                    continue
+                if task is hedge_task:
+                    HEDGE_STATS["hedge_won"] += 1
+                    HEDGE_RESULTS.labels(primary, hedge, "hedge_won").inc()
+                    if not primary_task.done():
+                        _record_saved(primary, time.perf_counter() - t0)
+                    return fired, hedge, task.result()
+                HEDGE_STATS["primary_won"] += 1
+                HEDGE_RESULTS.labels(primary, hedge, "primary_won").inc()
+                return fired, primary, task.result()
+
+        HEDGE_STATS["both_failed"] += 1
+        HEDGE_RESULTS.labels(primary, hedge, "both_failed").inc()
+        print(f"[STT-HEDGE] {primary} e {hedge} falharam (hedge disparado em {hedge_started:.2f}s)")
+        return fired, primary, primary_task.result()
+    finally:
+        # Perdedor (ou tudo, se o chamador foi cancelado) é cancelado
+        for task in (primary_task, hedge_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def _usable(task: asyncio.Task, is_usable) -> bool:
+    if task.cancelled() or task.exception() is not None:
+        return False
+    return is_usable(task.result())
+
+
+def _record_saved(primary: str, won_at: float):
+    # O primário foi cancelado, então a latência dele é desconhecida: usa a média das
+    # amostras recentes que passaram de won_at (sem amostras, não contabiliza)
+    expected = tracker(primary).expected_beyond(won_at)
+    if expected is None:
+        return
+    saved = expected - won_at
+    HEDGE_STATS["saved_seconds"] += saved
+    HEDGE_SAVED_SECONDS.observe(saved)
+
+
+def snapshot() -> dict:
+    requests = HEDGE_STATS["requests"]
+    return {
+        **HEDGE_STATS,
+        "hedge_rate": round(HEDGE_STATS["hedged"] / requests, 4) if requests else 0.0,
+        "deadlines": {p: round(deadline_for(p), 3) for p in _trackers},
+    }
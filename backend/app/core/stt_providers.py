@@ -0,0 +1,126 @@
+import abc
+import asyncio
+from typing import NamedTuple
+from app.core.stt_router import STTProviderError
+
+# =========================
+# Registro dos provedores de STT. Todo backend expõe a mesma interface assíncrona:
+#
+#   await provider.transcribe(chunk)          -> Transcript(text, words)
+#   await provider.transcribe_batch(chunks)   -> [Transcript | STTProviderError, ...]
+#
+# e flags de capacidade (word_timestamps, streaming, batch). O roteador
+# (transcrever_inteligente), os endpoints de teste e as ferramentas offline escolhem o
+# provedor por nome aqui, sem if/elif por provedor.
+#
+# Os provedores de nuvem são registrados em app/transcription.py (onde ficam as chaves);
+# chunk = PCM16 mono 16k.
+# =========================
+
+
+class Transcript(NamedTuple):
+    text: str
+    words: list   # [{"text", "start", "end", "type"}]; vazio se o provedor não tem timestamps
+
+
+class STTProvider(abc.ABC):
+    name = ""
+    model = ""                # modelo usado no provedor (entra na chave do cache de transcrições)
+    cost = 0.0                # estimativa por chunk (roteador/orçamento)
+    word_timestamps = False
+    streaming = False
+    batch = False             # transcribe_batch nativo (senão: chunks concorrentes)
+    batch_concurrency = 4     # chamadas simultâneas no transcribe_batch genérico
+
+    def configured(self) -> bool:
+        return True
+
+    @abc.abstractmethod
+    async def transcribe(self, chunk: bytes | memoryview) -> Transcript:
+        """Um chunk. Falhas levantam STTProviderError."""
+
+    async def transcribe_batch(self, chunks: list) -> list:
+        """Transcreve vários chunks; falhas voltam na posição do chunk como STTProviderError."""
+        sem = asyncio.Semaphore(self.batch_concurrency)
+
+        async def one(chunk):
+            async with sem:
+                try:
+                    return await self.transcribe(chunk)
+                except STTProviderError as e:
+                    return e
+                except Exception as e:
+                    return STTProviderError(self.name, f"exceção: {e}")
+
+        return await asyncio.gather(*[one(c) for c in chunks])
+
+    def capabilities(self) -> dict:
+        return {
+            "name": self.name,
+            "configured": self.configured(),
+            "model": self.model,
+            "cost": self.cost,
+            "word_timestamps": self.word_timestamps,
+            "streaming": self.streaming,
+            "batch": self.batch,
+        }
+
+
+class FunctionProvider(STTProvider):
+    """Adapta uma função `async fn(chunk) -> str | (str, words)` à interface."""
+    def __init__(self, name: str, fn, cost: float, configured=None, *, word_timestamps: bool = False,
+                 streaming: bool = False, batch_fn=None, batch_concurrency: int = 4, model: str = ""):
+        self.name = name
+        self.model = model
+        self._fn = fn
+        self.cost = cost
+        self._configured = configured
+        self.word_timestamps = word_timestamps
+        self.streaming = streaming
+        self._batch_fn = batch_fn
+        self.batch = batch_fn is not None
+        self.batch_concurrency = batch_concurrency
+
+    def configured(self) -> bool:
+        return self._configured() if self._configured is not None else True
+
+    async def transcribe(self, chunk: bytes | memoryview) -> Transcript:
+        return _as_transcript(await self._fn(chunk))
+
+    async def transcribe_batch(self, chunks: list) -> list:
+        if self._batch_fn is None:
+            return await super().transcribe_batch(chunks)
+        return [r if isinstance(r, Exception) else _as_transcript(r) for r in await self._batch_fn(chunks)]
+
+
+def _as_transcript(result) -> Transcript:
+    if isinstance(result, tuple):
+        return Transcript(result[0] or "", list(result[1] or []))
+    return Transcript(result or "", [])
+
+
+_REGISTRY: dict[str, STTProvider] = {}
+
+
+def register(provider: STTProvider) -> STTProvider:
+    _REGISTRY[provider.name] = provider
+    return provider
+
+
+def get(name: str) -> STTProvider:
+    provider = _REGISTRY.get(name)
+    if provider is None:
+        raise KeyError(f"Provedor de STT desconhecido: {name}")
+    return provider
+
+
+def names() -> list[str]:
+    return list(_REGISTRY)
+
+
+def costs() -> dict[str, float]:
+    return {name: p.cost for name, p in _REGISTRY.items()}
+
+
+def snapshot() -> list[dict]:
+    return [p.capabilities() for p in _REGISTRY.values()]
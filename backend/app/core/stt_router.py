@@ -0,0 +1,268 @@
+import time
+from collections import deque
+from app.core import config, metrics
+
+# =========================
+# Roteador de STT: escolhe o provedor mais saudável entre os elegíveis.
+#
+# - saúde por provedor: janela das últimas chamadas (latência, erro)
+# - circuit breaker: abre após N falhas seguidas, fica aberto por um cooldown e depois
+#   deixa passar UMA chamada de teste (half-open); sucesso fecha, falha reabre. O rank só
+#   consulta (allow); a vaga de teste é reservada no disparo (dispatched), então pipelines
+#   concorrentes não mandam duas chamadas de teste para o mesmo provedor
+# - orçamento de custo por balcão (janela de 1h): estourado, só o provedor mais barato
+# - a regra SNR/duração (SMART_ROUTING_*) continua definindo o provedor preferido;
+#   o roteador só sai dela quando o preferido está doente ou fora do orçamento
+# =========================
+
+
+class STTProviderError(Exception):
+    """Falha de um provedor de STT (HTTP, rede, resposta inválida, sem chave)."""
+    def __init__(self, provider: str, reason: str, status: int | None = None):
+        super().__init__(f"[{provider}] {reason}")
+        self.provider = provider
+        self.reason = reason
+        self.status = status
+
+
+ROUTER_DECISIONS = metrics.counter(
+    "balto_stt_router_decisions_total",
+    "Escolhas do roteador de STT por provedor e motivo (preferred, probe, unhealthy, budget, failover)",
+    ("provider", "reason"),
+)
+ROUTER_CALLS = metrics.counter(
+    "balto_stt_router_calls_total",
+    "Chamadas de STT vistas pelo roteador por resultado (ok, error)",
+    ("provider", "result"),
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_s: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Consulta (não reserva a vaga de teste)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_s:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            return True
+        return False
+
+    def acquire(self) -> bool:
+        """No disparo: em half-open reserva a única vaga de teste; False se já está ocupada."""
+        self.allow()
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def on_success(self):
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def on_cancel(self):
+        # chamada de teste cancelada (hedge): libera para outra tentativa
+        self._probe_in_flight = False
+
+
+class ProviderHealth:
+    """Janela das últimas chamadas de um provedor: (latência, ok)."""
+    def __init__(self, name: str, cost: float, window: int):
+        self.name = name
+        self.cost = cost
+        self.calls: deque[tuple[float, bool]] = deque(maxlen=window)
+        self.breaker = CircuitBreaker(config.STT_BREAKER_FAILURES, config.STT_BREAKER_COOLDOWN_S)
+        self.last_error: str | None = None
+
+    def record(self, latency: float, ok: bool, error: str | None = None):
+        if ok and self.breaker.state == HALF_OPEN:
+            # chamada de teste passou: as falhas antigas não contam mais
+            self.calls.clear()
+        self.calls.append((latency, ok))
+        if ok:
+            self.breaker.on_success()
+        else:
+            self.last_error = error
+            self.breaker.on_failure()
+
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def latency_p50(self) -> float | None:
+        ok = sorted(lat for lat, good in self.calls if good)
+        return ok[len(ok) // 2] if ok else None
+
+    def healthy(self) -> bool:
+        return (
+            self.breaker.state == CLOSED
+            and (len(self.calls) < 5 or self.error_rate() <= config.STT_ROUTER_MAX_ERROR_RATE)
+        )
+
+    def score(self) -> float:
+        """Menor é melhor: latência típica penalizada pela taxa de erro."""
+        p50 = self.latency_p50()
+        if p50 is None:
+            p50 = config.STT_ROUTER_DEFAULT_LATENCY_S
+        return p50 * (1.0 + 4.0 * self.error_rate())
+
+
+class CostBudget:
+    """Gasto estimado por balcão na última hora."""
+    def __init__(self, per_hour: float):
+        self.per_hour = per_hour
+        self._spend: dict[str, deque] = {}
+
+    def spent(self, balcao_id: str) -> float:
+        q = self._spend.get(balcao_id)
+        if not q:
+            return 0.0
+        cutoff = time.monotonic() - 3600
+        while q and q[0][0] < cutoff:
+            q.popleft()
+        if not q:
+            # balcão sem gasto na última hora: sai do dict (não acumula balcões antigos)
+            del self._spend[balcao_id]
+            return 0.0
+        return sum(c for _, c in q)
+
+    def allows(self, balcao_id: str | None, cost: float) -> bool:
+        if not self.per_hour or balcao_id is None:
+            return True
+        return self.spent(balcao_id) + cost <= self.per_hour
+
+    def charge(self, balcao_id: str | None, cost: float):
+        if balcao_id is None or not cost:
+            return
+        self._spend.setdefault(balcao_id, deque()).append((time.monotonic(), cost))
+
+
+class STTRouter:
+    def __init__(self, costs: dict[str, float]):
+        self.providers = {
+            name: ProviderHealth(name, cost, config.STT_ROUTER_WINDOW)
+            for name, cost in costs.items()
+        }
+        self.budget = CostBudget(config.STT_COST_BUDGET_PER_HOUR)
+        self.decisions: deque[dict] = deque(maxlen=100)
+
+    def rank(self, candidates: list[str], preferred: str, balcao_id: str | None) -> list[tuple[str, str]]:
+        """
+        Ordena os candidatos (já filtrados por configuração/qualidade do áudio).
+        Retorna [(provedor, motivo), ...] na ordem de tentativa.
+        """
+        allowed = [p for p in candidates if self.providers[p].breaker.allow()]
+        if not allowed:
+            # Tudo aberto: tenta o preferido mesmo assim (melhor que não transcrever)
+            allowed = [preferred] if preferred in candidates else candidates[:1]
+
+        in_budget = [p for p in allowed if self.budget.allows(balcao_id, self.providers[p].cost)]
+        over_budget = not in_budget
+        if over_budget:
+            cheapest = min(self.providers[p].cost for p in allowed)
+            in_budget = [p for p in allowed if self.providers[p].cost == cheapest]
+
+        healthy = [p for p in in_budget if self.providers[p].healthy()]
+        pool = healthy or in_budget
+        ordered = sorted(pool, key=lambda p: self.providers[p].score())
+        if preferred in ordered:
+            ordered.remove(preferred)
+            ordered.insert(0, preferred)
+
+        # Preferido em half-open recebe a chamada de teste
+        probing = (
+            self.providers[preferred].breaker.state == HALF_OPEN
+            and preferred in in_budget and preferred not in ordered
+        )
+        if probing:
+            ordered.insert(0, preferred)
+
+        first = ordered[0]
+        if probing or (first == preferred and self.providers[preferred].breaker.state == HALF_OPEN):
+            reason = "probe"
+        elif over_budget:
+            reason = "budget"
+        elif first == preferred:
+            reason = "preferred"
+        elif preferred in allowed and self.providers[preferred].healthy():
+            reason = "budget"
+        else:
+            reason = "unhealthy"
+
+        out = [(first, reason)]
+        # Demais elegíveis (saudáveis primeiro) para failover
+        rest = [p for p in sorted(allowed, key=lambda p: (not self.providers[p].healthy(), self.providers[p].score()))
+                if p != first and self.budget.allows(balcao_id, self.providers[p].cost)]
+        out += [(p, "failover") for p in rest]
+        return out
+
+    def dispatched(self, provider: str) -> bool:
+        """Reserva a chamada no breaker. False: half-open com a chamada de teste já em andamento."""
+        return self.providers[provider].breaker.acquire()
+
+    def record(self, provider: str, latency: float, ok: bool, error: str | None = None):
+        self.providers[provider].record(latency, ok, error)
+        ROUTER_CALLS.labels(provider, "ok" if ok else "error").inc()
+
+    def record_cancel(self, provider: str):
+        self.providers[provider].breaker.on_cancel()
+
+    def log_decision(self, balcao_id: str | None, preferred: str, chosen: str, reason: str,
+                     snr: float, duration: float, tried: list[str]):
+        ROUTER_DECISIONS.labels(chosen, reason).inc()
+        self.decisions.append({
+            "ts": time.time(),
+            "balcao_id": balcao_id,
+            "preferred": preferred,
+            "chosen": chosen,
+            "reason": reason,
+            "tried": tried,
+            "snr": round(snr, 2),
+            "duration_s": round(duration, 2),
+        })
+
+    def snapshot(self) -> dict:
+        providers = {}
+        for name, h in self.providers.items():
+            p50 = h.latency_p50()
+            providers[name] = {
+                "breaker": h.breaker.state,
+                "breaker_opens": h.breaker.opens,
+                "consecutive_failures": h.breaker.consecutive_failures,
+                "calls": len(h.calls),
+                "error_rate": round(h.error_rate(), 4),
+                "latency_p50": round(p50, 3) if p50 is not None else None,
+                "score": round(h.score(), 3),
+                "cost": h.cost,
+                "last_error": h.last_error,
+            }
+        return {
+            "providers": providers,
+            "budget_per_hour": self.budget.per_hour,
+            "spent_last_hour": {b: round(self.budget.spent(b), 4) for b in list(self.budget._spend)},
+            "recent_decisions": list(self.decisions)[-20:],
+        }
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+import aiohttp
+from app.core import config, metrics, http_pool
+
+# =========================
+# Sessão de STT em streaming por balcão (protocolo do Deepgram live, /v1/listen via websocket).
+#
+# O PCM do decoder é empurrado assim que chega (push); a sessão envia em frames e recebe
+# parciais (is_final=false) e finais. Cada resultado sai por on_result com o tempo no
+# stream da conexão do cliente (não da conexão com o provedor).
+#
+# Reconexão transparente: o áudio desde o fim do último resultado final fica guardado;
+# ao reconectar, é reenviado e os finais repetidos (fim <= último final) são ignorados.
+# Conexão caída por mais de STT_STREAM_MAX_BUFFER_S: o áudio mais antigo é descartado.
+# =========================
+
+SAMPLE_RATE = 16000
+BYTES_PER_SEC = SAMPLE_RATE * 2
+FRAME_BYTES = BYTES_PER_SEC // 10   # 100ms por mensagem
+KEEPALIVE_S = 4.0
+_EPS_S = 0.02
+
+STREAM_STATS = {
+    "sessions": 0,
+    "active": 0,
+    "connects": 0,
+    "reconnects": 0,
+    "finals": 0,
+    "partials": 0,
+    "duplicates_skipped": 0,
+    "audio_replayed_s": 0.0,
+    "audio_dropped_s": 0.0,
+}
+
+STREAM_LATENCY = metrics.histogram(
+    "balto_stt_stream_final_lag_seconds",
+    "Atraso entre o áudio do fim de um trecho ser empurrado e o resultado final chegar",
+    buckets=(0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0),
+)
+
+
+class StreamResult:
+    __slots__ = ("text", "is_final", "start", "end", "words", "audio")
+
+    def __init__(self, text: str, is_final: bool, start: float, end: float, words: list,
+                 audio: bytes = b""):
+        self.text = text
+        self.is_final = is_final
+        self.start = start      # segundos no stream da conexão do cliente
+        self.end = end
+        self.words = words      # timestamps relativos a `start` (formato do ElevenLabs)
+        self.audio = audio      # finais: PCM de [start, end), recortado quando o final chegou
+
+
+def stream_url(base_url: str | None = None) -> str:
+    params = {
+        "encoding": "linear16",
+        "sample_rate": SAMPLE_RATE,
+        "channels": 1,
+        "model": config.STT_STREAM_MODEL,
+        "language": config.STT_STREAM_LANGUAGE,
+        "interim_results": "true",
+        "smart_format": "true",
+        "endpointing": config.STT_STREAM_ENDPOINTING_MS,
+    }
+    return f"{base_url or config.STT_STREAM_URL}?{urlencode(params)}"
+
+
+class StreamingSTTSession:
+    """
+    Uso:
+        session = StreamingSTTSession(balcao_id, api_key, on_result)
+        session.start()
+        session.push(pcm)            # a cada bloco do decoder (não bloqueia)
+        ...
+        await session.close()        # pede os finais pendentes e encerra
+
+    on_result(StreamResult) é chamado no event loop (deve ser rápido; enfileire o trabalho).
+    Os finais já trazem o PCM do trecho (res.audio): não dependem do histórico depois.
+    """
+    def __init__(self, balcao_id: str, api_key: str | None, on_result, url: str | None = None):
+        self.balcao_id = balcao_id
+        self.api_key = api_key
+        self.on_result = on_result
+        self.url = url or stream_url()
+
+        # Posições absolutas em bytes no stream do cliente
+        self._history = bytearray()
+        self._hist_start = 0        # posição de _history[0]
+        self._pushed = 0            # fim do áudio recebido
+        self._final_pos = 0         # fim do último resultado final
+        self._pushed_at: list[tuple[int, float]] = []   # (posição, monotonic) para medir o atraso
+
+        self._new_audio = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+        self.reconnects = 0
+        self.finals = 0
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def start(self):
+        STREAM_STATS["sessions"] += 1
+        STREAM_STATS["active"] += 1
+        self._task = asyncio.create_task(self._run())
+
+    def push(self, pcm: bytes | memoryview):
+        if self._closing or not pcm:
+            return
+        self._history += pcm
+        self._pushed += len(pcm)
+        self._pushed_at.append((self._pushed, time.monotonic()))
+        if len(self._pushed_at) > 512:
+            del self._pushed_at[:256]
+
+        # Provedor fora do ar há muito tempo: descarta o áudio mais antigo
+        excess = len(self._history) - int(config.STT_STREAM_MAX_BUFFER_S * BYTES_PER_SEC)
+        if excess > 0:
+            excess += excess % 2
+            del self._history[:excess]
+            self._hist_start += excess
+            if self._final_pos < self._hist_start:
+                STREAM_STATS["audio_dropped_s"] += (self._hist_start - self._final_pos) / BYTES_PER_SEC
+                self._final_pos = self._hist_start
+        self._new_audio.set()
+
+    def audio_slice(self, start_s: float, end_s: float) -> bytes:
+        """PCM do trecho [start_s, end_s) do stream (o que ainda estiver no histórico)."""
+        a = max(int(start_s * BYTES_PER_SEC) & ~1, self._hist_start)
+        b = min(int(end_s * BYTES_PER_SEC) & ~1, self._pushed)
+        if b <= a:
+            return b""
+        return bytes(self._history[a - self._hist_start:b - self._hist_start])
+
+    async def close(self, drain_s: float = 2.0):
+        """Pede ao provedor os finais do áudio já enviado e encerra a sessão."""
+        if self._closing:
+            return
+        self._closing = True
+        self._new_audio.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout=drain_s)
+            except (asyncio.TimeoutError, Exception):
+                pass
+            if not self._task.done():
+                self._task.cancel()
+                try:
+                    await self._task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        STREAM_STATS["active"] -= 1
+
+    # ------------------------------------------------------------------
+    # Conexão
+    # ------------------------------------------------------------------
+    async def _run(self):
+        backoff = config.STT_STREAM_RECONNECT_MIN_S
+        first = True
+        while not self._closing:
+            try:
+                headers = {"Authorization": f"Token {self.api_key}"} if self.api_key else {}
+                async with http_pool.get_session().ws_connect(self.url, headers=headers, heartbeat=20.0) as ws:
+                    STREAM_STATS["connects"] += 1
+                    if not first:
+                        replay_s = (self._pushed - max(self._final_pos, self._hist_start)) / BYTES_PER_SEC
+                        self.reconnects += 1
+                        STREAM_STATS["reconnects"] += 1
+                        STREAM_STATS["audio_replayed_s"] += replay_s
+                        print(f"[{self.balcao_id}] [STT-STREAM] Reconectado (reenviando {replay_s:.1f}s)")
+                    first = False
+                    backoff = config.STT_STREAM_RECONNECT_MIN_S
+                    await self._session_loop(ws)
+                    if self._closing:
+                        return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{self.balcao_id}] [STT-STREAM] Conexão falhou: {e}")
+            if self._closing:
+                return
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, config.STT_STREAM_RECONNECT_MAX_S)
+
+    async def _session_loop(self, ws):
+        # A conexão nova começa no fim do último final: reenvia o que ainda não foi finalizado
+        conn_start = self._final_pos
+        sender = asyncio.create_task(self._sender(ws, conn_start))
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self._handle_message(json.loads(msg.data), conn_start)
+                elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                    break
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _sender(self, ws, conn_start: int):
+        sent = conn_start
+        while True:
+            if sent < self._hist_start:
+                sent = self._hist_start   # áudio descartado enquanto desconectado
+            if sent < self._pushed:
+                end = min(self._pushed, sent + FRAME_BYTES)
+                await ws.send_bytes(bytes(self._history[sent - self._hist_start:end - self._hist_start]))
+                sent = end
+                continue
+            if self._closing:
+                await ws.send_str(json.dumps({"type": "CloseStream"}))
+                return
+            self._new_audio.clear()
+            try:
+                await asyncio.wait_for(self._new_audio.wait(), timeout=KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                await ws.send_str(json.dumps({"type": "KeepAlive"}))
+
+    def _handle_message(self, msg: dict, conn_start: int):
+        if msg.get("type") != "Results":
+            return
+        alt = ((msg.get("channel") or {}).get("alternatives") or [{}])[0]
+        text = (alt.get("transcript") or "").strip()
+        rel_start = float(msg.get("start") or 0.0)
+        start = conn_start / BYTES_PER_SEC + rel_start
+        end = start + float(msg.get("duration") or 0.0)
+        is_final = bool(msg.get("is_final"))
+
+        audio = b""
+        if is_final:
+            final_s = self._final_pos / BYTES_PER_SEC
+            if end <= final_s + _EPS_S:
+                STREAM_STATS["duplicates_skipped"] += 1
+                return
+            self._final_pos = min(self._pushed, int(end * BYTES_PER_SEC) & ~1)
+            self._observe_lag(self._final_pos)
+            # Recorta agora: o consumidor pode demorar e o histórico é aparado a seguir
+            if text:
+                audio = self.audio_slice(start, end)
+            self._trim_history()
+            self.finals += 1
+            STREAM_STATS["finals"] += 1
+        else:
+            STREAM_STATS["partials"] += 1
+        if not text:
+            return
+
+        words = [
+            {"text": w.get("punctuated_word") or w.get("word") or "",
+             "start": round(float(w["start"]) - rel_start, 3),
+             "end": round(float(w["end"]) - rel_start, 3),
+             "type": "word"}
+            for w in alt.get("words") or []
+            if w.get("start") is not None and w.get("end") is not None
+        ]
+        self.on_result(StreamResult(text, is_final, start, end, words, audio))
+
+    def _observe_lag(self, pos: int):
+        for p, t in self._pushed_at:
+            if p >= pos:
+                STREAM_LATENCY.observe(time.monotonic() - t)
+                return
+
+    def _trim_history(self):
+        # Mantém o áudio não finalizado + STT_STREAM_HISTORY_S para recortar os trechos finais
+        keep_from = min(self._final_pos, self._pushed - int(config.STT_STREAM_HISTORY_S * BYTES_PER_SEC))
+        keep_from = max(keep_from & ~1, self._hist_start)
+        if keep_from > self._hist_start:
+            del self._history[:keep_from - self._hist_start]
+            self._hist_start = keep_from
+
+
+def snapshot() -> dict:
+    return dict(STREAM_STATS)
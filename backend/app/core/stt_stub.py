@@ -0,0 +1,48 @@
+import asyncio
+import math
+import random
+from app.core.stt_router import STTProviderError
+
+# =========================
+# Provedor de STT falso (local) com latência configurável, para testar hedging/roteamento
+# sem gastar cota. Distribuições:
+#   "fixed:0.8"            sempre 0.8s
+#   "uniform:0.5,1.5"      uniforme entre 0.5s e 1.5s
+#   "lognormal:0.8,0.6"    mediana 0.8s, sigma 0.6 (cauda longa, como os provedores reais)
+# =========================
+
+
+def parse_latency(spec: str):
+    """Devolve uma função sem argumentos que sorteia a latência (segundos)."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Distribuição de latência inválida: {spec!r}")
+
+
+class StubProvider:
+    def __init__(self, latency: str = "lognormal:0.8,0.6", fail_rate: float = 0.0,
+                 text: str = "teste de transcrição"):
+        self.sample_latency = parse_latency(latency)
+        self.fail_rate = fail_rate
+        self.text = text
+        self.calls = 0
+        self.cancelled = 0
+
+    async def transcribe(self, audio_bytes: bytes | memoryview) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.sample_latency())
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if random.random() < self.fail_rate:
+            raise STTProviderError("stub", "falha simulada")
+        return self.text
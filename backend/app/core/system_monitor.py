@@ -19,6 +19,44 @@ SYSTEM_METRICS = {
     "conns": 0
 }
 
+# Modo --workers: o processo de serviços publica as métricas num multiprocessing.Array
+# (mesma ordem de SYSTEM_METRICS) e os workers só leem.
+_shared_metrics = None
+_tree_root_pid: int | None = None
+
+def attach_shared(shared, root_pid: int | None = None):
+    """root_pid: mede a árvore de processos a partir dele (supervisor + workers)."""
+    global _shared_metrics, _tree_root_pid
+    _shared_metrics = shared
+    _tree_root_pid = root_pid
+
+async def start_metrics_reader_task():
+    """Workers (--workers): copia para SYSTEM_METRICS o que o processo de serviços publicou."""
+    while True:
+        if _shared_metrics is not None:
+            for i, key in enumerate(SYSTEM_METRICS):
+                SYSTEM_METRICS[key] = _shared_metrics[i]
+            SYSTEM_METRICS["conns"] = int(SYSTEM_METRICS["conns"])
+        await asyncio.sleep(2)
+
+def _sample_processes():
+    """(ram_mb, conns) deste processo ou, no modo --workers, de toda a árvore do supervisor."""
+    if _tree_root_pid is None:
+        process = psutil.Process()
+        return process.memory_info().rss / (1024 * 1024), len(process.connections())
+
+    root = psutil.Process(_tree_root_pid)
+    ram = 0
+    conns = 0
+    # RSS somado: páginas copy-on-write compartilhadas contam em cada worker
+    for p in [root] + root.children(recursive=True):
+        try:
+            ram += p.memory_info().rss
+            conns += len(p.connections())
+        except psutil.Error:
+            continue
+    return ram / (1024 * 1024), conns
+
 async def start_monitor_task(app):
     if psutil is None:
          print("[MONITOR] psutil missing. Task cancelled.")
@@ -47,13 +85,14 @@ async def start_monitor_task(app):
             # 1. Update Global Cache (Fast)
             # interval=0.1 avoids blocking for too long, but gives a sample
             cpu = psutil.cpu_percent(interval=None) 
-            process = psutil.Process()
-            ram_mb = process.memory_info().rss / (1024 * 1024)
-            conns = len(process.connections()) # This can still be heavy, be careful
+            ram_mb, conns = _sample_processes() # connections() can still be heavy, be careful
             
             SYSTEM_METRICS["cpu"] = cpu
             SYSTEM_METRICS["ram"] = ram_mb
             SYSTEM_METRICS["conns"] = conns
+            if _shared_metrics is not None:
+                for i, key in enumerate(SYSTEM_METRICS):
+                    _shared_metrics[i] = SYSTEM_METRICS[key]
             
             # 2. Write to CSV (Slow)
             now_ts = asyncio.get_event_loop().time()
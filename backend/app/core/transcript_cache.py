@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.core import config, metrics
+
+# =========================
+# Cache de transcrições endereçado pelo conteúdo do áudio.
+#
+# Chave = sha256(provedor | modelo | PCM enviado). O mesmo áudio no mesmo provedor/modelo
+# devolve a transcrição guardada sem chamar o provedor (replays, local_stress, testes/).
+#
+#   - memória: LRU com TRANSCRIPT_CACHE_MEM_ENTRIES entradas
+#   - disco: um JSON por chave em TRANSCRIPT_CACHE_DIR, limitado a TRANSCRIPT_CACHE_DISK_MAX_MB;
+#     estourou, apaga os menos usados (mtime é atualizado a cada hit)
+#   - single-flight: chamadas simultâneas do mesmo áudio (N clientes de estresse com o
+#     mesmo arquivo) fazem UMA chamada ao provedor
+#
+# Só resultados de sucesso são guardados. O custo de um hit é zero (ver transcription.py).
+# =========================
+
+_FORMAT = 1   # muda se o formato do JSON mudar (invalida o disco)
+
+CACHE_STATS = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "shared": 0,          # esperou a chamada de outro request com o mesmo áudio
+    "misses": 0,
+    "stores": 0,
+    "disk_evictions": 0,
+    "disk_errors": 0,
+}
+
+_STAT_FOR_RESULT = {"memory": "memory_hits", "disk": "disk_hits", "shared": "shared", "miss": "misses"}
+
+TRANSCRIPT_CACHE_LOOKUPS = metrics.counter(
+    "balto_transcript_cache_total",
+    "Lookups do cache de transcrições (memory, disk, shared, miss)",
+    ("provider", "result"),
+)
+
+
+def cache_key(provider: str, model: str, audio: bytes | memoryview) -> str:
+    h = hashlib.sha256(f"{_FORMAT}|{provider}|{model}|".encode())
+    h.update(audio)
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Uso:
+        resultado, hit = await transcript_cache.get_or_compute(provider, model, pcm, chamar)
+
+    chamar() -> (texto, words). Exceções de chamar() passam direto e não são guardadas.
+    """
+    def __init__(self, enabled: bool | None = None, directory: str | None = None,
+                 mem_entries: int | None = None, disk_max_mb: float | None = None,
+                 skip: set | None = None):
+        self.enabled = config.TRANSCRIPT_CACHE_ENABLE if enabled is None else enabled
+        self.directory = config.TRANSCRIPT_CACHE_DIR if directory is None else directory
+        self.mem_entries = config.TRANSCRIPT_CACHE_MEM_ENTRIES if mem_entries is None else mem_entries
+        self.disk_max_bytes = int((config.TRANSCRIPT_CACHE_DISK_MAX_MB if disk_max_mb is None else disk_max_mb)
+                                  * 1024 * 1024)
+        self.skip = config.TRANSCRIPT_CACHE_SKIP if skip is None else skip
+
+        self._mem: OrderedDict[str, tuple[str, list]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Índice do disco em ordem de uso (o mais antigo primeiro); carregado no primeiro acesso
+        self._disk: OrderedDict[str, int] | None = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+
+    def enabled_for(self, provider: str) -> bool:
+        return self.enabled and provider not in self.skip
+
+    async def get_or_compute(self, provider: str, model: str, audio: bytes | memoryview, compute):
+        """Retorna ((texto, words), hit)."""
+        key = cache_key(provider, model, audio)
+        while True:
+            cached = self._mem_get(key)
+            if cached is not None:
+                self._count(provider, "memory")
+                return cached, True
+
+            if self.directory and self.disk_max_bytes > 0:
+                cached = await asyncio.to_thread(self._disk_get, key)
+                if cached is not None:
+                    self._mem_put(key, cached)
+                    self._count(provider, "disk")
+                    return cached, True
+
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            # Outro request já está transcrevendo este áudio: espera o resultado dele.
+            # None = a chamada dele falhou ou foi cancelada; tenta de novo (talvez como líder).
+            result = await asyncio.shield(fut)
+            if result is not None:
+                self._count(provider, "shared")
+                return result, True
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self._count(provider, "miss")
+        try:
+            texto, words = await compute()
+            result = (texto, list(words or []))
+        except BaseException:
+            fut.set_result(None)
+            raise
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+        fut.set_result(result)
+        self._mem_put(key, result)
+        CACHE_STATS["stores"] += 1
+        if self.directory and self.disk_max_bytes > 0:
+            await asyncio.to_thread(self._disk_put, key, provider, model, result)
+        return result, False
+
+    def clear(self):
+        self._mem.clear()
+
+    # ------------------------------------------------------------------
+    # Memória
+    # ------------------------------------------------------------------
+    def _mem_get(self, key: str):
+        entry = self._mem.get(key)
+        if entry is not None:
+            self._mem.move_to_end(key)
+        return entry
+
+    def _mem_put(self, key: str, value: tuple[str, list]):
+        if self.mem_entries <= 0:
+            return
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Disco (roda em thread)
+    # ------------------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._disk is not None:
+            return
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-5], st.st_size))
+        entries.sort()
+        self._disk = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_bytes = sum(size for _, _, size in entries)
+
+    def _disk_get(self, key: str):
+        with self._disk_lock:
+            self._load_index()
+            if key not in self._disk:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                CACHE_STATS["disk_errors"] += 1
+                self._disk_bytes -= self._disk.pop(key, 0)
+                return None
+            self._disk.move_to_end(key)
+            return data["text"], data["words"]
+
+    def _disk_put(self, key: str, provider: str, model: str, value: tuple[str, list]):
+        payload = json.dumps({
+            "provider": provider, "model": model, "text": value[0], "words": value[1],
+            "created": time.time(),
+        }, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        with self._disk_lock:
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp, path)
+            except OSError as e:
+                CACHE_STATS["disk_errors"] += 1
+                print(f"[TranscriptCache] Falha ao gravar {path}: {e}")
+                return
+            self._disk_bytes += len(payload) - self._disk.pop(key, 0)
+            self._disk[key] = len(payload)
+
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                CACHE_STATS["disk_evictions"] += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    def _count(self, provider: str, result: str):
+        CACHE_STATS[_STAT_FOR_RESULT[result]] += 1
+        TRANSCRIPT_CACHE_LOOKUPS.labels(provider, result).inc()
+
+    def snapshot(self) -> dict:
+        hits = CACHE_STATS["memory_hits"] + CACHE_STATS["disk_hits"] + CACHE_STATS["shared"]
+        total = hits + CACHE_STATS["misses"]
+        return {
+            **CACHE_STATS,
+            "enabled": self.enabled,
+            "hit_rate": round(hits / total, 4) if total else None,
+            "memory_entries": len(self._mem),
+            "memory_max_entries": self.mem_entries,
+            "disk_entries": len(self._disk) if self._disk is not None else None,
+            "disk_mb": round(self._disk_bytes / (1024 * 1024), 2) if self._disk is not None else None,
+            "disk_max_mb": round(self.disk_max_bytes / (1024 * 1024), 2),
+            "directory": self.directory,
+        }
+
+
+# Instância Global
+transcript_cache = TranscriptCache()
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.core import config, metrics
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# =========================
+# Codificação do áudio enviado aos provedores de STT, escolhida por provedor
+# (config.STT_UPLOAD_ENCODINGS). PCM16 mono 16k cru = 256 kbps; FLAC (sem perdas)
+# costuma ficar em ~50-60% disso e Opus em 16-32 kbps.
+#
+#   "pcm"  PCM cru (ElevenLabs aceita com file_format=pcm_s16le_16)
+#   "wav"  PCM com cabeçalho WAV (padrão dos outros provedores)
+#   "flac" FLAC via PyAV
+#   "opus" Opus em Ogg via PyAV (config.STT_UPLOAD_OPUS_BITRATE)
+#
+# FLAC/Opus rodam num pool de threads próprio (o encode do libav solta o GIL);
+# sem PyAV cai para WAV.
+# =========================
+
+SAMPLE_RATE = 16000
+
+ENCODE_SECONDS = metrics.histogram(
+    "balto_upload_encode_seconds",
+    "Tempo de codificação do áudio de upload para STT por formato",
+    ("encoding",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+UPLOAD_BYTES = metrics.counter(
+    "balto_upload_bytes_total",
+    "Bytes de áudio enviados aos provedores de STT (raw = PCM antes da codificação)",
+    ("provider", "encoding", "kind"),
+)
+
+_CONTENT = {
+    "pcm": ("application/octet-stream", "audio.pcm"),
+    "wav": ("audio/wav", "audio.wav"),
+    "flac": ("audio/flac", "audio.flac"),
+    "opus": ("audio/ogg", "audio.ogg"),
+}
+
+_executor: ThreadPoolExecutor | None = None
+_warned_no_av = False
+
+
+class EncodedAudio:
+    __slots__ = ("data", "encoding", "content_type", "filename")
+
+    def __init__(self, data: bytes, encoding: str):
+        self.data = data
+        self.encoding = encoding
+        self.content_type, self.filename = _CONTENT[encoding]
+
+
+def encoding_for(provider: str) -> str:
+    encoding = config.STT_UPLOAD_ENCODINGS.get(provider, "wav")
+    return encoding if encoding in _CONTENT else "wav"
+
+
+def _encode_wav(pcm) -> bytes:
+    """Envelopa PCM16 mono 16k num WAV."""
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(pcm)
+    return wav_buffer.getvalue()
+
+
+def _encode_av(pcm, container: str, codec: str, bit_rate: int | None = None) -> bytes:
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    out = io.BytesIO()
+    with av.open(out, "w", format=container) as c:
+        stream = c.add_stream(codec, rate=SAMPLE_RATE, layout="mono")
+        if bit_rate:
+            stream.bit_rate = bit_rate
+        step = 4096
+        for i in range(0, len(samples), step):
+            part = samples[i:i + step]
+            frame = av.AudioFrame.from_ndarray(part.reshape(1, -1), format="s16", layout="mono")
+            frame.sample_rate = SAMPLE_RATE
+            frame.pts = i
+            for packet in stream.encode(frame):
+                c.mux(packet)
+        for packet in stream.encode(None):
+            c.mux(packet)
+    return out.getvalue()
+
+
+def encode_sync(pcm, encoding: str) -> bytes:
+    """Codifica (bloqueante). Usado pelo encode() e pelo bench."""
+    if encoding == "pcm":
+        return bytes(pcm)
+    if encoding == "wav":
+        return _encode_wav(pcm)
+    if encoding == "flac":
+        return _encode_av(pcm, "flac", "flac")
+    if encoding == "opus":
+        return _encode_av(pcm, "ogg", "libopus", config.STT_UPLOAD_OPUS_BITRATE)
+    raise ValueError(f"Codificação de upload desconhecida: {encoding}")
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.STT_UPLOAD_ENCODER_THREADS,
+                                       thread_name_prefix="upload-enc")
+    return _executor
+
+
+async def encode(provider: str, pcm) -> EncodedAudio:
+    """Codifica o PCM no formato configurado para o provedor (FLAC/Opus fora do loop)."""
+    global _warned_no_av
+    encoding = encoding_for(provider)
+    if encoding in ("flac", "opus") and av is None:
+        if not _warned_no_av:
+            print(f"[UploadEncoder] {encoding} requer PyAV (av), que não está instalado. Usando WAV.")
+            _warned_no_av = True
+        encoding = "wav"
+
+    t0 = time.perf_counter()
+    if encoding in ("pcm", "wav"):
+        data = encode_sync(pcm, encoding)
+    else:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(_get_executor(), encode_sync, pcm, encoding)
+    ENCODE_SECONDS.labels(encoding).observe(time.perf_counter() - t0)
+    UPLOAD_BYTES.labels(provider, encoding, "raw").inc(len(pcm))
+    UPLOAD_BYTES.labels(provider, encoding, "sent").inc(len(data))
+    return EncodedAudio(data, encoding)
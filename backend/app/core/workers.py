@@ -0,0 +1,106 @@
+import asyncio
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import tempfile
+import time
+from aiohttp import web
+from app.core import config, audio_archiver, system_monitor, metrics
+
+# None = modo single-process; 0..N-1 dentro de um worker do --workers
+WORKER_ID: int | None = None
+
+# Chunks do archiver aguardando o processo de serviços (~5s de áudio cada no SIMPLE_CHUNK_MODE)
+ARCHIVE_FORWARD_MAX = 2000
+
+
+def _worker_main(worker_id: int, app_factory, archive_q, shared_metrics, metrics_dir: str):
+    global WORKER_ID
+    WORKER_ID = worker_id
+    metrics.enable_multiprocess(metrics_dir, worker_id)
+
+    # Singletons de host ficam no processo de serviços; aqui só repassamos
+    audio_archiver.archiver.attach_forwarder(archive_q)
+    system_monitor.attach_shared(shared_metrics)
+
+    app = app_factory()
+    print(f"[WORKERS] worker-{worker_id} pid={os.getpid()} ouvindo na porta {config.PORT} (SO_REUSEPORT)")
+    web.run_app(app, port=config.PORT, reuse_port=True, print=None)
+
+
+def _services_main(archive_q, shared_metrics, supervisor_pid: int, host_services):
+    system_monitor.attach_shared(shared_metrics, root_pid=supervisor_pid)
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        await host_services()
+        audio_archiver.archiver.start_forward_drain(archive_q)
+        print(f"[WORKERS] serviços de host pid={os.getpid()} (archiver, monitor, drive sync)")
+
+        await stop.wait()
+        await audio_archiver.archiver.stop()
+
+    asyncio.run(run())
+
+
+def serve(n_workers: int, app_factory, host_services):
+    """
+    Modo multi-processo (--workers N). Chamar DEPOIS de carregar os modelos: os filhos
+    nascem por fork e herdam os pesos copy-on-write.
+
+    - N workers HTTP/WS na mesma porta com SO_REUSEPORT (o kernel distribui as conexões)
+    - 1 processo de serviços com os singletons de host: archiver, system monitor, drive sync
+      (host_services: coroutine function que inicia essas tasks)
+    - este processo só supervisiona: reinicia filhos que morrerem e repassa SIGTERM/SIGINT
+    """
+    ctx = mp.get_context("fork")
+    archive_q = ctx.Queue(maxsize=ARCHIVE_FORWARD_MAX)
+    shared_metrics = ctx.Array("d", len(system_monitor.SYSTEM_METRICS), lock=False)
+    supervisor_pid = os.getpid()
+    # Snapshots de métricas dos workers (GET /metrics em qualquer worker junta todos)
+    metrics_dir = tempfile.mkdtemp(prefix="balto_metrics_")
+
+    specs = {"services": (_services_main, archive_q, shared_metrics, supervisor_pid, host_services)}
+    for i in range(n_workers):
+        specs[f"worker-{i}"] = (_worker_main, i, app_factory, archive_q, shared_metrics, metrics_dir)
+
+    def spawn(name: str):
+        target, *args = specs[name]
+        p = ctx.Process(target=target, args=tuple(args), name=name)
+        p.start()
+        return p
+
+    procs = {name: spawn(name) for name in specs}
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"[WORKERS] Supervisor pid={supervisor_pid}: {n_workers} workers + serviços")
+
+    while not stopping:
+        time.sleep(1)
+        for name, p in list(procs.items()):
+            if not p.is_alive() and not stopping:
+                print(f"[WORKERS] {name} (pid={p.pid}) saiu com código {p.exitcode}; reiniciando")
+                procs[name] = spawn(name)
+
+    print("[WORKERS] Encerrando filhos...")
+    for p in procs.values():
+        if p.is_alive():
+            p.terminate()
+    for p in procs.values():
+        p.join(timeout=10)
+        if p.is_alive():
+            p.kill()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -216,6 +216,46 @@ def validate_api_key(api_key):
         print(f"Erro ao validar API Key: {e}")
         return None
 
+def get_handshake_context(api_key):
+    """
+    Tudo que o handshake do websocket precisa numa consulta só:
+    {"balcao_id", "user_id", "vad_config", "fallback_funcionario_id"} ou None se a key não existe.
+    Cria o funcionário fallback se ainda não existir (uma vez por user).
+    """
+    import json
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT b.balcao_id, b.user_id, b.vad_config, f.id
+        FROM balcoes b
+        LEFT JOIN funcionarios f
+          ON f.user_id = b.user_id AND f.nome = 'Cliente / Desconhecido'
+        WHERE b.api_key = %s
+        ORDER BY f.id
+        LIMIT 1
+    """, (api_key,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if not row:
+        return None
+
+    balcao_id, user_id, vad_raw, fallback_id = row
+    if isinstance(vad_raw, dict):
+        vad_config = vad_raw
+    else:
+        vad_config = json.loads(vad_raw) if vad_raw else {}
+
+    if fallback_id is None:
+        fallback_id = get_fallback_funcionario_id(balcao_id)
+
+    return {
+        "balcao_id": balcao_id,
+        "user_id": user_id,
+        "vad_config": vad_config,
+        "fallback_funcionario_id": fallback_id,
+    }
+
 def get_user_id_by_balcao(balcao_id: str):
     conn = get_db_connection()
     cur = conn.cursor()
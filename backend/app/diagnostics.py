@@ -7,17 +7,18 @@ from app.core import ai_client, config
 def check_openai():
     """Verifica conexão com a OpenAI."""
     try:
-        if not ai_client.ai_client.client:
+        if not ai_client.ai_client.enabled:
             return "❌ OFF (Cliente não inicializado ou sem chave)"
         
-        # Teste simples de conexão (list models ou chat curto)
-        # Vamos tentar um chat ultra-básico p/ garantir que a chave funciona
-        response = ai_client.ai_client.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": "ping"}],
-            max_tokens=1
+        # Teste leve de autenticação (lista de modelos, sem custo de tokens)
+        response = requests.get(
+            f"{ai_client.ai_client.base_url}/models",
+            headers={"Authorization": f"Bearer {config.OPENAI_API_KEY}"},
+            timeout=10
         )
-        return "✅ OK (OpenAI Online)"
+        if response.status_code == 200:
+            return "✅ OK (OpenAI Online)"
+        return f"❌ ERRO (HTTP {response.status_code})"
     except Exception as e:
         return f"❌ ERRO ({str(e)})"
 
@@ -1,10 +1,13 @@
 
 import os
+import argparse
+import asyncio
+import functools
 from aiohttp import web
-from app import db, diagnostics, transcription, speaker_id, silero_vad
+from app import db, diagnostics, transcription, speaker_id, silero_vad, integration_test
 from app.core import config, audio_analysis
 from app.api import websocket, endpoints
-from app.core import system_monitor, audio_archiver, drive_sync
+from app.core import system_monitor, audio_archiver, drive_sync, workers, metrics, http_pool, job_tracker, local_stt, entity_prefilter, cestas_produtos_sintomas_doencas
 
 @web.middleware
 async def cors_middleware(request, handler):
@@ -17,53 +20,91 @@ async def cors_middleware(request, handler):
     resp.headers['Access-Control-Allow-Headers'] = '*'
     return resp
 
-def main():
-    try:
-        db.inicializar_db()
-    except Exception as e:
-        print(f"[WARN] Failed to initialize DB: {e}")
-        print("[WARN] Server starting in DEGRADED mode (No DB Connection)")
-    
+def preload_models() -> dict:
+    """
+    Carrega os modelos (bloqueante). No modo --workers roda no supervisor antes do fork,
+    para os workers herdarem os pesos copy-on-write.
+    """
+    models = {"silero_vad": None}
+
+    # Init Speaker ID Model (Always — passive mode on fixed chunks)
+    print("--- Pre-loading Speaker ID Model ---")
+    speaker_id.initialize_model()
+
+    # Init SileroVAD (IA layer)
+    # [DISABLED in SIMPLE_CHUNK_MODE] — IA filter not needed
+    if not config.SIMPLE_CHUNK_MODE:
+        try:
+            models["silero_vad"] = silero_vad.SileroVAD()
+            print("--- SileroVAD Loaded ---")
+        except Exception as e:
+            print(f"[WARN] Failed to load SileroVAD: {e}")
+    else:
+        print("--- SIMPLE_CHUNK_MODE: Skipping SileroVAD ---")
+
+    # [DISABLED in SIMPLE_CHUNK_MODE] — Audio feature extraction not needed
+    if not config.SIMPLE_CHUNK_MODE:
+        audio_analysis.warmup()
+    else:
+        print("--- SIMPLE_CHUNK_MODE: Skipping AudioAnalysis warmup ---")
+
+    # Lookup de cestas (índice mmap, compilado se preciso, e nomes para o match aproximado)
+    # e trie do pré-filtro do LLM
+    cestas_produtos_sintomas_doencas.preload()
+    if config.LLM_PREFILTER_MODE in ("shadow", "enforce"):
+        entity_prefilter.get()
+
+    return models
+
+async def start_host_services():
+    """Singletons de host: no modo --workers rodam uma vez só, no processo de serviços."""
+    print("--- Starting System Monitor ---")
+    asyncio.create_task(system_monitor.start_monitor_task(None))
+
+    # Start Parallel Audio Archiver
+    audio_archiver.archiver.start()
+
+    # Start Drive Sync Loop if enabled
+    if config.DRIVE_SYNC_ENABLED:
+        asyncio.create_task(drive_sync.drive_sync_loop())
+
+    # Integration Test (Background Task)
+    asyncio.create_task(integration_test.start_startup_test())
+
+def build_app(models: dict | None = None, host_services: bool = True) -> web.Application:
+    """
+    models=None: carrega os modelos no startup (single-process).
+    host_services=False: worker do --workers (serviços de host ficam em outro processo).
+    """
     app = web.Application(middlewares=[cors_middleware])
     
     # Startup Events
     async def on_startup(app):
-        print("--- Starting System Monitor ---")
-        asyncio.create_task(system_monitor.start_monitor_task(app))
-        
-        # Init Speaker ID Model (Always — passive mode on fixed chunks)
-        print("--- Pre-loading Speaker ID Model ---")
-        await asyncio.to_thread(speaker_id.initialize_model)
-        
-        # Init SileroVAD (IA layer)
-        # [DISABLED in SIMPLE_CHUNK_MODE] — IA filter not needed
-        if not config.SIMPLE_CHUNK_MODE:
-            try:
-                from app import silero_vad
-                app['silero_vad'] = await asyncio.to_thread(silero_vad.SileroVAD)
-                print("--- SileroVAD Loaded ---")
-            except Exception as e:
-                print(f"[WARN] Failed to load SileroVAD: {e}")
-                app['silero_vad'] = None
+        metrics.watch_default_executor(asyncio.get_running_loop())
+        if host_services:
+            await start_host_services()
         else:
-            app['silero_vad'] = None
-            print("--- SIMPLE_CHUNK_MODE: Skipping SileroVAD ---")
+            asyncio.create_task(system_monitor.start_metrics_reader_task())
+            asyncio.create_task(metrics.snapshot_loop())
 
-        # [DISABLED in SIMPLE_CHUNK_MODE] — Audio feature extraction not needed
-        if not config.SIMPLE_CHUNK_MODE:
-            await asyncio.to_thread(audio_analysis.warmup)
-        else:
-            print("--- SIMPLE_CHUNK_MODE: Skipping AudioAnalysis warmup ---")
-        # Start Parallel Audio Archiver
-        audio_archiver.archiver.start()
-        
-        # Start Drive Sync Loop if enabled
-        if config.DRIVE_SYNC_ENABLED:
-            asyncio.create_task(drive_sync.drive_sync_loop())
+        loaded = models if models is not None else await asyncio.to_thread(preload_models)
+        app['silero_vad'] = loaded["silero_vad"]
+
+        # STT local: o pool de processos é por worker; carrega o modelo antes do primeiro chunk
+        if "local" in config.STT_ROUTER_PROVIDERS or config.STT_LOCAL_FALLBACK:
+            await local_stt.warmup()
             
         print("--- Models Ready ---")
         
     app.on_startup.append(on_startup)
+
+    # Para o polling dos jobs de STT e fecha a sessão HTTP compartilhada dos provedores
+    async def on_cleanup(app):
+        await job_tracker.job_tracker.stop()
+        await http_pool.close()
+        local_stt.shutdown()
+
+    app.on_cleanup.append(on_cleanup)
     
     # WebSocket
     app.router.add_get('/ws', websocket.websocket_handler)
@@ -81,23 +122,56 @@ def main():
     # Test Routes
     app.router.add_post('/api/test/segmentar', endpoints.api_test_segmentar)
     app.router.add_post('/api/test/transcrever', endpoints.api_test_transcrever)
+    app.router.add_get('/api/test/providers', endpoints.api_test_providers)
     app.router.add_post('/api/test/analisar', endpoints.api_test_analisar)
 
     # Export Routes
     app.router.add_get('/api/export/xlsx', endpoints.api_export_xlsx)
     app.router.add_get('/api/data/interacoes', endpoints.api_data_interacoes)
     app.router.add_get('/api/data/balcao/{balcao_id}/metricas', endpoints.api_interacoes_balcao_metricas)
+    app.router.add_get('/api/metrics/pcm_queues', endpoints.api_metrics_pcm_queues)
+    app.router.add_get('/api/metrics/pipelines', endpoints.api_metrics_pipelines)
+    app.router.add_get('/api/metrics/stt_hedge', endpoints.api_metrics_stt_hedge)
+    app.router.add_get('/api/metrics/stt_router', endpoints.api_metrics_stt_router)
+    app.router.add_get('/api/metrics/speech_trim', endpoints.api_metrics_speech_trim)
+    app.router.add_get('/api/metrics/stt_jobs', endpoints.api_metrics_stt_jobs)
+    app.router.add_get('/api/metrics/overlap_stitch', endpoints.api_metrics_overlap_stitch)
+    app.router.add_get('/api/metrics/local_stt', endpoints.api_metrics_local_stt)
+    app.router.add_get('/api/metrics/stt_stream', endpoints.api_metrics_stt_stream)
+    app.router.add_get('/api/metrics/transcript_cache', endpoints.api_metrics_transcript_cache)
+    app.router.add_get('/api/metrics/llm_cache', endpoints.api_metrics_llm_cache)
+    app.router.add_get('/api/metrics/llm', endpoints.api_metrics_llm)
+    app.router.add_get('/api/metrics/llm_prefilter', endpoints.api_metrics_llm_prefilter)
+    app.router.add_get('/api/metrics/cestas_lookup', endpoints.api_metrics_cestas_lookup)
+    app.router.add_get('/metrics', endpoints.api_metrics_prometheus)
 
     # Admin VAD Management
     app.router.add_get('/api/admin/client/{user_codigo}/balcoes', endpoints.api_admin_listar_balcoes)
     app.router.add_put('/api/admin/balcao/{balcao_id}/vad', endpoints.api_admin_update_balcao_vad)
 
+    return app
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=config.WORKERS,
+                        help="Processos servindo a porta via SO_REUSEPORT (1 = single-process)")
+    args = parser.parse_args()
+    n_workers = max(1, args.workers)
+
+    try:
+        db.inicializar_db()
+    except Exception as e:
+        print(f"[WARN] Failed to initialize DB: {e}")
+        print("[WARN] Server starting in DEGRADED mode (No DB Connection)")
+
     print("---------------------------------------")
     print(f"Balto Server 3.0 (Modular) Running on port {config.PORT}")
+    print(f"WORKERS: {n_workers}")
     print(f"SIMPLE_CHUNK_MODE: {config.SIMPLE_CHUNK_MODE}")
     if config.SIMPLE_CHUNK_MODE:
         print(f" -> CHUNK_DURATION: 5.0s")
         print(f" -> CHUNK_OVERLAP: 0.8s")
+    print(f"DECODER_BACKEND: {config.DECODER_BACKEND}")
     print(f"MOCK_MODE: {config.MOCK_MODE}")
     print(f"SAVE_AUDIO_DUMPS: {config.SAVE_AUDIO}")
     print(f"SMART_ROUTING_ENABLE: {config.SMART_ROUTING_ENABLE}")
@@ -110,17 +184,19 @@ def main():
     
     # Diagnostics
     diagnostics.run_all_checks()
-    
-    # Schedule Integration Test (Background Task)
-    import asyncio
-    from app import integration_test
-    
-    async def run_test_bg(app):
-         asyncio.create_task(integration_test.start_startup_test())
 
-    app.on_startup.append(run_test_bg)
+    if n_workers == 1:
+        web.run_app(build_app(), port=config.PORT)
+        return
 
-    web.run_app(app, port=config.PORT)
+    # Multi-process: modelos carregados aqui, workers herdam via fork
+    models = preload_models()
+    print("--- Models Ready (supervisor) ---")
+    workers.serve(
+        n_workers,
+        functools.partial(build_app, models=models, host_services=False),
+        start_host_services,
+    )
 
 if __name__ == "__main__":
     main()
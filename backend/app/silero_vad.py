@@ -47,7 +47,7 @@ class SileroVAD:
         self.model.reset_states()
         print("[SileroVAD] Modelo carregado.")
 
-    def process_full_audio(self, audio_data: bytes):
+    def process_full_audio(self, audio_data: bytes | memoryview):
         """
         Processa um arquivo de áudio inteiro (bytes PCM 16-bit 16kHz Mono)
         e retorna uma lista de timestamps de fala [{'start': int, 'end': int}, ...].
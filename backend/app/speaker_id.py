@@ -60,9 +60,9 @@ def initialize_model():
 # =========================
 # Áudio -> embedding
 # =========================
-def extrair_embedding(audio_pcm16: bytes, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+def extrair_embedding(audio_pcm16: bytes | memoryview, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
     """
-    Entrada: PCM16 mono (idealmente 16kHz), bytes.
+    Entrada: PCM16 mono (idealmente 16kHz), bytes ou memoryview.
     Saída: embedding float32 (np.ndarray).
     """
     if not audio_pcm16:
@@ -269,7 +269,7 @@ class StreamVoiceIdentifier:
         names_str_keys = {str(k): v for k, v in names.items()}
         return profiles_str_keys, names_str_keys
 
-    def add_segment(self, balcao_id: str, speech_chunk: bytes) -> Tuple[Optional[str], float, List[Dict]]:
+    def add_segment(self, balcao_id: str, speech_chunk: bytes | memoryview) -> Tuple[Optional[str], float, List[Dict]]:
         """
         Processa um chunk de fala (VAD True) e tenta identificar.
         Retorna (top_id, top_score, all_scores_data).
@@ -0,0 +1,143 @@
+# backend/app/tools/bench_cestas_index.py
+#
+# Benchmark do lookup de cestas: JSON em memória (json.load) x índice binário mmap.
+#
+# Uso:
+#   python -m app.tools.bench_cestas_index
+#   python -m app.tools.bench_cestas_index --lookups 50000 --workers 4
+#
+# Cada modo roda num processo novo e mede:
+#   - carga (preload: json.load, ou abrir/validar o índice)
+#   - RSS anônimo (privado do processo) e RSS de arquivo (page cache, compartilhado entre workers)
+#   - latência do lookup_cesta (mistura de hits por med_sint_doenca, med_sint_default,
+#     med_default e misses), p50/p95
+# --workers N: estimativa de memória privada total com N workers.
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _rss_kb() -> dict:
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                name, value = line.split(":")
+                out[name] = int(value.split()[0])
+    return out
+
+
+def make_queries(keys: List[str], lookups: int, seed: int) -> list:
+    """Consultas no formato que sai do parse_prompt1 (10% de medicamentos inexistentes)."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(lookups):
+        parts = rng.choice(keys).split("_")
+        if rng.random() < 0.1:
+            queries.append(("naoexiste" + str(rng.randint(0, 999)), "", ""))
+        elif len(parts) == 3 and parts[1] != "default" and parts[2] != "default":
+            queries.append((parts[0], parts[1], parts[2]))
+        elif len(parts) == 3:
+            queries.append((parts[0], parts[1], "doenca desconhecida"))
+        else:
+            queries.append((parts[0], "sintoma desconhecido", ""))
+    return queries
+
+
+def child(queries_path: str):
+    with open(queries_path) as f:
+        queries = json.load(f)
+    from app.core import cestas_produtos_sintomas_doencas as cestas
+
+    before = _rss_kb()
+    t0 = time.perf_counter()
+    cestas.preload()
+    load_s = time.perf_counter() - t0
+    after_load = _rss_kb()
+
+    lat, hits = [], 0
+    for med, sint, doenca in queries:
+        t = time.perf_counter()
+        out = cestas.lookup_cesta(med, sint, doenca)
+        lat.append((time.perf_counter() - t) * 1e6)
+        hits += out is not None
+    after_lookups = _rss_kb()
+
+    print(json.dumps({
+        "load_ms": load_s * 1000,
+        "anon_mb": (after_lookups["RssAnon"] - before["RssAnon"]) / 1024,
+        "file_mb": (after_lookups["RssFile"] - before["RssFile"]) / 1024,
+        "load_anon_mb": (after_load["RssAnon"] - before["RssAnon"]) / 1024,
+        "p50_us": _pct(lat, 0.5),
+        "p95_us": _pct(lat, 0.95),
+        "hit_rate": hits / len(queries),
+    }))
+
+
+def run_mode(index_enabled: bool, queries_path: str) -> dict:
+    env = dict(os.environ, CESTAS_INDEX_ENABLE="true" if index_enabled else "false")
+    env.setdefault("OPENAI_API_KEY", "bench")
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.tools.bench_cestas_index", "--child", queries_path],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    # a última linha é o JSON (o import pode imprimir avisos antes)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lookups", type=int, default=20000)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    # Garante o índice compilado (a compilação não entra na medida de carga)
+    from app.core import cestas_index
+    from app.core.cestas_produtos_sintomas_doencas import LOOKUP_PATH, INDEX_PATH
+    index = cestas_index.open_or_build(LOOKUP_PATH, INDEX_PATH)
+    queries = make_queries(list(index.keys()), args.lookups, args.seed)
+    index.close()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(queries, f)
+    try:
+        results = {name: run_mode(enabled, f.name) for name, enabled in (("json", False), ("mmap", True))}
+    finally:
+        os.unlink(f.name)
+
+    print(f"\n=== lookup_cesta: {args.lookups} consultas, {args.workers} workers ===")
+    print(f"  {'modo':>5} {'carga':>9} {'RSS anon':>9} {'RSS arq':>8} {'p50':>8} {'p95':>8} {'hits':>6} "
+          f"{'privado x' + str(args.workers):>12}")
+    for name, r in results.items():
+        print(f"  {name:>5} {r['load_ms']:>7.1f}ms {r['anon_mb']:>7.1f}MB {r['file_mb']:>6.1f}MB "
+              f"{r['p50_us']:>6.1f}us {r['p95_us']:>6.1f}us {r['hit_rate']:>6.1%} "
+              f"{r['anon_mb'] * args.workers:>10.1f}MB")
+    if results["json"]["hit_rate"] != results["mmap"]["hit_rate"]:
+        print("\n[FALHOU] hit rate diferente entre os modos")
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
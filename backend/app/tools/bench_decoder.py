@@ -0,0 +1,135 @@
+# backend/app/tools/bench_decoder.py
+#
+# Benchmark dos decoders WebM -> PCM (ffmpeg subprocesso vs PyAV in-process).
+#
+# Uso:
+#   python -m app.tools.bench_decoder --file test_audio.webm --streams 20
+#   python -m app.tools.bench_decoder --streams 50 --pace 0.12   # ritmo de tempo real (latência)
+#
+# Mede, por backend:
+#   - CPU por stream (processo + filhos ffmpeg) e CPU por segundo de áudio
+#   - latência de decode: tempo entre um write_webm e o próximo PCM que sai da fila
+#   - tempo até o primeiro PCM (inclui o spawn do ffmpeg)
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+from app.core import audio_decoder
+
+
+@dataclass
+class StreamStats:
+    pcm_bytes: int = 0
+    first_pcm_sec: float | None = None
+    latencies: List[float] = field(default_factory=list)
+
+
+def _cpu_seconds() -> float:
+    self_ru = resource.getrusage(resource.RUSAGE_SELF)
+    child_ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_ru.ru_utime + self_ru.ru_stime + child_ru.ru_utime + child_ru.ru_stime
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+async def run_stream(backend: str, data: bytes, chunk: int, pace: float) -> StreamStats:
+    if backend == "pyav":
+        dec = audio_decoder.PyAVWebMToPCMStream(sample_rate=16000)
+    else:
+        dec = audio_decoder.FFmpegWebMToPCMStream(sample_rate=16000)
+
+    stats = StreamStats()
+    t_start = time.perf_counter()
+    pending_writes: List[float] = []
+
+    await dec.start()
+
+    async def reader():
+        while True:
+            pcm = await dec.read_pcm()
+            if pcm == b"":
+                break
+            now = time.perf_counter()
+            if stats.first_pcm_sec is None:
+                stats.first_pcm_sec = now - t_start
+            if pending_writes:
+                stats.latencies.append(now - pending_writes[0])
+                pending_writes.clear()
+            stats.pcm_bytes += len(pcm)
+
+    reader_task = asyncio.create_task(reader())
+
+    for i in range(0, len(data), chunk):
+        pending_writes.append(time.perf_counter())
+        await dec.write_webm(data[i:i + chunk])
+        await asyncio.sleep(pace)
+
+    if backend == "ffmpeg":
+        # fecha stdin e espera o ffmpeg drenar tudo (e ser "reaped" para o RUSAGE_CHILDREN)
+        dec.proc.stdin.close()
+        await dec._reader_task
+        await dec.proc.wait()
+    await dec.close()
+    await reader_task
+    return stats
+
+
+async def run_backend(backend: str, data: bytes, streams: int, chunk: int, pace: float):
+    cpu0 = _cpu_seconds()
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(run_stream(backend, data, chunk, pace) for _ in range(streams)))
+    wall = time.perf_counter() - t0
+    cpu = _cpu_seconds() - cpu0
+
+    audio_sec = sum(r.pcm_bytes for r in results) / 32000.0
+    latencies = [x for r in results for x in r.latencies]
+    first_pcm = [r.first_pcm_sec for r in results if r.first_pcm_sec is not None]
+
+    print(f"\n=== {backend} ({streams} streams, chunk={chunk}B, pace={pace}s) ===")
+    print(f"  wall={wall:.2f}s  audio_total={audio_sec:.1f}s  cpu_total={cpu:.2f}s")
+    print(f"  cpu/stream={cpu / streams * 1000:.1f}ms  cpu/audio_sec={cpu / max(audio_sec, 1e-9) * 1000:.3f}ms")
+    print(f"  first_pcm p50={_pct(first_pcm, 0.5) * 1000:.1f}ms  p95={_pct(first_pcm, 0.95) * 1000:.1f}ms")
+    print(f"  decode_latency p50={_pct(latencies, 0.5) * 1000:.2f}ms  p95={_pct(latencies, 0.95) * 1000:.2f}ms  "
+          f"p99={_pct(latencies, 0.99) * 1000:.2f}ms  (n={len(latencies)})")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default="test_audio.webm", help="Arquivo WebM/Opus de entrada")
+    ap.add_argument("--streams", type=int, default=10, help="Streams simultâneos por backend")
+    ap.add_argument("--chunk", type=int, default=4096, help="Bytes de WebM por write (igual ao stress_client)")
+    ap.add_argument("--pace", type=float, default=0.0, help="Pausa entre writes (0 = o mais rápido possível)")
+    ap.add_argument("--backend", choices=["both", "ffmpeg", "pyav"], default="both")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Arquivo não encontrado: {args.file}")
+        sys.exit(1)
+    with open(args.file, "rb") as f:
+        data = f.read()
+
+    backends = ["ffmpeg", "pyav"] if args.backend == "both" else [args.backend]
+    if "pyav" in backends and audio_decoder.av is None:
+        print("[SKIP] PyAV não instalado; rodando só ffmpeg.")
+        backends = [b for b in backends if b != "pyav"]
+
+    for backend in backends:
+        asyncio.run(run_backend(backend, data, args.streams, args.chunk, args.pace))
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# backend/app/tools/bench_local_stt.py
+#
+# Benchmark do STT local em CPU (faster-whisper) nos chunks de 5s do SIMPLE_CHUNK_MODE.
+#
+# Uso:
+#   python -m app.tools.bench_local_stt --file test_audio.webm
+#   python -m app.tools.bench_local_stt --model base --threads 1,2,4 --chunks 20
+#   python -m app.tools.bench_local_stt --pool --workers 2 --threads 2   # pool de processos do servidor
+#
+# Mede, por número de threads de inferência:
+#   - RTF (tempo de inferência / duração do chunk), p50/p95
+#   - RTF por core (RTF * threads) = core-segundos por segundo de áudio
+#   - conexões por core: cada conexão gera um chunk de 5s a cada 4.2s (overlap de 0.8s)
+# --pool: vazão do app.core.local_stt (ProcessPoolExecutor) com chunks concorrentes.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from app.core import config, local_stt
+
+SAMPLE_RATE = 16000
+BYTES_PER_SEC = SAMPLE_RATE * 2
+STRIDE_S = 4.2
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _load_pcm(path: str | None, seconds: float) -> bytes:
+    """PCM16 mono 16k do arquivo (via PyAV); sem arquivo, tom sintético (só mede custo, sem texto)."""
+    try:
+        import av
+    except ImportError:
+        av = None
+    if path and os.path.exists(path) and av is not None:
+        out = bytearray()
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        with av.open(path) as c:
+            for frame in c.decode(audio=0):
+                for r in resampler.resample(frame):
+                    out += r.to_ndarray().tobytes()
+        if out:
+            reps = int(seconds * BYTES_PER_SEC // len(out)) + 1
+            return bytes(out * reps)[:int(seconds * BYTES_PER_SEC)]
+    print(f"[WARN] {path} indisponível; usando sinal sintético")
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    x = 3000 * np.sin(2 * np.pi * 180 * t) * np.clip(np.sin(2 * np.pi * 0.5 * t), 0, None)
+    return x.astype(np.int16).tobytes()
+
+
+def bench_threads(chunks: List[bytes], model: str, compute_type: str, threads: int) -> dict:
+    local_stt._init_worker(model, compute_type, threads)
+    # aquecimento (primeira chamada aloca buffers)
+    local_stt._transcribe_in_worker(chunks[0], config.LOCAL_STT_LANGUAGE, config.LOCAL_STT_BEAM_SIZE)
+
+    rtf, words = [], 0
+    chunk_sec = len(chunks[0]) / BYTES_PER_SEC
+    for chunk in chunks:
+        _, w, secs = local_stt._transcribe_in_worker(chunk, config.LOCAL_STT_LANGUAGE, config.LOCAL_STT_BEAM_SIZE)
+        rtf.append(secs / chunk_sec)
+        words += len(w)
+
+    p50 = _pct(rtf, 0.5)
+    per_core = p50 * threads
+    return {
+        "threads": threads,
+        "rtf_p50": p50,
+        "rtf_p95": _pct(rtf, 0.95),
+        "rtf_per_core": per_core,
+        # carga de uma conexão: chunk_sec de áudio a cada STRIDE_S
+        "conns_per_core": 1.0 / (per_core * chunk_sec / STRIDE_S) if per_core else 0.0,
+        "words": words,
+    }
+
+
+async def bench_pool(chunks: List[bytes], concurrency: int) -> dict:
+    await local_stt.warmup()
+    sem = asyncio.Semaphore(concurrency)
+    lat, errors = [], 0
+
+    async def one(chunk):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await local_stt.transcribe(chunk)
+            except Exception as e:
+                errors += 1
+                print(f"  erro: {e}")
+                return
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(c) for c in chunks])
+    wall = time.perf_counter() - t0
+    audio = sum(len(c) for c in chunks) / BYTES_PER_SEC
+    local_stt.shutdown()
+    return {"wall": wall, "audio": audio, "lat_p50": _pct(lat, 0.5), "lat_p95": _pct(lat, 0.95), "errors": errors}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default="test_audio.webm")
+    ap.add_argument("--chunks", type=int, default=10)
+    ap.add_argument("--chunk-sec", type=float, default=5.0)
+    ap.add_argument("--model", default=config.LOCAL_STT_MODEL)
+    ap.add_argument("--compute-type", default=config.LOCAL_STT_COMPUTE_TYPE)
+    ap.add_argument("--threads", default="1,2,4", help="threads de inferência a testar")
+    ap.add_argument("--pool", action="store_true", help="mede também o pool de processos do servidor")
+    ap.add_argument("--workers", type=int, default=config.LOCAL_STT_WORKERS)
+    args = ap.parse_args()
+
+    if not local_stt.available():
+        print("[SKIP] faster-whisper não instalado (pip install faster-whisper).")
+        return
+
+    chunk_bytes = int(args.chunk_sec * BYTES_PER_SEC)
+    stride_bytes = int(STRIDE_S * BYTES_PER_SEC)
+    pcm = _load_pcm(args.file, STRIDE_S * args.chunks + args.chunk_sec)
+    chunks = [pcm[i:i + chunk_bytes] for i in range(0, len(pcm) - chunk_bytes + 1, stride_bytes)][:args.chunks]
+
+    print(f"\n=== {args.model} ({args.compute_type}), {len(chunks)} chunks de {args.chunk_sec:.1f}s, "
+          f"{os.cpu_count()} CPUs ===")
+    print(f"  {'threads':>7} {'RTF p50':>8} {'RTF p95':>8} {'RTF/core':>9} {'conexões/core':>14} {'palavras':>9}")
+    for threads in [int(t) for t in args.threads.split(",") if t.strip()]:
+        try:
+            r = bench_threads(chunks, args.model, args.compute_type, threads)
+        except Exception as e:
+            # ex.: sem rede para baixar os pesos; --model aceita um diretório CTranslate2 local
+            print(f"[SKIP] modelo '{args.model}' indisponível: {e}")
+            return
+        print(f"  {r['threads']:>7} {r['rtf_p50']:>8.3f} {r['rtf_p95']:>8.3f} {r['rtf_per_core']:>9.3f} "
+              f"{r['conns_per_core']:>14.2f} {r['words']:>9}")
+
+    if args.pool:
+        config.LOCAL_STT_MODEL = args.model
+        config.LOCAL_STT_COMPUTE_TYPE = args.compute_type
+        config.LOCAL_STT_WORKERS = args.workers
+        config.LOCAL_STT_MAX_QUEUE_PER_WORKER = max(config.LOCAL_STT_MAX_QUEUE_PER_WORKER, len(chunks))
+        r = asyncio.run(bench_pool(chunks, concurrency=args.workers * 2))
+        print(f"\n=== pool: {args.workers} worker(s) x {config.LOCAL_STT_THREADS} threads ===")
+        print(f"  {r['audio']:.0f}s de áudio em {r['wall']:.1f}s -> {r['audio'] / r['wall']:.1f}x tempo real  "
+              f"latência p50={r['lat_p50'] * 1000:.0f}ms p95={r['lat_p95'] * 1000:.0f}ms  erros={r['errors']}")
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
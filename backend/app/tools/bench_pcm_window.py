@@ -0,0 +1,101 @@
+# backend/app/tools/bench_pcm_window.py
+#
+# Microbenchmark do fatiamento de chunks do SIMPLE_CHUNK_MODE.
+#
+# Uso:
+#   python -m app.tools.bench_pcm_window
+#   python -m app.tools.bench_pcm_window --hours 2 --block 3200
+#
+# Compara, por hora de áudio (PCM16 mono 16k):
+#   - bytearray: bytes(pcm_acc[:chunk]) + del pcm_acc[:stride]  (fluxo antigo)
+#   - window:    PCMWindowBuffer -> memoryviews read-only
+# Reporta alocações, bytes copiados (além da escrita de entrada) e tempo de CPU.
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.core.pcm_window import PCMWindowBuffer
+
+BYTES_PER_SEC = 16000 * 2
+
+
+def bench_bytearray(total_bytes: int, block: bytes, chunk_bytes: int, stride_bytes: int) -> dict:
+    pcm_acc = bytearray()
+    allocations = 0
+    copied = 0
+    chunks = 0
+    sink = 0
+
+    t0 = time.process_time()
+    fed = 0
+    while fed < total_bytes:
+        pcm_acc.extend(block)
+        fed += len(block)
+        while len(pcm_acc) >= chunk_bytes:
+            fixed_chunk = bytes(pcm_acc[:chunk_bytes])
+            # slice do bytearray + bytes(): 2 alocações, 2 cópias da janela
+            allocations += 2
+            copied += 2 * chunk_bytes
+            del pcm_acc[:stride_bytes]
+            # del no início desloca o restante do buffer
+            copied += len(pcm_acc)
+            sink += len(fixed_chunk)
+            chunks += 1
+    cpu = time.process_time() - t0
+    return {"chunks": chunks, "allocations": allocations, "copied": copied, "cpu": cpu, "sink": sink}
+
+
+def bench_window(total_bytes: int, block: bytes, chunk_bytes: int, stride_bytes: int, capacity: int | None) -> dict:
+    win = PCMWindowBuffer(chunk_bytes, stride_bytes, capacity_bytes=capacity)
+    chunks = 0
+    sink = 0
+
+    t0 = time.process_time()
+    fed = 0
+    while fed < total_bytes:
+        win.write(block)
+        fed += len(block)
+        for view in win.windows():
+            sink += len(view)
+            chunks += 1
+    cpu = time.process_time() - t0
+    return {"chunks": chunks, "allocations": win.allocations, "copied": win.bytes_copied, "cpu": cpu, "sink": sink}
+
+
+def _report(name: str, r: dict, hours: float):
+    print(f"\n=== {name} ===")
+    print(f"  chunks={r['chunks']}  allocations/h={r['allocations'] / hours:.0f}  "
+          f"copied/h={r['copied'] / hours / 1e6:.1f}MB  cpu/h={r['cpu'] / hours * 1000:.1f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=1.0, help="Horas de áudio simuladas")
+    ap.add_argument("--block", type=int, default=3200, help="Bytes por leitura do decoder (PCM_QUEUE_BLOCK_BYTES)")
+    ap.add_argument("--chunk", type=float, default=5.0, help="Duração do chunk (s)")
+    ap.add_argument("--overlap", type=float, default=0.8, help="Overlap entre chunks (s)")
+    ap.add_argument("--capacity", type=int, default=None, help="Bytes por bloco do PCMWindowBuffer (padrão: 6 janelas)")
+    args = ap.parse_args()
+
+    chunk_bytes = int(args.chunk * BYTES_PER_SEC)
+    stride_bytes = chunk_bytes - int(args.overlap * BYTES_PER_SEC)
+    total_bytes = int(args.hours * 3600 * BYTES_PER_SEC)
+    block = b"\x01\x00" * (args.block // 2)
+
+    print(f"audio={args.hours:.1f}h  chunk={chunk_bytes}B  stride={stride_bytes}B  block={args.block}B")
+
+    old = bench_bytearray(total_bytes, block, chunk_bytes, stride_bytes)
+    new = bench_window(total_bytes, block, chunk_bytes, stride_bytes, args.capacity)
+    assert old["sink"] == new["sink"], "as duas estratégias devem entregar o mesmo áudio"
+
+    _report("bytearray + bytes() + del", old, args.hours)
+    _report("PCMWindowBuffer (memoryview)", new, args.hours)
+
+    if new["copied"]:
+        print(f"\n  cópias: {old['copied'] / new['copied']:.1f}x menos bytes copiados")
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# backend/app/tools/bench_upload_encoder.py
+#
+# Benchmark da codificação de upload para STT (pcm / wav / flac / opus).
+#
+# Uso:
+#   python -m app.tools.bench_upload_encoder --file test_audio.webm
+#   python -m app.tools.bench_upload_encoder --uplink-kbps 512 --opus-bitrate 16000
+#   python -m app.tools.bench_upload_encoder --live deepgram --chunks 10   # chama o provedor de verdade
+#
+# Mede, por formato, em chunks de 5s (SIMPLE_CHUNK_MODE):
+#   - custo de encode (ms por chunk, p50/p95) e CPU por segundo de áudio
+#   - bytes por chunk, kbps efetivo e razão vs PCM cru
+#   - latência estimada até o provedor: encode + upload no --uplink-kbps (+ --stt-ms de processamento)
+#   - --live PROVIDER: latência real de ponta a ponta do transcrever_<provider> com cada formato
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from app.core import config, upload_encoder
+
+SAMPLE_RATE = 16000
+BYTES_PER_SEC = SAMPLE_RATE * 2
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _load_pcm(path: str | None, seconds: float) -> bytes:
+    """PCM16 mono 16k do arquivo (via PyAV) ou sinal sintético com envelope de fala."""
+    if path and os.path.exists(path) and upload_encoder.av is not None:
+        av = upload_encoder.av
+        out = bytearray()
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        with av.open(path) as c:
+            for frame in c.decode(audio=0):
+                for r in resampler.resample(frame):
+                    out += r.to_ndarray().tobytes()
+        if out:
+            reps = int(seconds * BYTES_PER_SEC // len(out)) + 1
+            return bytes(out * reps)[:int(seconds * BYTES_PER_SEC)]
+        print(f"[WARN] {path} sem áudio; usando sinal sintético")
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = np.sin(2 * np.pi * 140 * t) + 0.5 * np.sin(2 * np.pi * 280 * t) + 0.25 * np.sin(2 * np.pi * 560 * t)
+    envelope = np.clip(np.sin(2 * np.pi * 0.7 * t), 0, None) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    x = 4000 * voiced * envelope + rng.normal(0, 80, t.size)
+    return x.astype(np.int16).tobytes()
+
+
+def bench_encoding(chunks: List[bytes], encoding: str, uplink_kbps: float, stt_ms: float) -> dict:
+    wall, sizes = [], []
+    cpu0 = time.process_time()
+    for chunk in chunks:
+        t0 = time.perf_counter()
+        data = upload_encoder.encode_sync(chunk, encoding)
+        wall.append(time.perf_counter() - t0)
+        sizes.append(len(data))
+    cpu = time.process_time() - cpu0
+
+    chunk_sec = len(chunks[0]) / BYTES_PER_SEC
+    mean_bytes = sum(sizes) / len(sizes)
+    upload_ms = mean_bytes * 8 / (uplink_kbps * 1000) * 1000
+    return {
+        "encoding": encoding,
+        "enc_p50_ms": _pct(wall, 0.5) * 1000,
+        "enc_p95_ms": _pct(wall, 0.95) * 1000,
+        "cpu_per_audio_sec_ms": cpu / (chunk_sec * len(chunks)) * 1000,
+        "bytes": mean_bytes,
+        "kbps": mean_bytes * 8 / chunk_sec / 1000,
+        "ratio": mean_bytes / len(chunks[0]),
+        "upload_ms": upload_ms,
+        "est_total_ms": _pct(wall, 0.5) * 1000 + upload_ms + stt_ms,
+    }
+
+
+def _check_flac_lossless(chunk: bytes) -> bool:
+    import io
+    av = upload_encoder.av
+    data = upload_encoder.encode_sync(chunk, "flac")
+    out = bytearray()
+    with av.open(io.BytesIO(data)) as c:
+        for frame in c.decode(audio=0):
+            out += frame.to_ndarray().astype(np.int16).tobytes()
+    return bytes(out[:len(chunk)]) == chunk
+
+
+async def _live(provider: str, chunks: List[bytes], encodings: List[str]):
+    from app import transcription  # registra os provedores
+    from app.core import http_pool, stt_providers
+
+    fn = stt_providers.get(provider).transcribe
+    print(f"\n=== live: {provider} ({len(chunks)} chunks por formato) ===")
+    for encoding in encodings:
+        config.STT_UPLOAD_ENCODINGS[provider] = encoding
+        lat, errors = [], 0
+        for chunk in chunks:
+            t0 = time.perf_counter()
+            try:
+                await fn(chunk)
+            except Exception as e:
+                errors += 1
+                print(f"  [{encoding}] erro: {e}")
+                continue
+            lat.append(time.perf_counter() - t0)
+        print(f"  {encoding:<5} p50={_pct(lat, 0.5) * 1000:.0f}ms  p95={_pct(lat, 0.95) * 1000:.0f}ms  erros={errors}")
+    await http_pool.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default="test_audio.webm")
+    ap.add_argument("--chunks", type=int, default=50, help="chunks de 5s por formato")
+    ap.add_argument("--chunk-sec", type=float, default=5.0)
+    ap.add_argument("--encodings", default="pcm,wav,flac,opus")
+    ap.add_argument("--opus-bitrate", type=int, default=config.STT_UPLOAD_OPUS_BITRATE)
+    ap.add_argument("--uplink-kbps", type=float, default=1000.0, help="uplink da loja (kbps)")
+    ap.add_argument("--stt-ms", type=float, default=0.0, help="processamento do provedor somado à estimativa")
+    ap.add_argument("--live", default=None, help="deepgram | assemblyai | gladia | elevenlabs")
+    args = ap.parse_args()
+
+    config.STT_UPLOAD_OPUS_BITRATE = args.opus_bitrate
+    encodings = [e.strip() for e in args.encodings.split(",") if e.strip()]
+    if upload_encoder.av is None:
+        print("[SKIP] PyAV não instalado; só pcm/wav.")
+        encodings = [e for e in encodings if e in ("pcm", "wav")]
+
+    chunk_bytes = int(args.chunk_sec * BYTES_PER_SEC)
+    pcm = _load_pcm(args.file, args.chunk_sec * args.chunks)
+    chunks = [pcm[i:i + chunk_bytes] for i in range(0, len(pcm) - chunk_bytes + 1, chunk_bytes)]
+
+    print(f"\n=== {len(chunks)} chunks de {args.chunk_sec:.1f}s, uplink {args.uplink_kbps:.0f} kbps, "
+          f"opus {args.opus_bitrate // 1000} kbps ===")
+    print(f"  {'fmt':<5} {'enc p50':>8} {'enc p95':>8} {'cpu/s áudio':>12} {'bytes':>9} {'kbps':>7} "
+          f"{'razão':>6} {'upload':>8} {'total est.':>10}")
+    for encoding in encodings:
+        r = bench_encoding(chunks, encoding, args.uplink_kbps, args.stt_ms)
+        print(f"  {encoding:<5} {r['enc_p50_ms']:>6.2f}ms {r['enc_p95_ms']:>6.2f}ms {r['cpu_per_audio_sec_ms']:>10.2f}ms "
+              f"{r['bytes']:>9.0f} {r['kbps']:>7.1f} {r['ratio']:>6.2f} {r['upload_ms']:>6.0f}ms {r['est_total_ms']:>8.0f}ms")
+
+    if "flac" in encodings:
+        print(f"\n  flac sem perdas: {'OK' if _check_flac_lossless(chunks[0]) else 'FALHOU'}")
+
+    if args.live:
+        asyncio.run(_live(args.live, chunks[:10], encodings))
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# backend/app/tools/build_cestas_index.py
+#
+# Compila o cestas_produtos_sintomas_doencas.json no índice binário mmap (app/core/cestas_index.py).
+#
+# Uso:
+#   python -m app.tools.build_cestas_index              # JSON/índice padrão (CESTAS_INDEX_PATH)
+#   python -m app.tools.build_cestas_index --check      # só confere se o índice está em dia (exit 1 se não)
+#
+# O servidor recompila sozinho no startup quando o JSON muda (precisa de escrita no diretório).
+# Com o código somente leitura, compile antes e aponte CESTAS_INDEX_PATH para o arquivo.
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from app.core import cestas_index
+from app.core.cestas_produtos_sintomas_doencas import LOOKUP_PATH, INDEX_PATH
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--source", default=str(LOOKUP_PATH))
+    ap.add_argument("--dest", default=str(INDEX_PATH))
+    ap.add_argument("--check", action="store_true")
+    args = ap.parse_args()
+
+    if args.check:
+        try:
+            index = cestas_index.CestasIndex(args.dest)
+        except (OSError, ValueError) as e:
+            print(f"[FALHOU] {args.dest}: {e}")
+            raise SystemExit(1)
+        ok = index.source_sha1 == cestas_index.source_sha1(args.source)
+        print(f"{'OK' if ok else 'DESATUALIZADO'}: {args.dest} ({index.count} chaves)")
+        raise SystemExit(0 if ok else 1)
+
+    t0 = time.perf_counter()
+    count = cestas_index.build(args.source, args.dest)
+    print(f"{count} chaves: {os.path.getsize(args.source) / 1e6:.2f} MB -> "
+          f"{os.path.getsize(args.dest) / 1e6:.2f} MB em {(time.perf_counter() - t0) * 1000:.0f}ms ({args.dest})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# backend/app/tools/sim_hedge.py
+#
+# Simulação do hedging de STT com provedores falsos (sem rede, sem cota).
+#
+# Uso:
+#   python -m app.tools.sim_hedge
+#   python -m app.tools.sim_hedge --primary lognormal:1.2,0.8 --hedge lognormal:0.6,0.3 --requests 500
+#   python -m app.tools.sim_hedge --percentile 0.95 --primary-fail 0.05 --concurrency 20
+#
+# Roda o mesmo número de chamadas sem hedging (só o primário) e com stt_hedge.run_hedged,
+# e compara latência (p50/p90/p99), taxa de hedge, vencedores e chamadas canceladas.
+# A escala de tempo pode ser comprimida com --speed (ex.: 10 = 10x mais rápido).
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from app.core import config, stt_hedge
+from app.core.stt_router import STTProviderError
+from app.core.stt_stub import StubProvider
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _scaled(spec: str, speed: float) -> str:
+    # divide os tempos (fixed/uniform: todos; lognormal: só a mediana)
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")]
+    if kind == "lognormal":
+        values[0] /= speed
+    else:
+        values = [v / speed for v in values]
+    return f"{kind}:{','.join(str(v) for v in values)}"
+
+
+def _usable(text: str) -> bool:
+    return True  # falhas do stub levantam STTProviderError
+
+
+async def _run(n: int, concurrency: int, call) -> List[float]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await call()
+            except STTProviderError:
+                pass
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return latencies
+
+
+def _report(name: str, latencies: List[float], speed: float):
+    lat = [v * speed for v in latencies]
+    print(f"  {name:<10} p50={_pct(lat, 0.5):.2f}s  p90={_pct(lat, 0.9):.2f}s  "
+          f"p99={_pct(lat, 0.99):.2f}s  max={max(lat):.2f}s")
+
+
+async def amain(args):
+    speed = args.speed
+    primary_spec = _scaled(args.primary, speed)
+    hedge_spec = _scaled(args.hedge, speed)
+
+    config.STT_HEDGE_PERCENTILE = args.percentile
+    config.STT_HEDGE_MIN_DEADLINE_S = args.min_deadline / speed
+    config.STT_HEDGE_DEFAULT_DEADLINE_S = args.default_deadline / speed
+    config.STT_HEDGE_MIN_SAMPLES = args.min_samples
+
+    # Baseline: só o primário
+    base = StubProvider(primary_spec, fail_rate=args.primary_fail)
+    base_lat = await _run(args.requests, args.concurrency, lambda: base.transcribe(b""))
+
+    primary = StubProvider(primary_spec, fail_rate=args.primary_fail)
+    hedge = StubProvider(hedge_spec, fail_rate=args.hedge_fail)
+    hedged_lat = await _run(
+        args.requests, args.concurrency,
+        lambda: stt_hedge.run_hedged("primary", lambda: primary.transcribe(b""),
+                                     "hedge", lambda: hedge.transcribe(b""), _usable),
+    )
+
+    stats = stt_hedge.snapshot()
+    print(f"\n=== {args.requests} chamadas, concorrência {args.concurrency}, percentil {args.percentile} ===")
+    print(f"  primário: {args.primary} (falha {args.primary_fail:.0%})  hedge: {args.hedge} (falha {args.hedge_fail:.0%})")
+    _report("sem hedge", base_lat, speed)
+    _report("com hedge", hedged_lat, speed)
+    print(f"  hedge_rate={stats['hedge_rate']:.1%}  primary_won={stats['primary_won']}  "
+          f"hedge_won={stats['hedge_won']}  both_failed={stats['both_failed']}")
+    print(f"  chamadas extras={hedge.calls} ({hedge.calls / args.requests:.1%})  "
+          f"canceladas: primário={primary.cancelled} hedge={hedge.cancelled}")
+    print(f"  latência economizada (estimada)={stats['saved_seconds'] * speed:.1f}s  "
+          f"deadline final do primário={stt_hedge.deadline_for('primary') * speed:.2f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--primary", default="lognormal:1.0,0.7", help="latência do primário (ver stt_stub)")
+    ap.add_argument("--hedge", default="lognormal:0.7,0.3", help="latência do provedor de hedge")
+    ap.add_argument("--primary-fail", type=float, default=0.0)
+    ap.add_argument("--hedge-fail", type=float, default=0.0)
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=10)
+    ap.add_argument("--percentile", type=float, default=config.STT_HEDGE_PERCENTILE)
+    ap.add_argument("--min-deadline", type=float, default=config.STT_HEDGE_MIN_DEADLINE_S)
+    ap.add_argument("--default-deadline", type=float, default=config.STT_HEDGE_DEFAULT_DEADLINE_S)
+    ap.add_argument("--min-samples", type=int, default=config.STT_HEDGE_MIN_SAMPLES)
+    ap.add_argument("--speed", type=float, default=10.0, help="compressão do tempo da simulação")
+    asyncio.run(amain(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# backend/app/tools/stt_stream_standin.py
+#
+# Stand-in local do STT em streaming (subconjunto do protocolo do Deepgram live) que
+# devolve transcrições de um roteiro, para testar app/core/stt_stream.py sem rede/cota.
+#
+# Uso:
+#   python -m app.tools.stt_stream_standin                          # replay: servidor + sessão, confere os finais
+#   python -m app.tools.stt_stream_standin --drop-every 7 --speed 4 # derruba a conexão a cada 7s de áudio
+#   python -m app.tools.stt_stream_standin --drop-every 7 --resend-final  # repete o último final ao reconectar
+#   python -m app.tools.stt_stream_standin --script roteiro.txt --file test_audio.webm
+#   python -m app.tools.stt_stream_standin serve --port 8766        # só o servidor
+#       (no servidor: STT_STREAMING_ENABLE=true STT_STREAM_URL=ws://127.0.0.1:8766/v1/listen)
+#
+# Roteiro: uma fala por linha (.txt) ou JSON [{"text": ..., "duration": s}, ...]. As falas
+# ficam em sequência na linha do tempo do áudio (0.6s de pausa entre elas); o stand-in manda
+# parciais enquanto a fala "acontece" e o final quando o áudio recebido passa do fim dela.
+# Numa conexão nova, assume que o cliente reenviou o áudio desde o último final (como a sessão faz).
+#
+# O replay mede: finais recebidos x roteiro (faltando/duplicados), reconexões e atraso
+# entre empurrar o fim da fala e receber o final.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+import numpy as np
+from aiohttp import web, WSMsgType
+
+from app.core import config, http_pool, stt_stream
+
+SAMPLE_RATE = 16000
+BYTES_PER_SEC = SAMPLE_RATE * 2
+GAP_S = 0.6
+
+DEFAULT_SCRIPT = [
+    "bom dia tudo bem",
+    "eu queria um remédio para dor de cabeça",
+    "pode ser dipirona ou paracetamol",
+    "ela também está com um pouco de febre desde ontem",
+    "tem xarope para tosse seca",
+    "quanto fica tudo",
+    "pode passar no cartão",
+]
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def load_script(path: str | None) -> list[dict]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".json"):
+                items = json.load(f)
+            else:
+                items = [{"text": line.strip()} for line in f if line.strip()]
+    else:
+        items = [{"text": t} for t in DEFAULT_SCRIPT]
+
+    timeline, t = [], 0.5
+    for item in items:
+        duration = float(item.get("duration") or 0.3 + 0.35 * len(item["text"].split()))
+        timeline.append({"text": item["text"], "start": t, "end": t + duration})
+        t += duration + GAP_S
+    return timeline
+
+
+def _results(utt: dict, conn_start: float, upto: float | None, is_final: bool) -> str:
+    words = utt["text"].split()
+    step = (utt["end"] - utt["start"]) / len(words)
+    out = []
+    for i, w in enumerate(words):
+        ws = utt["start"] + i * step
+        if upto is not None and ws + step > upto:
+            break
+        out.append({"word": w, "punctuated_word": w, "start": round(ws - conn_start, 3),
+                    "end": round(ws + step - conn_start, 3), "confidence": 0.99})
+    start = max(0.0, utt["start"] - conn_start)
+    end = (upto if upto is not None else utt["end"]) - conn_start
+    return json.dumps({
+        "type": "Results",
+        "start": round(start, 3),
+        "duration": round(max(0.0, end - start), 3),
+        "is_final": is_final,
+        "speech_final": is_final,
+        "channel": {"alternatives": [{"transcript": " ".join(w["word"] for w in out), "words": out}]},
+    })
+
+
+class StandIn:
+    def __init__(self, script: list[dict], drop_every_s: float = 0.0, latency_ms: float = 50.0,
+                 resend_final: bool = False):
+        self.script = script
+        self.drop_every_s = drop_every_s
+        self.resend_final = resend_final
+        self.latency_s = latency_ms / 1000.0
+        self.final_until = 0.0   # fim do último final emitido (tempo do stream do cliente)
+        self.next_idx = 0
+        self.connections = 0
+
+    async def handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        conn_start = self.final_until
+        received = 0
+        last_partial = 0.0
+
+        if self.resend_final and self.connections > 1 and self.next_idx:
+            # provedor que repete na conexão nova o último final já entregue: o cliente ignora
+            await ws.send_str(_results(self.script[self.next_idx - 1], conn_start, None, True))
+
+        async def flush(now_abs: float):
+            while self.next_idx < len(self.script) and self.script[self.next_idx]["end"] <= now_abs:
+                utt = self.script[self.next_idx]
+                await asyncio.sleep(self.latency_s)
+                await ws.send_str(_results(utt, conn_start, None, True))
+                self.final_until = utt["end"]
+                self.next_idx += 1
+
+        async for msg in ws:
+            if msg.type == WSMsgType.BINARY:
+                received += len(msg.data)
+                now_abs = conn_start + received / BYTES_PER_SEC
+                await flush(now_abs)
+                if self.next_idx < len(self.script):
+                    utt = self.script[self.next_idx]
+                    if utt["start"] < now_abs and now_abs - last_partial >= 0.5:
+                        last_partial = now_abs
+                        await ws.send_str(_results(utt, conn_start, now_abs, False))
+                if self.drop_every_s and received >= self.drop_every_s * BYTES_PER_SEC:
+                    await ws.close()
+                    break
+            elif msg.type == WSMsgType.TEXT:
+                if json.loads(msg.data).get("type") == "CloseStream":
+                    await flush(conn_start + received / BYTES_PER_SEC)
+                    await ws.close()
+                    break
+        return ws
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/listen", self.handler)
+        return app
+
+
+def _pcm(path: str | None, seconds: float) -> bytes:
+    """Áudio para empurrar: arquivo (PyAV) repetido ou ruído baixo (o stand-in não escuta o áudio)."""
+    if path and os.path.exists(path):
+        try:
+            import av
+            out = bytearray()
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+            with av.open(path) as c:
+                for frame in c.decode(audio=0):
+                    for r in resampler.resample(frame):
+                        out += r.to_ndarray().tobytes()
+            if out:
+                reps = int(seconds * BYTES_PER_SEC // len(out)) + 1
+                return bytes(out * reps)[:int(seconds * BYTES_PER_SEC) & ~1]
+        except ImportError:
+            pass
+    rng = np.random.default_rng(0)
+    return rng.normal(0, 200, int(seconds * SAMPLE_RATE)).astype(np.int16).tobytes()
+
+
+async def replay(args):
+    script = load_script(args.script)
+    standin = StandIn(script, args.drop_every, args.latency_ms, args.resend_final)
+    runner = web.AppRunner(standin.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+
+    config.STT_STREAM_RECONNECT_MIN_S = 0.05
+    finals, partials = [], 0
+    pushed_at: list[tuple[float, float]] = []
+    lags = []
+
+    def on_result(res: stt_stream.StreamResult):
+        nonlocal partials
+        if not res.is_final:
+            partials += 1
+            return
+        finals.append(res)
+        for pos_s, t in pushed_at:
+            if pos_s >= res.end - 1e-3:
+                lags.append(time.monotonic() - t)
+                break
+
+    session = stt_stream.StreamingSTTSession(
+        "standin", None, on_result, url=stt_stream.stream_url(f"ws://127.0.0.1:{args.port}/v1/listen")
+    )
+    session.start()
+
+    total_s = script[-1]["end"] + 1.0
+    pcm = _pcm(args.file, total_s)
+    frame = int(0.02 * BYTES_PER_SEC)   # 20ms, como o decoder entrega
+    t0 = time.monotonic()
+    for i in range(0, len(pcm), frame):
+        session.push(pcm[i:i + frame])
+        pushed_at.append(((i + frame) / BYTES_PER_SEC, time.monotonic()))
+        target = t0 + (i + frame) / BYTES_PER_SEC / args.speed
+        delay = target - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await session.close(drain_s=5.0)
+
+    await runner.cleanup()
+    await http_pool.close()
+
+    got = [r.text for r in finals]
+    want = [u["text"] for u in script]
+    missing = [t for t in want if t not in got]
+    dupes = len(got) - len(set(got))
+
+    print(f"\n=== replay: {len(script)} falas, {total_s:.1f}s de áudio a {args.speed:g}x, "
+          f"queda a cada {args.drop_every or '-'}s ===")
+    for r in finals:
+        print(f"  [{r.start:6.2f}-{r.end:6.2f}] {r.text}")
+    print(f"\n  finais: {len(got)}/{len(want)}  faltando: {len(missing)}  duplicados: {dupes}  parciais: {partials}")
+    print(f"  conexões: {standin.connections}  reconexões: {session.reconnects}  "
+          f"finais repetidos ignorados: {stt_stream.STREAM_STATS['duplicates_skipped']}  "
+          f"áudio reenviado: {stt_stream.STREAM_STATS['audio_replayed_s']:.1f}s")
+    print(f"  atraso do final (tempo de parede): p50={_pct(lags, 0.5) * 1000:.0f}ms p95={_pct(lags, 0.95) * 1000:.0f}ms")
+    ok = got == want
+    print("\nOK" if ok else "\nFALHOU")
+    return ok
+
+
+async def serve(args):
+    standin = StandIn(load_script(args.script), args.drop_every, args.latency_ms, args.resend_final)
+    runner = web.AppRunner(standin.app())
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", args.port).start()
+    print(f"Stand-in em ws://0.0.0.0:{args.port}/v1/listen ({len(standin.script)} falas)")
+    await asyncio.Event().wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("mode", nargs="?", default="replay", choices=("replay", "serve"))
+    ap.add_argument("--script", default=None, help=".txt (uma fala por linha) ou .json")
+    ap.add_argument("--file", default=None, help="áudio empurrado no replay (padrão: ruído)")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--speed", type=float, default=4.0, help="velocidade do replay (1 = tempo real)")
+    ap.add_argument("--drop-every", type=float, default=0.0, help="derruba a conexão a cada N s de áudio")
+    ap.add_argument("--resend-final", action="store_true", help="repete o último final a cada reconexão")
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="atraso do stand-in antes de cada final")
+    args = ap.parse_args()
+
+    if args.mode == "serve":
+        asyncio.run(serve(args))
+    else:
+        raise SystemExit(0 if asyncio.run(replay(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
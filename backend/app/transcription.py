@@ -1,16 +1,35 @@
 import os
-import io
 import time
+import atexit
+import fcntl
+import hashlib
+import asyncio
+import threading
+import contextlib
 import numpy as np
-import requests
-import wave
-import re
+import aiohttp
 import json
-from app.core import config
+from app.core import config, metrics, http_pool, stt_hedge, stt_stub, stt_router, speech_trim, upload_encoder, local_stt, stt_providers, transcript_cache
+from app.core.stt_router import STTProviderError
+from app.core.exclusion_filter import ExclusionFilter
+from app.core.job_tracker import job_tracker
 from elevenlabs.client import ElevenLabs
 
 # --- Gerenciamento de Chaves ElevenLabs ---
 class ElevenLabsKeyManager:
+    """
+    Pool de chaves ElevenLabs.
+
+    - lease(): escolhe a chave com menos requisições em andamento (empate: mais cota
+      restante), então chunks em paralelo se espalham entre as chaves
+    - chaves que passaram do limite mensal só são usadas se todas passaram
+    - uso persistido em config.ELEVENLABS_USAGE_FILE (zera na virada do mês). O arquivo
+      guarda só um hash da chave; a gravação soma os deltas sob flock, então os
+      processos do --workers não sobrescrevem o uso uns dos outros. register_usage só
+      mexe na memória; a gravação roda numa thread (asyncio.to_thread) a cada
+      ELEVENLABS_USAGE_FLUSH_S
+    - thread-safe (chamado do loop e de threads)
+    """
     def __init__(self):
         # Lê chaves separadas por vírgula 'KEY1,KEY2,KEY3'
         keys_str = os.environ.get("ELEVENLABS_API_KEYS", "")
@@ -21,44 +40,185 @@ class ElevenLabsKeyManager:
         else:
             self.keys = [k.strip() for k in keys_str.split(',') if k.strip()]
         
-        self.current_key_index = 0
-        # Mapa de uso: {key: seconds_used}
+        self.limit_seconds = config.ELEVENLABS_KEY_LIMIT_MIN * 60
+        self.usage_path = config.ELEVENLABS_USAGE_FILE
+
+        self._lock = threading.Lock()
+        self._ids = {k: hashlib.sha256(k.encode()).hexdigest()[:16] for k in self.keys}
+        # Mapa de uso: {key: seconds_used} (total do mês, incluindo o que ainda não foi gravado)
         self.usage_map = {k: 0.0 for k in self.keys}
-        self.limit_seconds = 120 * 60 # 120 minutos
+        self._pending = {k: 0.0 for k in self.keys}
+        self._in_flight = {k: 0 for k in self.keys}
+        self._clients = {}
+        self._period = self._current_period()
+        self._last_flush = 0.0
+        self._flush_task = None
 
+        self._load()
+        atexit.register(self.flush)
         print(f"[ElevenLabs] Carregadas {len(self.keys)} chaves.")
 
-    def get_client(self):
+    @staticmethod
+    def _current_period() -> str:
+        return time.strftime("%Y-%m")
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.usage_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[ElevenLabs] Arquivo de uso ilegível ({e}); começando do zero.")
+            return {}
+        if data.get("period") != self._current_period():
+            return {}
+        return data.get("usage", {})
+
+    def _load(self):
+        if not self.usage_path:
+            return
+        stored = self._read_file()
+        for k in self.keys:
+            self.usage_map[k] = float(stored.get(self._ids[k], 0.0))
+
+    def _roll_period(self):
+        # Virada do mês: cota renovada
+        period = self._current_period()
+        if period != self._period:
+            print(f"[ElevenLabs] Novo período {period}: zerando uso das chaves.")
+            self._period = period
+            for k in self.keys:
+                self.usage_map[k] = 0.0
+                self._pending[k] = 0.0
+
+    def remaining(self, key: str) -> float:
+        return self.limit_seconds - self.usage_map.get(key, 0.0)
+
+    def _pick(self) -> str:
+        available = [k for k in self.keys if self.remaining(k) > 0] or self.keys
+        return min(available, key=lambda k: (self._in_flight[k], -self.remaining(k)))
+
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        `with key_manager.lease() as key:` reserva a chave durante a requisição.
+        key é None se não houver chaves configuradas.
+        """
+        if not self.keys:
+            yield None
+            return
+        with self._lock:
+            self._roll_period()
+            key = self._pick()
+            self._in_flight[key] += 1
+        try:
+            yield key
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+
+    def get_key(self):
+        """Chave menos carregada no momento (sem reservar)."""
         if not self.keys:
             return None
-        
-        # Pega chave atual
-        current_key = self.keys[self.current_key_index]
-        
-        # Verifica se estourou o limite (apenas check local simples)
-        if self.usage_map[current_key] >= self.limit_seconds:
-             # Tenta rodar para a próxima se tiver mais de uma
-             if len(self.keys) > 1:
-                 print(f"[ElevenLabs] Chave {current_key[:5]}... excedeu limite ({self.usage_map[current_key]/60:.1f} min). Trocando.")
-                 self.rotate_key()
-                 current_key = self.keys[self.current_key_index]
-        
-        return ElevenLabs(api_key=current_key)
+        with self._lock:
+            self._roll_period()
+            return self._pick()
 
-    def rotate_key(self):
-        if not self.keys: return
-        self.current_key_index = (self.current_key_index + 1) % len(self.keys)
-        new_key = self.keys[self.current_key_index]
-        print(f"[ElevenLabs] Rotacionado para chave: {new_key[:5]}...")
+    def get_client(self, key: str | None = None):
+        """Cliente SDK reaproveitado por chave (diagnóstico)."""
+        key = key or self.get_key()
+        if not key:
+            return None
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = ElevenLabs(api_key=key)
+                self._clients[key] = client
+            return client
 
-    def register_usage(self, seconds: float):
+    def register_usage(self, seconds: float, key: str | None = None):
         if not self.keys: return
-        current_key = self.keys[self.current_key_index]
-        self.usage_map[current_key] += seconds
+        with self._lock:
+            self._roll_period()
+            key = key or self._pick()
+            before = self.usage_map[key]
+            self.usage_map[key] += seconds
+            self._pending[key] += seconds
+            if before < self.limit_seconds <= self.usage_map[key]:
+                print(f"[ElevenLabs] Chave {key[:5]}... excedeu limite ({self.usage_map[key]/60:.1f} min).")
+            due = time.monotonic() - self._last_flush >= config.ELEVENLABS_USAGE_FLUSH_S
+        if due:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """No event loop o flush (flock + arquivo) vai para uma thread; só um por vez."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = loop.create_task(asyncio.to_thread(self.flush))
+
+    def flush(self):
+        """Grava o uso pendente (soma ao que está no arquivo, sob flock)."""
+        if not self.usage_path or not self.keys:
+            return
+        with self._lock:
+            pending = {k: v for k, v in self._pending.items() if v}
+            for k in pending:
+                self._pending[k] = 0.0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with open(f"{self.usage_path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                stored = self._read_file()
+                for k, seconds in pending.items():
+                    stored[self._ids[k]] = stored.get(self._ids[k], 0.0) + seconds
+                tmp = f"{self.usage_path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"period": self._current_period(), "usage": stored}, f)
+                os.replace(tmp, self.usage_path)
+            # Uso dos outros processos entra no mapa local
+            with self._lock:
+                for k in self.keys:
+                    self.usage_map[k] = stored.get(self._ids[k], 0.0) + self._pending[k]
+        except Exception as e:
+            print(f"[ElevenLabs] Erro ao gravar uso das chaves: {e}")
+            with self._lock:
+                for k, seconds in pending.items():
+                    self._pending[k] += seconds
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "key": f"{k[:5]}...",
+                    "in_flight": self._in_flight[k],
+                    "used_min": round(self.usage_map[k] / 60, 2),
+                    "remaining_min": round(self.remaining(k) / 60, 2),
+                }
+                for k in self.keys
+            ]
 
 # Instância Global do Manager
 key_manager = ElevenLabsKeyManager()
 
+def _collect_key_stats():
+    out = []
+    for st in key_manager.stats():
+        labels = {"key": st["key"]}
+        out.append(("balto_elevenlabs_key_in_flight", "gauge", "Requisições em andamento por chave ElevenLabs", labels, st["in_flight"]))
+        out.append(("balto_elevenlabs_key_used_minutes", "gauge", "Minutos usados no mês por chave ElevenLabs", labels, st["used_min"]))
+    return out
+
+metrics.register_collector(_collect_key_stats)
+
 # --- Configuração AssemblyAI (Substituto do Soniox) ---
 # --- Configuração AssemblyAI (Substituto do Soniox) ---
 ASSEMBLYAI_API_KEY = os.environ.get("ASSEMBLYAI_API_KEY")
@@ -69,6 +229,14 @@ DEEPGRAM_API_KEY = os.environ.get("DEEPGRAM_API_KEY")
 # --- Configuração Gladia ---
 GLADIA_API_KEY = os.environ.get("GLADIA_API_KEY")
 
+# --- Pool HTTP (limites/timeouts/retries por provedor) ---
+http_pool.configure_provider("elevenlabs", timeout_s=30.0)
+http_pool.configure_provider("assemblyai", timeout_s=60.0)
+http_pool.configure_provider("deepgram", timeout_s=30.0)
+http_pool.configure_provider("gladia", timeout_s=60.0)
+
+ELEVENLABS_STT_URL = "https://api.elevenlabs.io/v1/speech-to-text"
+
 # --- Smart Routing Config ---
 SMART_ROUTING_ENABLE = os.environ.get("SMART_ROUTING_ENABLE", "1") == "1"
 SMART_ROUTING_SNR_THRESHOLD = float(os.environ.get("SMART_ROUTING_SNR_THRESHOLD", "15.0"))
@@ -76,89 +244,59 @@ SMART_ROUTING_MIN_DURATION = float(os.environ.get("SMART_ROUTING_MIN_DURATION",
 
 EXCLUSIONS_PATH = os.path.join(os.path.dirname(__file__), "dados", "exclusions.json")
 
-def carregar_exclusoes():
-    """Carrega a blacklist e padrões regex do arquivo JSON."""
-    if not os.path.exists(EXCLUSIONS_PATH):
-        return {"exact_match_exclusions": [], "regex_patterns": []}
-    try:
-        with open(EXCLUSIONS_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Erro ao carregar exclusões: {e}")
-        return {"exact_match_exclusions": [], "regex_patterns": []}
+# Instância Global do filtro (compilado uma vez; recarrega quando o mtime do arquivo muda)
+exclusion_filter = ExclusionFilter(EXCLUSIONS_PATH)
 
 def limpar_texto_transcricao(texto: str) -> str:
     """
     Sanitiza a transcrição:
     1. Remove conteúdo entre parênteses (ex: som de fundo).
-    2. Aplica blacklist de termos exatos.
+    2. Aplica os padrões regex e a blacklist de termos exatos de exclusions.json.
     """
-    if not texto:
-        return ""
-    
-    exclusoes = carregar_exclusoes()
-    
-    # 1. Remover conteúdo entre parênteses (ex: anotações do ElevenLabs)
-    texto_limpo = re.sub(r'\(.*?\)', '', texto)
-    
-    # 2. Aplicar outros padrões Regex do JSON
-    for pattern in exclusoes.get("regex_patterns", []):
-        if pattern != r'\(.*?\)':  # Já limpamos acima
-            try:
-                texto_limpo = re.sub(pattern, '', texto_limpo)
-            except Exception as e:
-                print(f"Erro no padrão regex {pattern}: {e}")
-    
-    # Normalizar espaços
-    texto_limpo = " ".join(texto_limpo.split()).strip()
-    
-    # 3. Check Exact Match Blacklist (case insensitive opcional, aqui exato)
-    # Se sobrar apenas um termo da blacklist, limpamos tudo.
-    if texto_limpo in exclusoes.get("exact_match_exclusions", []):
-        return ""
-    
-    return texto_limpo
+    return exclusion_filter.clean(texto)
 
-def transcrever_deepgram(audio_bytes: bytes) -> str:
-    """Modelo Rápido (Deepgram)."""
+async def transcrever_deepgram(audio_bytes: bytes | memoryview) -> str:
+    """Modelo Rápido (Deepgram). Falhas levantam STTProviderError."""
     if not DEEPGRAM_API_KEY:
-        print("[Deepgram] API Key não configurada.")
-        return ""
+        raise STTProviderError("deepgram", "API Key não configurada")
     
     url = "https://api.deepgram.com/v1/listen?model=nova-2&language=pt&smart_format=true"
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "audio/wav"
-    }
     
     try:
-        # Wrap PCM in WAV
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(16000)
-            wf.writeframes(audio_bytes)
-        
-        response = requests.post(url, headers=headers, data=wav_buffer.getvalue(), timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            # Deepgram return format: results.channels[0].alternatives[0].transcript
-            return data.get('results', {}).get('channels', [{}])[0].get('alternatives', [{}])[0].get('transcript', "")
-        else:
-            print(f"[Deepgram] Erro: {response.status_code} - {response.text}")
-            return f"[ERROR {response.status_code}]"
-            
+        # WAV/FLAC/Opus conforme STT_UPLOAD_ENCODINGS
+        enc = await upload_encoder.encode("deepgram", audio_bytes)
+        headers = {
+            "Authorization": f"Token {DEEPGRAM_API_KEY}",
+            "Content-Type": enc.content_type
+        }
+        status, body = await http_pool.request("deepgram", "POST", url, headers=headers, data=enc.data)
     except Exception as e:
-        print(f"[Deepgram] Exceção: {e}")
-        return f"[EXCEPTION] {e}"
+        raise STTProviderError("deepgram", f"exceção: {e}") from e
+        
+    if status != 200:
+        print(f"[Deepgram] Erro: {status} - {body[:500].decode('utf-8', 'replace')}")
+        raise STTProviderError("deepgram", f"HTTP {status}", status)
+    
+    data = json.loads(body)
+    # Deepgram return format: results.channels[0].alternatives[0].transcript
+    return data.get('results', {}).get('channels', [{}])[0].get('alternatives', [{}])[0].get('transcript', "")
 
-def transcrever_gladia(audio_bytes: bytes) -> str:
-    """Modelo Gladia (Multilingual)."""
+def _parse_gladia_result(status: int, body: bytes):
+    """Poll do result_url da Gladia -> (pronto, texto)."""
+    if status >= 400:
+        raise STTProviderError("gladia", f"polling HTTP {status}", status)
+    res = json.loads(body)
+    result_status = res.get("status")
+    if result_status == "done":
+        return True, res.get("result", {}).get("transcription", {}).get("full_transcript", "")
+    if result_status == "error":
+        raise STTProviderError("gladia", "erro no processamento")
+    return False, None
+
+async def transcrever_gladia(audio_bytes: bytes | memoryview) -> str:
+    """Modelo Gladia (Multilingual). Falhas levantam STTProviderError."""
     if not GLADIA_API_KEY:
-        print("[Gladia] API Key não configurada.")
-        return ""
+        raise STTProviderError("gladia", "API Key não configurada")
 
     # Usando V2 API (Upload -> Transcribe) ou Audio Intelligence?
     # Vamos tentar o endpoint de upload direto se existir, ou multipart
@@ -169,32 +307,25 @@ def transcrever_gladia(audio_bytes: bytes) -> str:
     }
     
     try:
-        # Wrap in WAV
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(16000)
-            wf.writeframes(audio_bytes)
-        wav_buffer.name = "audio.wav"
+        # WAV/FLAC/Opus conforme STT_UPLOAD_ENCODINGS
+        enc = await upload_encoder.encode("gladia", audio_bytes)
         
         # 1. Upload
-        files = {
-            'audio': ('audio.wav', wav_buffer.getvalue(), 'audio/wav')
-        }
+        def upload_form():
+            form = aiohttp.FormData()
+            form.add_field('audio', enc.data, filename=enc.filename, content_type=enc.content_type)
+            return form
         
-        upload_response = requests.post(
-            "https://api.gladia.io/v2/upload/",
-            headers=headers,
-            files=files,
-            timeout=60
+        status, body = await http_pool.request(
+            "gladia", "POST", "https://api.gladia.io/v2/upload/",
+            headers=headers, data_factory=upload_form
         )
         
-        if upload_response.status_code != 200:
-            print(f"[Gladia] Erro Upload: {upload_response.text}")
-            return f"[ERROR Upload {upload_response.status_code}]"
+        if status != 200:
+            print(f"[Gladia] Erro Upload: {body[:500].decode('utf-8', 'replace')}")
+            raise STTProviderError("gladia", f"upload HTTP {status}", status)
             
-        audio_url = upload_response.json().get("audio_url")
+        audio_url = json.loads(body).get("audio_url")
         
         # 2. Transcription
         data = {
@@ -202,36 +333,26 @@ def transcrever_gladia(audio_bytes: bytes) -> str:
             "language": "pt"
         }
         
-        transcribe_response = requests.post(
-            "https://api.gladia.io/v2/transcription/",
-            headers=headers,
-            json=data,
-            timeout=60
+        status, body = await http_pool.request(
+            "gladia", "POST", "https://api.gladia.io/v2/transcription/",
+            headers=headers, json=data
         )
         
-        if transcribe_response.status_code == 201:
-            result_url = transcribe_response.json().get("result_url")
-            # Polling needed
-            
-            while True:
-                res = requests.get(result_url, headers=headers)
-                status = res.json().get("status")
-                
-                if status == "done":
-                    return res.json().get("result", {}).get("transcription", {}).get("full_transcript", "")
-                elif status == "error":
-                    return f"[ERROR Gladia Processing]"
-                
-                time.sleep(1)
-        else:
-             print(f"[Gladia] Erro Transcribe: {transcribe_response.text}")
-             return f"[ERROR Transcribe {transcribe_response.status_code}]"
+        if status != 201:
+            print(f"[Gladia] Erro Transcribe: {body[:500].decode('utf-8', 'replace')}")
+            raise STTProviderError("gladia", f"transcribe HTTP {status}", status)
+        
+        result_url = json.loads(body).get("result_url")
+        # 3. Resultado: polling compartilhado com backoff (app/core/job_tracker.py)
+        return await job_tracker.track("gladia", result_url, headers, _parse_gladia_result)
 
+    except STTProviderError:
+        raise
     except Exception as e:
-         print(f"[Gladia] Exceção: {e}")
-         return f"[EXCEPTION] {e}"
+        print(f"[Gladia] Exceção: {e}")
+        raise STTProviderError("gladia", f"exceção: {e}") from e
 
-def calcular_snr(audio_bytes: bytes) -> float:
+def calcular_snr(audio_bytes: bytes | memoryview) -> float:
     """
     Calcula a relação Sinal-Ruído (SNR) aproximada.
     Retorna valor em dB.
@@ -264,111 +385,114 @@ def calcular_snr(audio_bytes: bytes) -> float:
         print(f"Erro SNR: {e}")
         return 0.0
 
-def transcrever_elevenlabs(audio_bytes: bytes) -> tuple:
+async def transcrever_elevenlabs(audio_bytes: bytes | memoryview) -> tuple:
     """Modelo Caro e Robusto (ElevenLabs Scribe).
     Retorna (texto, words_data) onde words_data é lista de dicts com timestamps.
+    Falhas levantam STTProviderError.
     """
-    client = key_manager.get_client()
-    if not client: return "[Erro: Nenhuma chave ElevenLabs configurada]", []
-    
     # Duração em segundos para tracking
     duration = len(audio_bytes) / 32000.0 # 16k * 2 bytes
     
-    try:
-        # Enviar PCM direto (sem WAV wrapper) — menor latência
-        pcm_buffer = io.BytesIO(audio_bytes)
-        pcm_buffer.name = "audio.pcm"
+    with key_manager.lease() as api_key:
+        if not api_key:
+            raise STTProviderError("elevenlabs", "nenhuma chave configurada")
         
-        result = client.speech_to_text.convert(
-            file=pcm_buffer,
-            model_id="scribe_v1",
-            language_code="pt",
-            timestamps_granularity="word",
-            file_format="pcm_s16le_16",
-        )
+        # Padrão: PCM direto (sem WAV wrapper); FLAC/Opus conforme STT_UPLOAD_ENCODINGS
+        enc = await upload_encoder.encode("elevenlabs", audio_bytes)
         
-        # Se sucesso, registra uso
-        key_manager.register_usage(duration)
+        def stt_form():
+            form = aiohttp.FormData()
+            form.add_field("model_id", "scribe_v1")
+            form.add_field("language_code", "pt")
+            form.add_field("timestamps_granularity", "word")
+            form.add_field("file_format", "pcm_s16le_16" if enc.encoding == "pcm" else "other")
+            form.add_field("file", enc.data, filename=enc.filename, content_type=enc.content_type)
+            return form
         
-        # Extrair word timestamps
-        words_data = []
-        if hasattr(result, 'words') and result.words:
-            words_data = [
-                {"text": w.text, "start": w.start, "end": w.end, "type": str(w.type)}
-                for w in result.words
-                if w.start is not None and w.end is not None
-            ]
+        try:
+            status, body = await http_pool.request(
+                "elevenlabs", "POST", ELEVENLABS_STT_URL,
+                headers={"xi-api-key": api_key}, data_factory=stt_form
+            )
+        except Exception as e:
+            print(f"Erro ElevenLabs: {e}")
+            raise STTProviderError("elevenlabs", f"exceção: {e}") from e
+        if status != 200:
+            print(f"Erro ElevenLabs: HTTP {status}: {body[:500].decode('utf-8', 'replace')}")
+            raise STTProviderError("elevenlabs", f"HTTP {status}", status)
+        result = json.loads(body)
         
-        return result.text, words_data
-    except Exception as e:
-        print(f"Erro ElevenLabs: {e}")
-        return f"[ERROR] {e}", []
+        # Se sucesso, registra uso
+        key_manager.register_usage(duration, api_key)
+    
+    # Extrair word timestamps
+    words_data = [
+        {"text": w.get("text"), "start": w.get("start"), "end": w.get("end"), "type": str(w.get("type"))}
+        for w in (result.get("words") or [])
+        if w.get("start") is not None and w.get("end") is not None
+    ]
+    
+    return result.get("text") or "", words_data
+
+def _parse_assemblyai_result(status: int, body: bytes):
+    """Poll do /v2/transcript/{id} da AssemblyAI -> (pronto, texto)."""
+    if status >= 400:
+        raise STTProviderError("assemblyai", f"polling HTTP {status}", status)
+    poll = json.loads(body)
+    if poll["status"] == "completed":
+        return True, poll["text"] or ""
+    if poll["status"] == "error":
+        print(f"[AssemblyAI] Erro no processamento: {poll.get('error')}")
+        raise STTProviderError("assemblyai", f"erro no processamento: {poll.get('error')}")
+    return False, None
 
-def transcrever_assemblyai(audio_bytes: bytes) -> str:
+async def transcrever_assemblyai(audio_bytes: bytes | memoryview) -> str:
     """
     Modelo Econômico (AssemblyAI).
-    Substitui o antigo Soniox.
+    Substitui o antigo Soniox. Falhas levantam STTProviderError.
     """
     if not ASSEMBLYAI_API_KEY:
-        print("[AssemblyAI] API Key não configurada.")
-        return ""
+        raise STTProviderError("assemblyai", "API Key não configurada")
     
     headers = {
         "authorization": ASSEMBLYAI_API_KEY
     }
     
     try:
-        # Wrap PCM in WAV container
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(16000)
-            wf.writeframes(audio_bytes)
-        
-        wav_data = wav_buffer.getvalue()
+        # WAV/FLAC/Opus conforme STT_UPLOAD_ENCODINGS
+        enc = await upload_encoder.encode("assemblyai", audio_bytes)
 
         # 1. Upload
-        upload_response = requests.post(
-            f"{config.ASSEMBLYAI_BASE_URL}/v2/upload",
-            headers=headers,
-            data=wav_data
+        status, body = await http_pool.request(
+            "assemblyai", "POST", f"{config.ASSEMBLYAI_BASE_URL}/v2/upload",
+            headers=headers, data=enc.data
         )
-        upload_response.raise_for_status()
-        upload_url = upload_response.json()["upload_url"]
+        if status >= 400:
+            raise STTProviderError("assemblyai", f"upload HTTP {status}", status)
+        upload_url = json.loads(body)["upload_url"]
         
         # 2. Transcribe
         json_data = {
             "audio_url": upload_url,
             "language_code": "pt" # Forçar português
         }
-        transcript_response = requests.post(
-            f"{config.ASSEMBLYAI_BASE_URL}/v2/transcript",
-            headers=headers,
-            json=json_data
+        status, body = await http_pool.request(
+            "assemblyai", "POST", f"{config.ASSEMBLYAI_BASE_URL}/v2/transcript",
+            headers=headers, json=json_data
         )
-        transcript_response.raise_for_status()
-        transcript_id = transcript_response.json()["id"]
+        if status >= 400:
+            raise STTProviderError("assemblyai", f"transcript HTTP {status}", status)
+        transcript_id = json.loads(body)["id"]
         
-        # 3. Polling
+        # 3. Resultado: polling compartilhado com backoff (app/core/job_tracker.py)
         polling_endpoint = f"{config.ASSEMBLYAI_BASE_URL}/v2/transcript/{transcript_id}"
-        
-        while True:
-            poll_response = requests.get(polling_endpoint, headers=headers)
-            poll_response.raise_for_status()
-            status = poll_response.json()["status"]
-            
-            if status == "completed":
-                return poll_response.json()["text"] or ""
-            elif status == "error":
-                print(f"[AssemblyAI] Erro no processamento: {poll_response.json().get('error')}")
-                return ""
-            
-            time.sleep(0.5) # Polling rápido
+        return await job_tracker.track("assemblyai", polling_endpoint, headers, _parse_assemblyai_result)
             
+    except STTProviderError:
+        raise
     except Exception as e:
         print(f"[AssemblyAI] Erro de requisição: {e}")
-        return ""
+        raise STTProviderError("assemblyai", f"exceção: {e}") from e
 
 def _extrair_speech_ranges(words_data: list, chunk_duration: float) -> dict | None:
     """
@@ -420,14 +544,141 @@ def _extrair_speech_ranges(words_data: list, chunk_duration: float) -> dict | No
     }
 
 
-def transcrever_inteligente(audio_bytes: bytes) -> dict:
+_stub_provider = None
+
+def _get_stub_provider() -> stt_stub.StubProvider:
+    global _stub_provider
+    if _stub_provider is None:
+        _stub_provider = stt_stub.StubProvider(config.STT_STUB_LATENCY, config.STT_STUB_FAIL_RATE)
+    return _stub_provider
+
+# Registro dos provedores (custo = estimativa por chunk)
+stt_providers.register(stt_providers.FunctionProvider(
+    "elevenlabs", transcrever_elevenlabs, 0.05, lambda: bool(key_manager.keys), word_timestamps=True,
+    model="scribe_v1"))
+stt_providers.register(stt_providers.FunctionProvider(
+    "assemblyai", transcrever_assemblyai, 0.005, lambda: bool(ASSEMBLYAI_API_KEY), model="best"))
+stt_providers.register(stt_providers.FunctionProvider(
+    "deepgram", transcrever_deepgram, 0.01, lambda: bool(DEEPGRAM_API_KEY), streaming=True,
+    model="nova-2"))
+stt_providers.register(stt_providers.FunctionProvider(
+    "gladia", transcrever_gladia, 0.01, lambda: bool(GLADIA_API_KEY), model="v2"))
+stt_providers.register(stt_providers.FunctionProvider(
+    "stub", lambda chunk: _get_stub_provider().transcribe(chunk), 0.0))
+stt_providers.register(stt_providers.FunctionProvider(
+    "local", local_stt.transcribe, 0.0, local_stt.available, word_timestamps=True,
+    batch_fn=local_stt.transcribe_batch,
+    model=f"{config.LOCAL_STT_MODEL}-{config.LOCAL_STT_COMPUTE_TYPE}-beam{config.LOCAL_STT_BEAM_SIZE}"))
+
+# Estimativa de custo por chunk
+CUSTO_POR_PROVEDOR = stt_providers.costs()
+
+# Instância Global do roteador (saúde/breakers/orçamento por provedor)
+router = stt_router.STTRouter(CUSTO_POR_PROVEDOR)
+
+def _provedor_configurado(nome: str) -> bool:
+    try:
+        return stt_providers.get(nome).configured()
+    except KeyError:
+        return False
+
+async def chamar_provedor(nome: str, audio_bytes: bytes | memoryview,
+                          cache_hits: set | None = None) -> stt_providers.Transcript:
+    """
+    Chama o provedor pelo nome, passando antes pelo cache de transcrições (se ligado).
+    Retorna Transcript(texto, words); words vazio se o provedor não tem timestamps.
+    Hit do cache: o nome entra em cache_hits (não é cobrado nem conta no roteador).
+    Falha: STTProviderError.
+    """
+    provider = stt_providers.get(nome)
+    cache = transcript_cache.transcript_cache
+    if not cache.enabled_for(nome):
+        return await _chamar_provedor(provider, audio_bytes)
+    (texto, words), hit = await cache.get_or_compute(
+        nome, provider.model, audio_bytes, lambda: _chamar_provedor(provider, audio_bytes)
+    )
+    if hit and cache_hits is not None:
+        cache_hits.add(nome)
+    # cópia: a pipeline ajusta os timestamps das words (corte, costura) e o cache é compartilhado
+    return stt_providers.Transcript(texto, [dict(w) for w in words])
+
+async def _chamar_provedor(provider: stt_providers.STTProvider,
+                           audio_bytes: bytes | memoryview) -> stt_providers.Transcript:
+    """Chamada real ao provedor, registrada no roteador."""
+    nome = provider.name
+    if not router.dispatched(nome):
+        # outro pipeline já está fazendo a chamada de teste: não conta como falha do provedor
+        raise STTProviderError(nome, "circuit breaker em half-open (teste em andamento)")
+    t0 = time.perf_counter()
+    try:
+        with metrics.STT_SECONDS.labels(nome).time():
+            resultado = await provider.transcribe(audio_bytes)
+    except asyncio.CancelledError:
+        # perdedor do hedge: não conta como erro
+        router.record_cancel(nome)
+        raise
+    except Exception as e:
+        erro = e if isinstance(e, STTProviderError) else STTProviderError(nome, f"resposta inválida: {e}")
+        router.record(nome, time.perf_counter() - t0, ok=False, error=erro.reason)
+        raise erro from e
+    router.record(nome, time.perf_counter() - t0, ok=True)
+    return resultado
+
+async def resultado_streaming(texto: str, words_data: list, audio_bytes: bytes | memoryview,
+                              balcao_id: str | None = None) -> dict:
     """
-    Smart Routing: Decide qual modelo usar baseado na qualidade do áudio.
+    Monta o mesmo dict do transcrever_inteligente para um resultado final do STT em
+    streaming (app/core/stt_stream.py): limpeza, SNR do trecho, speech_ranges e custo
+    (Deepgram, proporcional à duração, cobrado no orçamento do balcão).
     """
-    snr = calcular_snr(audio_bytes)
     duration_sec = len(audio_bytes) / 32000.0
+    snr = await asyncio.to_thread(calcular_snr, audio_bytes) if audio_bytes else 0.0
+    custo = CUSTO_POR_PROVEDOR["deepgram"] * duration_sec / 5.0
+    router.budget.charge(balcao_id, custo)
+    return {
+        "texto": limpar_texto_transcricao(texto),
+        "modelo": "deepgram_stream",
+        "custo": custo,
+        "snr": snr,
+        "speech_ranges": _extrair_speech_ranges(words_data, duration_sec),
+        "words": words_data,
+        "erro": None
+    }
+
+async def transcrever_inteligente(audio_bytes: bytes | memoryview, balcao_id: str | None = None,
+                                  provedores: list[str] | None = None) -> dict:
+    """
+    Smart Routing: a regra SNR/duração define o provedor preferido; o roteador troca
+    por outro elegível se o preferido estiver com breaker aberto, doente ou fora do
+    orçamento do balcão, e faz failover se a chamada falhar.
+    Se todos falharem, tenta o STT local (STT_LOCAL_FALLBACK) e, por fim, devolve texto
+    vazio e o motivo em "erro".
+    provedores: restringe os candidatos (o primeiro vira o preferido), ex.: ["local"].
+    """
+    # SNR é numpy puro (sort de ~80k amostras): fora do loop
+    snr = await asyncio.to_thread(calcular_snr, audio_bytes)
+    duration_sec = len(audio_bytes) / 32000.0
+    
+    # Corte de silêncio: envia só as regiões de fala (timestamps voltam para o original no fim)
+    corte = None
+    envio = audio_bytes
+    if config.STT_TRIM_ENABLE:
+        corte = await asyncio.to_thread(speech_trim.trim, audio_bytes)
+        if corte.is_silent:
+            return {
+                "texto": "",
+                "modelo": "trim_silence",
+                "custo": 0.0,
+                "snr": snr,
+                "speech_ranges": {"ranges": [], "speech_pct": 0.0, "silence_pct": 100.0, "word_count": 0},
+                "words": [],
+                "erro": None
+            }
+        envio = corte.audio
+    envio_sec = len(envio) / 32000.0
     
     # Lógica de Decisão (Controlada por Env):
+    # A regra usa a duração ORIGINAL do chunk; envio_sec (após o corte) só entra no custo.
     
     usar_economico = False
     words_data = []
@@ -441,23 +692,88 @@ def transcrever_inteligente(audio_bytes: bytes) -> dict:
         # Se desligado, usa sempre ElevenLabs (Robustez)
         usar_economico = False
     
-    if usar_economico:
-        texto = transcrever_assemblyai(audio_bytes)
-        modelo = "assemblyai"
-        custo = 0.005 # Estimativa AssemblyAI
-        # AssemblyAI não retorna word timestamps no nosso flow
-        words_data = []
+    preferido = "assemblyai" if usar_economico else "elevenlabs"
+    
+    if provedores:
+        preferido = provedores[0]
+    
+    # Elegíveis: configurados e, no caso do AssemblyAI, com duração suficiente
+    candidatos = [
+        p for p in (provedores or config.STT_ROUTER_PROVIDERS)
+        if p in CUSTO_POR_PROVEDOR and _provedor_configurado(p)
+        and (p != "assemblyai" or duration_sec >= SMART_ROUTING_MIN_DURATION)
+    ]
+    if preferido not in candidatos:
+        preferido = candidatos[0] if candidatos else "elevenlabs"
+        candidatos = candidatos or [preferido]
+    
+    ranking = router.rank(candidatos, preferido, balcao_id)
+    disparados, falhas, cache_hits = [], set(), set()
+    texto, modelo, erro = "", ranking[0][0], None
+    
+    async def chamar(nome: str):
+        disparados.append(nome)
+        try:
+            return await chamar_provedor(nome, envio, cache_hits)
+        except STTProviderError:
+            falhas.add(nome)
+            raise
+    
+    fila = [p for p, _ in ranking]
+    tentativas = 0
+    while fila and tentativas < config.STT_ROUTER_MAX_ATTEMPTS:
+        nome = fila.pop(0)
+        if nome in falhas:
+            continue  # hedge que já falhou nesta chamada
+        tentativas += 1
+        reservas = [p for p in fila if p not in falhas]
+        try:
+            if config.STT_HEDGE_ENABLE and reservas:
+                # Hedging: se o primário passar do deadline, dispara o segundo e fica com o primeiro que responder
+                hedge = config.STT_HEDGE_PROVIDER if config.STT_HEDGE_PROVIDER in reservas else reservas[0]
+                _, modelo, (texto, words_data) = await stt_hedge.run_hedged(
+                    nome, lambda: chamar(nome), hedge, lambda: chamar(hedge), lambda _r: True,
+                )
+            else:
+                texto, words_data = await chamar(nome)
+                modelo = nome
+            erro = None
+            break
+        except STTProviderError as e:
+            erro = e
+            print(f"[STT-ROUTER] {e}; tentando o próximo provedor")
+    
+    # Queda dos provedores de nuvem: STT local como último recurso
+    if (erro is not None and config.STT_LOCAL_FALLBACK and "local" not in disparados
+            and local_stt.available()):
+        try:
+            texto, words_data = await chamar("local")
+            modelo, erro = "local", None
+        except STTProviderError as e:
+            print(f"[STT-ROUTER] fallback local falhou: {e}")
+    
+    # Cobrado o que foi disparado e não falhou (o perdedor cancelado pode ter sido processado).
+    # As estimativas são por chunk inteiro; os provedores cobram por segundo enviado.
+    # Hit do cache de transcrições não chamou o provedor: custo zero.
+    custo = sum(CUSTO_POR_PROVEDOR.get(p, 0.0) for p in set(disparados) - falhas - cache_hits)
+    custo *= envio_sec / duration_sec if duration_sec else 1.0
+    router.budget.charge(balcao_id, custo)
+    
+    if erro is not None:
+        motivo = "failed"
+        modelo = disparados[-1] if disparados else modelo
     else:
-        texto, words_data = transcrever_elevenlabs(audio_bytes)
-        modelo = "elevenlabs"
-        custo = 0.05 # Estimativa ElevenLabs
+        motivo = ranking[0][1] if modelo == ranking[0][0] else "failover"
+    router.log_decision(balcao_id, preferido, modelo, motivo, snr, duration_sec, disparados)
         
     # Aplicar limpeza de texto antes de retornar
     texto_final = limpar_texto_transcricao(texto)
     if texto and not texto_final:
         print(f"[Transcription] Texto original '{texto}' foi totalmente limpo/descartado.")
 
-    # Extrair speech_ranges dos word timestamps
+    # Extrair speech_ranges dos word timestamps (na linha do tempo do chunk original)
+    if corte is not None:
+        words_data = corte.map_words(words_data)
     speech_ranges = _extrair_speech_ranges(words_data, duration_sec)
 
     return {
@@ -465,5 +781,7 @@ def transcrever_inteligente(audio_bytes: bytes) -> dict:
         "modelo": modelo,
         "custo": custo,
         "snr": snr,
-        "speech_ranges": speech_ranges
+        "speech_ranges": speech_ranges,
+        "words": words_data,
+        "erro": str(erro) if erro is not None else None
     }
\ No newline at end of file
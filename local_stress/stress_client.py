@@ -224,6 +224,15 @@ async def generate_report():
                             all_metrics.extend(interactions)
             except Exception as e:
                 print(f"Failed to fetch {b['id']}: {e}")
+
+        # Transcript cache (TRANSCRIPT_CACHE_ENABLE on the server): hits didn't spend provider quota
+        cache = {}
+        try:
+            async with session.get(f"{SERVER_URL}/api/metrics/transcript_cache") as resp:
+                if resp.status == 200:
+                    cache = (await resp.json()).get("transcript_cache", {})
+        except Exception as e:
+            print(f"Failed to fetch transcript cache stats: {e}")
                 
     if not all_metrics:
         print("No interactions found.")
@@ -256,6 +265,7 @@ async def generate_report():
     Avg Server CPU: {avg_cpu:.1f}%
     Avg Server RAM: {avg_ram:.1f} MB
     Avg Latency: {avg_lat:.2f}s
+    STT Cache: {"enabled" if cache.get("enabled") else "disabled"}, hit rate {cache.get("hit_rate")}
     """
     print(summary_text)
 
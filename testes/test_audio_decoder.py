@@ -0,0 +1,149 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+import numpy as np
+from app.core import audio_decoder
+from app.core.audio_decoder import WebMOpusDemuxer, _split_laced
+
+# Decoders WebM -> PCM (app/core/audio_decoder.py): demux EBML incremental, lacing, e
+# PyAV in-process vs ffmpeg no backend/test_audio.webm (mesmo tamanho de PCM).
+# Uso: python -m pytest testes/test_audio_decoder.py  (ou python testes/test_audio_decoder.py)
+
+WEBM_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend/test_audio.webm'))
+
+
+def _read_webm() -> bytes:
+    with open(WEBM_PATH, "rb") as f:
+        return f.read()
+
+
+def _packets(demuxer: WebMOpusDemuxer, data: bytes, chunk: int) -> list:
+    events = []
+    for i in range(0, len(data), chunk):
+        events += demuxer.feed(data[i:i + chunk])
+    return events
+
+
+async def _drain(dec) -> bytes:
+    out = bytearray()
+    while True:
+        block = await dec.read_pcm()
+        if block == b"":
+            return bytes(out)
+        out += block
+
+
+async def _decode_pyav(data: bytes, chunk: int = 4096) -> bytes:
+    dec = audio_decoder.PyAVWebMToPCMStream()
+    await dec.start()
+    reader = asyncio.create_task(_drain(dec))
+    for i in range(0, len(data), chunk):
+        await dec.write_webm(data[i:i + chunk])
+    await dec.close()
+    return await reader
+
+
+async def _decode_ffmpeg(data: bytes, chunk: int = 4096) -> bytes:
+    dec = audio_decoder.FFmpegWebMToPCMStream()
+    await dec.start()
+    reader = asyncio.create_task(_drain(dec))
+    for i in range(0, len(data), chunk):
+        await dec.write_webm(data[i:i + chunk])
+    # fim do arquivo: espera o ffmpeg esvaziar em vez de matar (close() mata o processo)
+    dec.proc.stdin.close()
+    await dec._reader_task
+    await dec.proc.wait()
+    dec.pcm_queue.close()
+    return await reader
+
+
+def test_demuxer_is_independent_of_chunk_size():
+    data = _read_webm()
+    whole = WebMOpusDemuxer().feed(data)
+    assert whole[0][0] == "codec"
+    packets = [p for kind, p in whole if kind == "packet"]
+    assert len(packets) > 1000
+    for chunk in (1, 7, 4096):
+        demuxer = WebMOpusDemuxer()
+        assert _packets(demuxer, data, chunk) == whole
+        assert demuxer.invalid_blocks == 0
+
+
+def test_split_laced_modes():
+    frames = [b"a" * 10, b"b" * 12, b"c" * 9, b"d" * 7]
+    n = bytes([len(frames) - 1])
+
+    xiph = n + bytes([10, 12, 9]) + b"".join(frames)
+    assert _split_laced(xiph, 0x02) == frames
+
+    # Xiph com frame >= 255 bytes: 255 + resto
+    big = [b"x" * 300, b"y" * 5]
+    assert _split_laced(bytes([1, 255, 45]) + b"".join(big), 0x02) == big
+
+    fixed = [b"e" * 8] * 3
+    assert _split_laced(bytes([2]) + b"".join(fixed), 0x04) == fixed
+
+    # EBML: 1º tamanho vint, depois diferenças com sinal (vint de 1 byte: valor + 63)
+    ebml = n + bytes([0x80 | 10, 0x80 | (2 + 63), 0x80 | (-3 + 63)]) + b"".join(frames)
+    assert _split_laced(ebml, 0x06) == frames
+
+    assert _split_laced(n + bytes([10, 12, 200]) + b"".join(frames), 0x02) is None   # truncado
+    assert _split_laced(bytes([2]) + b"e" * 7, 0x04) is None                         # não divide
+
+
+def test_laced_block_yields_every_frame():
+    demuxer = WebMOpusDemuxer()
+    demuxer._audio_track = 1
+    frames = [b"\x01" * 4, b"\x02" * 6]
+    # track 1 (vint 0x81), timecode 0, flags com lacing Xiph
+    block = bytes([0x81, 0, 0, 0x80 | 0x02, 1, 4]) + b"".join(frames)
+    events = []
+    demuxer._handle_block(block, events)
+    assert events == [("packet", f) for f in frames]
+    assert demuxer.laced_blocks == 1
+
+    events = []
+    demuxer._handle_block(bytes([0x81, 0, 0, 0x80 | 0x02, 1, 40]) + b"".join(frames), events)
+    assert events == []
+    assert demuxer.invalid_blocks == 1
+
+
+def test_pyav_matches_ffmpeg_pcm_length():
+    if audio_decoder.av is None:
+        print("[SKIP] PyAV não instalado")
+        return
+    data = _read_webm()
+    pyav_pcm = asyncio.run(_decode_pyav(data))
+    ffmpeg_pcm = asyncio.run(_decode_ffmpeg(data))
+
+    assert len(pyav_pcm) > 16000 * 2 * 10
+    assert len(pyav_pcm) == len(ffmpeg_pcm)
+    a = np.frombuffer(pyav_pcm, dtype=np.int16).astype(np.float64)
+    b = np.frombuffer(ffmpeg_pcm, dtype=np.int16).astype(np.float64)
+    assert np.sqrt(np.mean((a - b) ** 2)) < 0.01 * np.sqrt(np.mean(b ** 2))
+
+
+def test_pyav_close_flushes_tail():
+    if audio_decoder.av is None:
+        print("[SKIP] PyAV não instalado")
+        return
+    data = _read_webm()
+
+    async def without_flush():
+        dec = audio_decoder.PyAVWebMToPCMStream()
+        dec.flush = lambda: b""
+        reader = asyncio.create_task(_drain(dec))
+        await dec.write_webm(data)
+        await dec.close()
+        return await reader
+
+    assert len(asyncio.run(_decode_pyav(data, chunk=len(data)))) > len(asyncio.run(without_flush()))
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from contextlib import contextmanager
+from app.core import config
+from app.core.cestas_fuzzy import FuzzyIndex, LOOKUP_STATS, looks_like_typo
+from app.core.cestas_produtos_sintomas_doencas import lookup_cesta, _lookup_exact, _get_fuzzy
+
+# Match aproximado do medicamento no lookup de cestas (app/core/cestas_fuzzy.py):
+# shadow só conta, enforce serve a cesta do nome aproximado, e near miss / chave exata
+# nunca são trocados por outro remédio.
+# Uso: python -m pytest testes/test_cestas_fuzzy.py  (ou python testes/test_cestas_fuzzy.py)
+
+
+@contextmanager
+def _config(**values):
+    old = {k: getattr(config, k) for k in values}
+    for k, v in values.items():
+        setattr(config, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(config, k, v)
+
+
+def _delta(fn):
+    before = dict(LOOKUP_STATS)
+    out = fn()
+    return out, {k: LOOKUP_STATS[k] - before[k] for k in ("exact_hits", "fuzzy_hits", "would_fuzzy",
+                                                         "near_misses", "misses", "fuzzy_checks")
+                 if LOOKUP_STATS[k] != before[k]}
+
+
+def test_best_match_and_typo_guard():
+    fuzzy = _get_fuzzy()
+    assert fuzzy.best("losartan")[0::2] == ("losartana", "match")
+    assert fuzzy.best("dor flex")[0::2] == ("dorflex", "match")
+    assert fuzzy.best("neusaldina")[0::2] == ("neosaldina", "match")
+    # outro remédio contido no nome: parecido, mas não é erro de grafia
+    assert fuzzy.best("citalopram")[0::2] == ("escitalopram", "near_miss")
+    assert not looks_like_typo("citalopram", "escitalopram")
+    # empate entre "vitamina c" / "vitamina d3" / ...: sem folga para o 2º colocado
+    assert fuzzy.best("vitamina")[2] == "near_miss"
+    assert fuzzy.best("eno") == (None, 0.0, "miss")
+
+
+def test_index_margin_between_candidates():
+    index = FuzzyIndex(["amoxicilina", "ampicilina", "dipirona"])
+    assert index.best("amoxilina", threshold=0.5, near=0.3)[2] == "match"
+    assert index.best("xyzw")[2] == "miss"
+    assert "dipirona" in index and "dipirona " not in index
+
+
+def test_shadow_counts_but_does_not_replace():
+    expected = _lookup_exact("losartana", "", "")
+    assert expected
+    with _config(CESTAS_FUZZY_MODE="shadow"):
+        out, delta = _delta(lambda: lookup_cesta("losartan", "", ""))
+    assert out is None
+    assert delta == {"would_fuzzy": 1, "fuzzy_checks": 1}
+
+
+def test_enforce_serves_the_fuzzy_cesta():
+    with _config(CESTAS_FUZZY_MODE="enforce"):
+        out, delta = _delta(lambda: lookup_cesta("losartan", "", ""))
+    assert out == _lookup_exact("losartana", "", "")
+    assert delta == {"fuzzy_hits": 1, "fuzzy_checks": 1}
+
+
+def test_off_skips_fuzzy():
+    with _config(CESTAS_FUZZY_MODE="off"):
+        out, delta = _delta(lambda: lookup_cesta("losartan", "", ""))
+    assert out is None
+    assert delta == {"misses": 1}
+
+
+def test_near_miss_never_replaces():
+    with _config(CESTAS_FUZZY_MODE="enforce"):
+        out, delta = _delta(lambda: lookup_cesta("citalopram", "ansiedade", "depressao"))
+    assert out is None
+    assert delta == {"near_misses": 1, "fuzzy_checks": 1}
+
+
+def test_exact_hit_wins_over_fuzzy():
+    exact = _lookup_exact("escitalopram", "ansiedade", "depressao")
+    assert exact
+    with _config(CESTAS_FUZZY_MODE="enforce"):
+        out, delta = _delta(lambda: lookup_cesta("Escitalopram", "ansiedade", "depressão"))
+        assert out == exact
+        assert delta == {"exact_hits": 1}     # o índice aproximado nem é consultado
+
+        # combinação sem chave: cai no med_default exato (todo medicamento do JSON tem um)
+        out, delta = _delta(lambda: lookup_cesta("escitalopram", "tosse", "gripe"))
+        assert out == _lookup_exact("escitalopram", "", "")
+        assert delta == {"exact_hits": 1}
+
+
+def test_track_false_does_not_count():
+    with _config(CESTAS_FUZZY_MODE="enforce"):
+        out, delta = _delta(lambda: lookup_cesta("losartan", "", "", track=False))
+    assert out and delta == {}
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import json
+import tempfile
+from app.core import cestas_index
+from app.core.cestas_index import CestasIndex, build, clean_items, open_or_build
+from app.core.cestas_produtos_sintomas_doencas import LOOKUP_PATH
+
+# Índice mmap das cestas (app/core/cestas_index.py): todas as chaves do JSON devolvem os
+# mesmos itens do lookup antigo (dict + clean_items), e o índice é recompilado quando o
+# JSON muda ou o arquivo está corrompido.
+# Uso: python -m pytest testes/test_cestas_index.py  (ou python testes/test_cestas_index.py)
+
+
+def _expected(items) -> list[dict] | None:
+    out = [{"produto": p, "explicacao": e} for p, e in clean_items(items)]
+    return out or None
+
+
+def test_every_json_key_matches_the_index():
+    with open(LOOKUP_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    assert len(data) == 6855
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, "cestas.idx")
+        count = build(LOOKUP_PATH, dest)
+        index = CestasIndex(dest)
+        try:
+            assert count == index.count == sum(1 for v in data.values() if clean_items(v))
+            for key, items in data.items():
+                assert index.get(key) == _expected(items), key
+
+            keys = list(index.keys())
+            assert keys == sorted(keys, key=lambda k: k.encode("utf-8"))
+            assert set(keys) == {k for k, v in data.items() if clean_items(v)}
+
+            # antes da 1ª chave, depois da última e entre chaves
+            for missing in ("", "\x00", "￿", keys[0] + "\x00", "dipirona_inexistente"):
+                assert index.get(missing) is None
+        finally:
+            index.close()
+
+
+def test_rebuilds_when_json_changes_or_index_is_corrupt():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "cestas.json")
+        dest = os.path.join(tmp, "cestas.idx")
+        data = {
+            "dipirona_default": [{"produto": " Dorflex ", "explicacao": "relaxante "}, {"produto": ""}],
+            "vazia_default": [{"produto": "  "}],
+            "ácido_default": [{"produto": "Sal de fruta", "explicacao": None}],
+        }
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+        index = open_or_build(source, dest)
+        assert index.count == 2
+        assert index.get("dipirona_default") == [{"produto": "Dorflex", "explicacao": "relaxante"}]
+        assert index.get("ácido_default") == [{"produto": "Sal de fruta", "explicacao": ""}]
+        assert index.get("vazia_default") is None
+        index.close()
+
+        # JSON alterado: SHA1 não bate, recompila
+        data["losartana_default"] = [{"produto": "Aferidor de pressão", "explicacao": "x"}]
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        index = open_or_build(source, dest)
+        assert index.count == 3 and index.get("losartana_default")
+        assert index.source_sha1 == cestas_index.source_sha1(source)
+        index.close()
+
+        # arquivo corrompido: recompila em vez de falhar
+        with open(dest, "wb") as f:
+            f.write(b"lixo")
+        index = open_or_build(source, dest)
+        assert index.count == 3
+        index.close()
+        assert not [n for n in os.listdir(tmp) if n.endswith(".tmp")]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+import socket
+import aiohttp
+from aiohttp import web
+from app.core import http_pool
+from app.core.http_pool import HTTP_REQUESTS
+
+# Retries do http_pool (app/core/http_pool.py): POST só repete quando o provedor não
+# processou (408/429/503 ou falha antes do envio); 500/502/504 e quedas só se idempotente.
+# Uso: python -m pytest testes/test_http_pool.py  (ou python testes/test_http_pool.py)
+
+PROVIDER = "teste_http"
+
+
+async def _serve(statuses: list):
+    """Servidor local que responde a sequência de status ("drop" = derruba a conexão)."""
+    hits = []
+
+    async def handler(request):
+        await request.read()
+        action = statuses[min(len(hits), len(statuses) - 1)]
+        hits.append(request.method)
+        if action == "drop":
+            request.transport.close()
+        return web.Response(status=200 if action == "drop" else action, text="x")
+
+    app = web.Application()
+    app.router.add_route("*", "/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/", hits
+
+
+def _run(statuses: list, method: str, **kwargs):
+    async def run():
+        http_pool.configure_provider(PROVIDER, retries=2, budget_ratio=1.0)
+        runner, url, hits = await _serve(statuses)
+        try:
+            status, _ = await http_pool.request(PROVIDER, method, url, data=b"audio", **kwargs)
+            return status, hits
+        except aiohttp.ClientError as e:
+            return type(e), hits
+        finally:
+            await http_pool.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_post_not_retried_on_server_error():
+    for code in (500, 502, 504):
+        assert _run([code, 200], "POST") == (code, ["POST"])
+
+
+def test_post_retried_when_not_processed():
+    assert _run([503, 429, 200], "POST") == (200, ["POST"] * 3)
+    assert _run([408, 200], "POST") == (200, ["POST"] * 2)
+
+
+def test_idempotent_requests_retry_server_errors():
+    assert _run([502, 200], "GET") == (200, ["GET"] * 2)
+    assert _run([500, 504, 200], "POST", idempotent=True) == (200, ["POST"] * 3)
+    assert _run([503, 200], "GET", idempotent=False) == (200, ["GET"] * 2)
+
+
+def test_dropped_connection_only_retried_if_idempotent():
+    error, hits = _run(["drop", 200], "POST")
+    assert issubclass(error, aiohttp.ClientError) and hits == ["POST"]
+    assert _run(["drop", 200], "GET") == (200, ["GET"] * 2)
+
+
+def test_post_retried_when_connection_refused():
+    async def run():
+        http_pool.configure_provider(PROVIDER, retries=2, budget_ratio=1.0)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]   # porta livre, ninguém escutando
+        retries = HTTP_REQUESTS.labels(PROVIDER, "retry").values()[0]
+        try:
+            await http_pool.request(PROVIDER, "POST", f"http://127.0.0.1:{port}/", data=b"audio")
+            raise AssertionError("esperava ClientConnectorError")
+        except aiohttp.ClientConnectorError:
+            pass
+        finally:
+            await http_pool.close()
+        assert HTTP_REQUESTS.labels(PROVIDER, "retry").values()[0] - retries == 2
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+from app.core.overlap_stitcher import OverlapStitcher, STITCH_STATS, suffix_prefix_overlap
+
+# Costura do overlap entre chunks (app/core/overlap_stitcher.py): palavras repetidas na
+# fronteira saem por timestamp (ElevenLabs) ou por sufixo/prefixo de tokens (demais).
+# Uso: python -m pytest testes/test_overlap_stitcher.py  (ou python testes/test_overlap_stitcher.py)
+
+
+def _words(items: list[tuple[str, float, float]]) -> list[dict]:
+    """[(palavra, início, fim)] relativos ao chunk -> formato do ElevenLabs (com espaçamentos)."""
+    out = []
+    for i, (text, start, end) in enumerate(items):
+        if i:
+            out.append({"text": " ", "start": start, "end": start, "type": "spacing"})
+        out.append({"text": text, "start": start, "end": end, "type": "word"})
+    return out
+
+
+def _text(words: list[dict]) -> str:
+    return "".join(w["text"] for w in words)
+
+
+CHUNK1 = _words([("eu", 0.2, 0.5), ("queria", 0.6, 1.1), ("um", 1.2, 1.4), ("remédio", 1.5, 2.4),
+                 ("para", 3.9, 4.3), ("dor", 4.5, 4.9)])
+# chunk seguinte começa 0.8s antes do fim do anterior (4.2s no stream)
+CHUNK2 = _words([("para", 0.0, 0.1), ("dor", 0.3, 0.7), ("de", 0.9, 1.0), ("cabeça", 1.1, 1.6)])
+
+
+def test_timestamps_drop_words_repeated_at_the_boundary():
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    assert stitcher.stitch(_text(CHUNK1), CHUNK1, 5.0, stream_offset_s=0.0) == (_text(CHUNK1), 0)
+    before = STITCH_STATS["by_timestamps"]
+    assert stitcher.stitch(_text(CHUNK2), CHUNK2, 5.0, stream_offset_s=4.2) == ("de cabeça", 2)
+    assert STITCH_STATS["by_timestamps"] == before + 1
+    assert stitcher.words_removed == 2
+
+
+def test_timestamps_with_default_overlap():
+    # modo VAD: sem posição no stream, assume o overlap padrão
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch(_text(CHUNK1), CHUNK1, 5.0)
+    assert stitcher.stitch(_text(CHUNK2), CHUNK2, 5.0) == ("de cabeça", 2)
+
+
+def test_words_after_previous_last_word_are_kept():
+    # o chunk anterior parou em "para" (4.3s): "dor" no overlap é palavra nova
+    chunk1 = CHUNK1[:-2]
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch(_text(chunk1), chunk1, 5.0, stream_offset_s=0.0)
+    assert stitcher.stitch(_text(CHUNK2), CHUNK2, 5.0, stream_offset_s=4.2) == ("dor de cabeça", 1)
+
+
+def test_gap_between_chunks_removes_nothing():
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch(_text(CHUNK1), CHUNK1, 5.0, stream_offset_s=0.0)
+    before = STITCH_STATS["no_overlap"]
+    # chunk anterior a este foi descartado pelo scheduler: começa depois do fim do último
+    assert stitcher.stitch(_text(CHUNK2), CHUNK2, 5.0, stream_offset_s=9.2) == (_text(CHUNK2), 0)
+    assert STITCH_STATS["no_overlap"] == before + 1
+
+
+def test_tokens_without_timestamps():
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch("Eu queria um remédio para dor de cabeça", None, 5.0, stream_offset_s=0.0)
+    # sem acento e com pontuação: casa pelos tokens normalizados
+    assert stitcher.stitch("dor de cabeca, e febre", None, 5.0, stream_offset_s=4.2) == ("e febre", 3)
+
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch("tem xarope para tosse seca", None, 5.0, stream_offset_s=0.0)
+    # 1 token extra no começo do chunk atual
+    assert stitcher.stitch("né tosse seca também", None, 5.0, stream_offset_s=4.2) == ("também", 3)
+
+
+def test_tokens_need_min_overlap():
+    stitcher = OverlapStitcher(default_overlap_s=0.8)
+    stitcher.stitch("eu queria um remédio para dor", None, 5.0, stream_offset_s=0.0)
+    assert stitcher.stitch("dor nas costas", None, 5.0, stream_offset_s=4.2) == ("dor nas costas", 0)
+
+
+def test_suffix_prefix_overlap():
+    assert suffix_prefix_overlap(list("xabab"), list("ababc")) == 4
+    assert suffix_prefix_overlap(list("ababa"), list("abac")) == 3
+    assert suffix_prefix_overlap(list("abc"), list("abc")) == 3
+    assert suffix_prefix_overlap(list("abc"), list("xyz")) == 0
+    assert suffix_prefix_overlap([], list("abc")) == 0
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
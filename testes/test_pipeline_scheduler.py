@@ -0,0 +1,171 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+from app.core import pipeline_scheduler
+from app.core.pipeline_scheduler import PipelineScheduler, PIPELINE_STATS
+
+# PipelineScheduler (app/core/pipeline_scheduler.py): ordem da seção ordenada, merge/drop
+# de chunks atrasados e cancelamento no close().
+# Uso: python -m pytest testes/test_pipeline_scheduler.py  (ou python testes/test_pipeline_scheduler.py)
+
+
+def test_ordered_completion_out_of_order_finishes():
+    async def run():
+        order = []
+        # o 1º chunk é o mais lento: sem o ticket ele entraria no buffer por último
+        delays = [0.06, 0.01, 0.03, 0.0]
+
+        async def runner(audio, ticket, idx):
+            await asyncio.sleep(delays[idx])
+            async with ticket:
+                order.append(idx)
+
+        sched = PipelineScheduler(runner, max_in_flight=4, max_queued=4, deadline_s=0)
+        for i in range(4):
+            sched.submit(b"x", idx=i)
+        while sched._tasks:
+            await asyncio.sleep(0.01)
+        assert order == [0, 1, 2, 3]
+        assert sched.stats["completed"] == 4
+        await sched.close()
+
+    asyncio.run(run())
+
+
+def test_failed_job_releases_its_turn():
+    async def run():
+        order = []
+
+        async def runner(audio, ticket, idx):
+            if idx == 0:
+                raise RuntimeError("falha no STT")
+            async with ticket:
+                order.append(idx)
+
+        sched = PipelineScheduler(runner, max_in_flight=2, max_queued=4, deadline_s=0)
+        for i in range(3):
+            sched.submit(b"x", idx=i)
+        while sched._tasks:
+            await asyncio.sleep(0.01)
+        assert order == [1, 2]
+        assert sched.stats["failed"] == 1
+        await sched.close()
+
+    asyncio.run(run())
+
+
+def test_merge_when_queue_is_full():
+    async def run():
+        gate = asyncio.Event()
+        seen = []
+
+        async def runner(audio, ticket, idx):
+            await gate.wait()
+            seen.append((idx, bytes(audio)))
+
+        sched = PipelineScheduler(runner, overlap_bytes=2, max_in_flight=1, max_queued=1,
+                                  stale_policy="merge", deadline_s=0, max_merge_bytes=1000)
+        sched.submit(b"AAAAAA", idx=0)   # despachado
+        sched.submit(b"AABBBB", idx=1)   # na fila
+        sched.submit(b"BBCCCC", idx=2)   # fila cheia: junta no anterior sem o overlap
+        assert sched.stats["merged"] == 1
+        assert sched.stats["dropped"] == 0
+        gate.set()
+        while sched._tasks:
+            await asyncio.sleep(0.01)
+        assert seen == [(0, b"AAAAAA"), (1, b"AABBBBCCCC")]
+        await sched.close()
+
+    asyncio.run(run())
+
+
+def test_drop_policy_discards_stale_and_oldest():
+    async def run():
+        gate = asyncio.Event()
+        seen = []
+
+        async def runner(audio, ticket, idx):
+            await gate.wait()
+            seen.append(idx)
+
+        sched = PipelineScheduler(runner, max_in_flight=1, max_queued=2,
+                                  stale_policy="drop", deadline_s=0.05)
+        sched.submit(b"x", idx=0)
+        sched.submit(b"x", idx=1)
+        sched.submit(b"x", idx=2)
+        sched.submit(b"x", idx=3)        # fila cheia: descarta o mais antigo (1)
+        assert sched.stats["dropped"] == 1
+        await asyncio.sleep(0.08)        # 2 e 3 passam do deadline esperando
+        sched.submit(b"x", idx=4)
+        gate.set()
+        while sched._tasks:
+            await asyncio.sleep(0.01)
+        assert seen == [0, 4]
+        assert sched.stats["dropped"] == 3
+        await sched.close()
+
+    asyncio.run(run())
+
+
+def test_close_cancels_running_and_queued_jobs():
+    async def run():
+        started, cancelled = [], []
+
+        async def runner(audio, ticket, idx):
+            started.append(idx)
+            try:
+                async with ticket:
+                    await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(idx)
+                raise
+
+        sched = PipelineScheduler(runner, balcao_id="teste_close", max_in_flight=2, max_queued=4,
+                                  deadline_s=0)
+        for i in range(4):
+            sched.submit(b"x", idx=i)
+        await asyncio.sleep(0.01)
+        assert "teste_close" in PIPELINE_STATS
+        await sched.close()
+
+        assert sorted(started) == [0, 1]
+        assert sorted(cancelled) == [0, 1]   # 1 estava esperando a vez de 0
+        assert sched.stats["cancelled"] == 4
+        assert not sched._tasks
+        assert "teste_close" not in PIPELINE_STATS
+        sched.submit(b"x", idx=9)            # depois do close é ignorado
+        assert sched.stats["submitted"] == 4
+
+    asyncio.run(run())
+
+
+def test_reconnect_gets_fresh_stats():
+    async def run():
+        async def runner(audio, ticket):
+            async with ticket:
+                pass
+
+        old = PipelineScheduler(runner, balcao_id="teste_reconnect", deadline_s=0)
+        old.submit(b"x")
+        old.stats["dropped"] = 7
+        new = PipelineScheduler(runner, balcao_id="teste_reconnect", deadline_s=0)
+        assert new.stats["dropped"] == 0
+        assert PIPELINE_STATS["teste_reconnect"] is new.stats
+
+        await old.close()   # a conexão antiga fecha depois: não apaga a nova
+        assert PIPELINE_STATS["teste_reconnect"] is new.stats
+        await new.close()
+        assert "teste_reconnect" not in PIPELINE_STATS
+        assert not [s for s in pipeline_scheduler._collect_pipeline_stats()
+                    if s[3].get("balcao_id") == "teste_reconnect"]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,180 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+import time
+from contextlib import contextmanager
+from app.core import config, stt_hedge
+from app.core.stt_hedge import HEDGE_STATS, run_hedged
+from app.core.stt_router import STTRouter, STTProviderError, HALF_OPEN
+from app.core.stt_stub import StubProvider
+
+# Hedging de STT (app/core/stt_hedge.py) com StubProvider: deadline por percentil,
+# cancelamento do perdedor (liberando a chamada de teste do breaker) e latência economizada.
+# Uso: python -m pytest testes/test_stt_hedge.py  (ou python testes/test_stt_hedge.py)
+
+
+@contextmanager
+def _config(**values):
+    old = {k: getattr(config, k) for k in values}
+    for k, v in values.items():
+        setattr(config, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(config, k, v)
+
+
+def _seed(provider: str, samples: list[float]):
+    stt_hedge._trackers.pop(provider, None)
+    for s in samples:
+        stt_hedge.tracker(provider).record(s)
+
+
+def _timed_call(stub: StubProvider, started: list):
+    def call():
+        started.append(time.perf_counter())
+        return stub.transcribe(b"")
+    return call
+
+
+async def _via_router(router: STTRouter, nome: str, stub: StubProvider):
+    # mesmo caminho de transcription._chamar_provedor
+    if not router.dispatched(nome):
+        raise STTProviderError(nome, "circuit breaker em half-open (teste em andamento)")
+    t0 = time.perf_counter()
+    try:
+        resultado = await stub.transcribe(b"")
+    except asyncio.CancelledError:
+        router.record_cancel(nome)
+        raise
+    router.record(nome, time.perf_counter() - t0, ok=True)
+    return resultado
+
+
+def test_hedge_fires_at_percentile_deadline():
+    async def run():
+        # p90 de 20 amostras (0.01 .. 0.20) = 0.19s
+        _seed("h1_primary", [0.01 * i for i in range(1, 21)])
+        assert abs(stt_hedge.deadline_for("h1_primary") - 0.19) < 1e-9
+
+        primary = StubProvider("fixed:1.0", text="primario")
+        hedge = StubProvider("fixed:0.02", text="hedge")
+        started = []
+        t0 = time.perf_counter()
+        fired, winner, result = await run_hedged(
+            "h1_primary", _timed_call(primary, started), "h1_hedge", _timed_call(hedge, started),
+            lambda r: bool(r),
+        )
+        assert fired == ["h1_primary", "h1_hedge"]
+        assert (winner, result) == ("h1_hedge", "hedge")
+        assert 0.17 <= started[1] - t0 <= 0.26
+        assert time.perf_counter() - t0 < 0.5
+
+        await asyncio.sleep(0.01)
+        assert primary.cancelled == 1     # perdedor cancelado, não esperado até 1.0s
+
+    with _config(STT_HEDGE_MIN_DEADLINE_S=0.01):
+        asyncio.run(run())
+
+
+def test_fast_primary_does_not_hedge():
+    async def run():
+        _seed("h2_primary", [0.2] * 20)
+        primary = StubProvider("fixed:0.02", text="primario")
+        hedge = StubProvider("fixed:0.02")
+        fired, winner, result = await run_hedged(
+            "h2_primary", lambda: primary.transcribe(b""), "h2_hedge", lambda: hedge.transcribe(b""),
+            lambda r: bool(r),
+        )
+        assert (fired, winner, result) == (["h2_primary"], "h2_primary", "primario")
+        assert hedge.calls == 0
+
+    with _config(STT_HEDGE_MIN_DEADLINE_S=0.01):
+        asyncio.run(run())
+
+
+def test_primary_failure_hedges_immediately():
+    async def run():
+        _seed("h3_primary", [5.0] * 20)
+        primary = StubProvider("fixed:0.01", fail_rate=1.0)
+        hedge = StubProvider("fixed:0.01", text="hedge")
+        t0 = time.perf_counter()
+        fired, winner, result = await run_hedged(
+            "h3_primary", lambda: primary.transcribe(b""), "h3_hedge", lambda: hedge.transcribe(b""),
+            lambda r: bool(r),
+        )
+        assert (winner, result) == ("h3_hedge", "hedge")
+        assert time.perf_counter() - t0 < 1.0   # não espera o deadline de 5s
+
+    asyncio.run(run())
+
+
+def test_cancelled_loser_frees_breaker_probe():
+    async def run():
+        router = STTRouter({"h4_primary": 0.01, "h4_hedge": 0.01})
+        breaker = router.providers["h4_primary"].breaker
+        breaker.cooldown_s = 0.0
+        for _ in range(breaker.failure_threshold):
+            router.record("h4_primary", 0.1, ok=False, error="timeout")
+        assert breaker.allow() and breaker.state == HALF_OPEN
+
+        _seed("h4_primary", [0.05] * 20)
+        primary = StubProvider("fixed:1.0")
+        hedge = StubProvider("fixed:0.01", text="hedge")
+        _, winner, _ = await run_hedged(
+            "h4_primary", lambda: _via_router(router, "h4_primary", primary),
+            "h4_hedge", lambda: _via_router(router, "h4_hedge", hedge), lambda r: bool(r),
+        )
+        assert winner == "h4_hedge"
+        await asyncio.sleep(0.01)
+        assert primary.cancelled == 1
+
+        # a chamada de teste cancelada não conta como falha e libera a vaga
+        assert breaker.state == HALF_OPEN
+        assert router.dispatched("h4_primary") is True
+        assert router.dispatched("h4_primary") is False
+
+    with _config(STT_HEDGE_MIN_DEADLINE_S=0.01):
+        asyncio.run(run())
+
+
+def test_saved_latency_estimate():
+    async def run():
+        # p50 de 11 x 0.1s + 9 x 0.5s = 0.1s; a cauda (> instante da vitória) tem média 0.5s
+        _seed("h5_primary", [0.1] * 11 + [0.5] * 9)
+        primary = StubProvider("fixed:2.0")
+        hedge = StubProvider("fixed:0.05", text="hedge")
+        before = HEDGE_STATS["saved_seconds"]
+        t0 = time.perf_counter()
+        _, winner, _ = await run_hedged(
+            "h5_primary", lambda: primary.transcribe(b""), "h5_hedge", lambda: hedge.transcribe(b""),
+            lambda r: bool(r),
+        )
+        won_at = time.perf_counter() - t0
+        assert winner == "h5_hedge"
+        saved = HEDGE_STATS["saved_seconds"] - before
+        assert abs(saved - (0.5 - won_at)) < 0.02
+        assert 0.25 < saved < 0.4
+
+        # sem amostra acima do instante da vitória, não estima nada
+        await asyncio.sleep(0.01)     # o primário cancelado registra a latência dele antes
+        _seed("h5_primary", [0.1] * 20)
+        before = HEDGE_STATS["saved_seconds"]
+        await run_hedged(
+            "h5_primary", lambda: primary.transcribe(b""), "h5_hedge", lambda: hedge.transcribe(b""),
+            lambda r: bool(r),
+        )
+        assert HEDGE_STATS["saved_seconds"] == before
+
+    with _config(STT_HEDGE_MIN_DEADLINE_S=0.01, STT_HEDGE_PERCENTILE=0.5):
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
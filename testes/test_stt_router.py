@@ -0,0 +1,138 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+import time
+from app.core.stt_router import STTRouter, CostBudget, CLOSED, OPEN, HALF_OPEN
+
+# Roteador de STT (app/core/stt_router.py): circuit breaker (abre, uma chamada de teste,
+# cancelamento, sucesso), motivos do rank e orçamento por balcão.
+# Uso: python -m pytest testes/test_stt_router.py  (ou python testes/test_stt_router.py)
+
+
+def _router(cooldown_s: float = 30.0) -> STTRouter:
+    router = STTRouter({"caro": 0.05, "barato": 0.01})
+    for h in router.providers.values():
+        h.breaker.cooldown_s = cooldown_s
+    return router
+
+
+def _open(router: STTRouter, provider: str):
+    for _ in range(router.providers[provider].breaker.failure_threshold):
+        router.record(provider, 0.5, ok=False, error="HTTP 500")
+
+
+def test_breaker_opens_after_n_failures():
+    router = _router()
+    breaker = router.providers["caro"].breaker
+    for _ in range(breaker.failure_threshold - 1):
+        router.record("caro", 0.5, ok=False, error="HTTP 500")
+    assert breaker.state == CLOSED and breaker.allow()
+
+    router.record("caro", 0.5, ok=False, error="HTTP 500")
+    assert breaker.state == OPEN and breaker.opens == 1
+    assert not breaker.allow()                 # ainda no cooldown
+    assert router.providers["caro"].last_error == "HTTP 500"
+
+
+def test_single_probe_with_concurrent_dispatch():
+    async def run():
+        router = _router(cooldown_s=0.0)
+        _open(router, "caro")
+
+        async def pipeline():
+            ranking = router.rank(["caro", "barato"], "caro", None)
+            await asyncio.sleep(0)             # outros pipelines rankeiam antes do disparo
+            return ranking[0], router.dispatched(ranking[0][0])
+
+        results = await asyncio.gather(*(pipeline() for _ in range(8)))
+        assert all(first == ("caro", "probe") for first, _ in results)
+        assert sum(ok for _, ok in results) == 1
+        assert router.providers["caro"].breaker.state == HALF_OPEN
+
+    asyncio.run(run())
+
+
+def test_cancel_frees_the_probe():
+    router = _router(cooldown_s=0.0)
+    _open(router, "caro")
+    assert router.dispatched("caro") is True
+    assert router.dispatched("caro") is False
+    router.record_cancel("caro")               # perdedor do hedge: não é falha
+    assert router.providers["caro"].breaker.state == HALF_OPEN
+    assert router.dispatched("caro") is True
+
+
+def test_probe_success_clears_window_and_failure_reopens():
+    router = _router(cooldown_s=0.0)
+    health = router.providers["caro"]
+    _open(router, "caro")
+    assert router.dispatched("caro")
+    router.record("caro", 0.3, ok=True)
+    assert health.breaker.state == CLOSED and health.breaker.consecutive_failures == 0
+    assert list(health.calls) == [(0.3, True)]
+    assert health.error_rate() == 0.0 and health.healthy()
+
+    health.breaker.cooldown_s = 30.0
+    _open(router, "caro")
+    health.breaker.cooldown_s = 0.0
+    assert router.dispatched("caro")
+    router.record("caro", 0.5, ok=False, error="timeout")
+    assert health.breaker.state == OPEN and health.breaker.opens == 3
+
+
+def test_rank_reasons():
+    # preferido saudável e no orçamento
+    router = _router()
+    assert router.rank(["caro", "barato"], "caro", "b1") == [("caro", "preferred"), ("barato", "failover")]
+
+    # breaker aberto
+    _open(router, "caro")
+    assert router.rank(["caro", "barato"], "caro", "b1")[0] == ("barato", "unhealthy")
+
+    # taxa de erro alta com o breaker fechado
+    router = _router()
+    for ok in (False, False, True, False, False, True):
+        router.record("caro", 0.5, ok=ok)
+    assert router.providers["caro"].breaker.state == CLOSED
+    assert router.rank(["caro", "barato"], "caro", "b1")[0] == ("barato", "unhealthy")
+
+    # chamada de teste do preferido em half-open
+    router = _router(cooldown_s=0.0)
+    _open(router, "caro")
+    assert router.rank(["caro", "barato"], "caro", "b1")[0] == ("caro", "probe")
+
+    # orçamento: o preferido estoura, o barato cabe
+    router = _router()
+    router.budget.per_hour = 0.1
+    router.budget.charge("b1", 0.08)
+    assert router.rank(["caro", "barato"], "caro", "b1") == [("barato", "budget")]
+    assert router.rank(["caro", "barato"], "caro", "b2")[0] == ("caro", "preferred")
+
+    # tudo estourado: só o mais barato
+    router.budget.charge("b1", 0.05)
+    assert router.rank(["caro", "barato"], "caro", "b1") == [("barato", "budget")]
+
+
+def test_budget_drops_idle_balcoes():
+    budget = CostBudget(per_hour=1.0)
+    budget.charge("b1", 0.2)
+    budget.charge("b2", 0.3)
+    budget.charge(None, 0.5)                   # sem balcão: não cobra
+    assert budget.spent("b1") == 0.2 and set(budget._spend) == {"b1", "b2"}
+
+    # gasto do b1 saiu da janela de 1h
+    q = budget._spend["b1"]
+    q[0] = (time.monotonic() - 3601, q[0][1])
+    assert budget.spent("b1") == 0.0
+    assert "b1" not in budget._spend
+    assert budget.allows("b1", 1.0)
+    assert budget.spent("b2") == 0.3
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+import asyncio
+from contextlib import contextmanager
+from aiohttp import web
+from app.core import config, http_pool, stt_stream
+from app.core.stt_stream import BYTES_PER_SEC, STREAM_STATS, StreamingSTTSession
+from app.tools.stt_stream_standin import StandIn, load_script, _pcm
+
+# STT em streaming (app/core/stt_stream.py) contra o stand-in local (app/tools/stt_stream_standin.py):
+# reconexão com finais repetidos ignorados e o PCM de cada final recortado na chegada.
+# Uso: python -m pytest testes/test_stt_stream.py  (ou python testes/test_stt_stream.py)
+
+
+@contextmanager
+def _config(**values):
+    old = {k: getattr(config, k) for k in values}
+    for k, v in values.items():
+        setattr(config, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(config, k, v)
+
+
+async def _replay(standin: StandIn, pcm: bytes, on_result, speed: float = 20.0) -> StreamingSTTSession:
+    runner = web.AppRunner(standin.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    session = StreamingSTTSession(
+        "teste_stream", None, on_result, url=stt_stream.stream_url(f"ws://127.0.0.1:{port}/v1/listen")
+    )
+    try:
+        session.start()
+        frame = int(0.02 * BYTES_PER_SEC)
+        for i in range(0, len(pcm), frame):
+            session.push(pcm[i:i + frame])
+            await asyncio.sleep(0.02 / speed)
+        for _ in range(200):   # espera o último final antes de fechar
+            if standin.next_idx == len(standin.script):
+                break
+            await asyncio.sleep(0.02)
+        await session.close(drain_s=5.0)
+    finally:
+        await runner.cleanup()
+        await http_pool.close()
+    return session
+
+
+def test_reconnect_skips_replayed_finals_and_keeps_slices():
+    async def run():
+        script = load_script(None)
+        pcm = _pcm(None, script[-1]["end"] + 1.0)
+        finals = []
+
+        def on_result(res):
+            if res.is_final:
+                finals.append(res)
+
+        # derruba a cada 5s de áudio e repete o último final na conexão nova
+        standin = StandIn(script, drop_every_s=5.0, latency_ms=5.0, resend_final=True)
+        skipped = STREAM_STATS["duplicates_skipped"]
+        session = await _replay(standin, pcm, on_result)
+
+        assert standin.connections > 2
+        assert session.reconnects == standin.connections - 1
+        assert STREAM_STATS["duplicates_skipped"] - skipped == session.reconnects
+        assert [r.text for r in finals] == [u["text"] for u in script]
+
+        for res, utt in zip(finals, script):
+            assert abs(res.start - utt["start"]) < 0.01 and abs(res.end - utt["end"]) < 0.01
+            a = int(res.start * BYTES_PER_SEC) & ~1
+            b = int(res.end * BYTES_PER_SEC) & ~1
+            assert res.audio == pcm[a:b]
+            assert abs(len(res.audio) - (utt["end"] - utt["start"]) * BYTES_PER_SEC) <= 4
+
+        # sem histórico extra, o trecho do 1º final já saiu do histórico: o recorte na
+        # chegada é o que mantém o áudio para um consumidor atrasado
+        assert session.audio_slice(finals[0].start, finals[0].end) == b""
+
+    with _config(STT_STREAM_RECONNECT_MIN_S=0.02, STT_STREAM_HISTORY_S=0.0):
+        asyncio.run(run())
+
+
+def test_partials_carry_no_audio():
+    async def run():
+        script = load_script(None)[:2]
+        results = []
+        standin = StandIn(script, latency_ms=5.0)
+        await _replay(standin, _pcm(None, script[-1]["end"] + 1.0), results.append)
+        partials = [r for r in results if not r.is_final]
+        assert partials and all(r.audio == b"" for r in partials)
+        assert [r.text for r in results if r.is_final] == [u["text"] for u in script]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"OK  {name}")
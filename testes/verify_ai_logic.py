@@ -5,6 +5,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../back
 
 from app.core import prompts, ai_client, config
 import json
+import asyncio
 
 # Manual Mock config if env not loaded (but we will run with env)
 # config.OPENAI_API_KEY should be set
@@ -18,7 +19,7 @@ def test_ai_logic():
     print(f"\n[Input]: {input_text}")
     
     try:
-        response = ai_client.ai_client.analisar_texto(input_text)
+        response = asyncio.run(ai_client.ai_client.analisar_texto(input_text))
         print(f"[Raw Response]: {response}")
         
         if response:
@@ -42,7 +43,7 @@ def test_ai_logic():
     input_text_noise = "(Som de batida) (ruído de fundo)"
     print(f"\n[Input Noise]: {input_text_noise}")
     try:
-        response_noise = ai_client.ai_client.analisar_texto(input_text_noise)
+        response_noise = asyncio.run(ai_client.ai_client.analisar_texto(input_text_noise))
         print(f"[Response]: {response_noise}")
         if not response_noise or "null" in response_noise.lower() or "nenhuma" in response_noise.lower():
              print("SUCCESS: Ignored noise.")
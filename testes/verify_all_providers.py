@@ -4,6 +4,7 @@ import sys
 
 # VPS URL
 SERVER_URL = os.environ.get("BALTO_SERVER_URL", "https://balto.pbpmdev.com")
+# Fallback se o servidor não expuser /api/test/providers
 PROVIDERS = ["elevenlabs", "assemblyai", "deepgram", "gladia"]
 
 # Create a dummy wav file if not exists (silence or small noise) or use an existing one
@@ -20,6 +21,17 @@ def create_dummy_wav(filename):
             value = struct.pack('<h', 0)
             w.writeframes(value)
 
+def list_providers():
+    """Provedores configurados no servidor (registro stt_providers)."""
+    try:
+        res = requests.get(f"{SERVER_URL}/api/test/providers", timeout=10)
+        if res.status_code == 200:
+            return [p["name"] for p in res.json().get("providers", [])
+                    if p.get("configured") and p["name"] != "stub"]
+    except Exception as e:
+        print(f"Could not list providers ({e}); using default list.")
+    return PROVIDERS
+
 def test_provider(provider, filepath):
     print(f"Testing Provider: {provider.upper()} ...", end=" ", flush=True)
     try:
@@ -60,12 +72,13 @@ def main():
          target_file = "test_dummy.wav"
          print("Created dummy file: test_dummy.wav")
 
+    providers = list_providers()
     success_count = 0
-    for p in PROVIDERS:
+    for p in providers:
         if test_provider(p, target_file):
             success_count += 1
     
-    print(f"\nSummary: {success_count}/{len(PROVIDERS)} providers working.")
+    print(f"\nSummary: {success_count}/{len(providers)} providers working.")
 
 if __name__ == "__main__":
     main()